@@ -0,0 +1,2 @@
+# bench/__init__.py
+# Outils de mesure hors ligne : aucune connexion à Discord n'est nécessaire.
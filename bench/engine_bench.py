@@ -0,0 +1,132 @@
+# bench/engine_bench.py
+"""
+Banc de l'ordinateur (royal/engine.py) : coût et force.
+
+Nœuds par seconde à profondeur fixe, temps par coup de chaque niveau, et matchs entre niveaux.
+
+    python -m bench.engine_bench --depth 3
+    python -m bench.engine_bench --match facile:difficile --games 10 --json engine.json
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Optional
+
+import chess
+
+from royal.engine import ENGINE_LEVELS, Search, generate_turns, play_turn
+from royal.rules import king_capture_winner
+
+
+def sample_positions(count: int, seed: int, plies: int = 16) -> list[tuple[str, list[int]]]:
+    """Positions de milieu de partie obtenues en jouant des tours au hasard (reproductibles avec `seed`)."""
+    rng = random.Random(seed)
+    positions = [(chess.Board().fen(), [])]
+    while len(positions) < count:
+        board, royal_pawns = chess.Board(), set()
+        for _ in range(plies):
+            turns = generate_turns(board, royal_pawns)
+            royal_pawns = play_turn(board, royal_pawns, rng.choice(turns))
+            if king_capture_winner(board) is not None:
+                break
+        else:
+            positions.append((board.fen(), sorted(royal_pawns)))
+    return positions
+
+
+def fixed_depth(positions, depth: int) -> list[dict]:
+    """Coût de la recherche à profondeur fixe, table de transposition vide pour chaque position."""
+    rows = []
+    for current in range(1, depth + 1):
+        nodes = seconds = 0
+        for fen, royal_pawns in positions:
+            _, info = Search().choose(chess.Board(fen), royal_pawns, current, move_time=float("inf"))
+            nodes += info["nodes"]
+            seconds += info["seconds"]
+        rows.append({"depth": current, "nodes": nodes, "seconds": round(seconds, 3), "nps": round(nodes / seconds) if seconds else 0})
+        print(f"profondeur {current} : {nodes:>9} nœuds en {seconds:7.2f} s, {rows[-1]['nps']:>7} nœuds/s")
+    return rows
+
+
+def levels(positions) -> dict:
+    """Temps par coup, profondeur atteinte et nœuds/s de chaque niveau, comme en partie."""
+    report = {}
+    for level, settings in ENGINE_LEVELS.items():
+        search = Search()
+        infos = [search.choose(chess.Board(fen), royal_pawns, settings["depth"], settings["time"], settings["noise"])[1]
+                 for fen, royal_pawns in positions]
+        seconds = sum(info["seconds"] for info in infos)
+        report[level] = {
+            "seconds_per_move": round(seconds / len(infos), 3),
+            "max_seconds": max(info["seconds"] for info in infos),
+            "mean_depth": round(sum(info["depth"] for info in infos) / len(infos), 2),
+            "nps": round(sum(info["nodes"] for info in infos) / seconds) if seconds else 0,
+        }
+        print(f"{level:10} {report[level]}")
+    return report
+
+
+def play_game(white: str, black: str, max_turns: int) -> Optional[chess.Color]:
+    """Une partie entre deux niveaux ; None si elle n'est pas finie après `max_turns` tours."""
+    board, royal_pawns = chess.Board(), set()
+    searches = {chess.WHITE: Search(), chess.BLACK: Search()}
+    names = {chess.WHITE: white, chess.BLACK: black}
+    for _ in range(max_turns):
+        settings = ENGINE_LEVELS[names[board.turn]]
+        turn, _ = searches[board.turn].choose(board, royal_pawns, settings["depth"], settings["time"], settings["noise"])
+        if turn is None:
+            return not board.turn
+        royal_pawns = play_turn(board, royal_pawns, turn)
+        winner = king_capture_winner(board)
+        if winner is not None:
+            return winner
+    return None
+
+
+def match(first: str, second: str, games: int, max_turns: int) -> dict:
+    """Points de `first` contre `second` (couleurs alternées, nulle = partie non finie)."""
+    points = {first: 0.0, second: 0.0}
+    started = time.perf_counter()
+    for index in range(games):
+        white, black = (first, second) if index % 2 == 0 else (second, first)
+        winner = play_game(white, black, max_turns)
+        if winner is None:
+            points[first] += 0.5; points[second] += 0.5
+        else:
+            points[white if winner == chess.WHITE else black] += 1
+        print(f"partie {index + 1}/{games} : {white} (Blancs) - {black} (Noirs) -> "
+              f"{'nulle' if winner is None else 'Blancs' if winner == chess.WHITE else 'Noirs'}")
+    return {"points": points, "games": games, "seconds": round(time.perf_counter() - started, 1)}
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=8, help="nombre de positions de test")
+    parser.add_argument("--depth", type=int, default=2, help="profondeur maximale du test à profondeur fixe (0 pour le sauter)")
+    parser.add_argument("--levels", action="store_true", help="mesure aussi le temps par coup de chaque niveau")
+    parser.add_argument("--match", help="deux niveaux à faire s'affronter, ex. facile:difficile")
+    parser.add_argument("--games", type=int, default=4)
+    parser.add_argument("--max-turns", type=int, default=150, help="tours avant de déclarer une partie nulle")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit le rapport complet dans ce fichier")
+    args = parser.parse_args(argv)
+
+    positions = sample_positions(args.positions, args.seed)
+    report = {"config": vars(args)}
+    if args.depth:
+        report["fixed_depth"] = fixed_depth(positions, args.depth)
+    if args.levels:
+        report["levels"] = levels(positions)
+    if args.match:
+        first, second = args.match.split(":")
+        report["match"] = match(first, second, args.games, args.max_turns)
+        print(json.dumps(report["match"], ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
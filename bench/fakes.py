@@ -0,0 +1,162 @@
+# bench/fakes.py
+# Doublures minimales des objets discord.py utilisés par le cog (Interaction, Member, Message...).
+# Elles enregistrent chaque envoi au lieu de parler à l'API, pour mesurer le cog sans connexion.
+
+import asyncio
+import hashlib
+import itertools
+from typing import Optional
+
+import discord
+
+_snowflakes = itertools.count(1_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_snowflakes)
+
+
+class FakeHTTP:
+    """Tient le compte des messages et des fichiers "envoyés" à Discord."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency # Aller-retour simulé vers l'API, en secondes
+        self.messages: dict[int, "FakeMessage"] = {}
+        self.requests = 0
+        self.uploads = 0
+        self.upload_bytes = 0
+
+    def upload(self, files) -> list[str]:
+        # Comme l'API : chaque fichier joint à une requête est téléversé, même s'il est identique au précédent.
+        digests = []
+        for file in files:
+            data = file.fp.getvalue()
+            self.uploads += 1
+            self.upload_bytes += len(data)
+            digests.append(hashlib.sha256(data).hexdigest())
+        return digests
+
+    async def round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "uploads": self.uploads, "upload_bytes": self.upload_bytes}
+
+
+class FakeUser:
+    def __init__(self, name: str, user_id: Optional[int] = None, bot: bool = False):
+        self.id = user_id or snowflake()
+        self.name = self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    async def send(self, content=None, **kwargs):
+        return None
+
+
+class FakeMessage:
+    def __init__(self, http: FakeHTTP, channel_id: int, content: Optional[str] = None, attachments: Optional[list] = None):
+        self.http = http
+        self.id = snowflake()
+        self.channel_id = channel_id
+        self.content = content
+        self.attachments = attachments or [] # Empreintes des fichiers actuellement affichés
+        self.view = None
+        self.edits = 0
+        http.messages[self.id] = self
+
+    def apply_edit(self, content=discord.utils.MISSING, attachments=discord.utils.MISSING, view=discord.utils.MISSING, **kwargs):
+        self.http.requests += 1
+        self.edits += 1
+        if content is not discord.utils.MISSING:
+            self.content = content
+        if view is not discord.utils.MISSING:
+            self.view = view
+        # Sans `attachments`, Discord garde les fichiers déjà présents sur le message.
+        if attachments is not discord.utils.MISSING:
+            self.attachments = self.http.upload(attachments)
+
+    async def edit(self, **kwargs):
+        await self.http.round_trip()
+        self.apply_edit(**kwargs)
+        return self
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _respond(self):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        self._interaction.http.requests += 1
+
+    async def defer(self, **kwargs):
+        self._respond()
+        await self._interaction.http.round_trip()
+
+    async def send_message(self, content=None, *, view=None, file=None, files=None, ephemeral=False, **kwargs):
+        self._respond()
+        await self._interaction.http.round_trip()
+        self._interaction.ephemeral_messages.append(content)
+        if not ephemeral:
+            self._interaction.message = FakeMessage(self._interaction.http, self._interaction.channel_id, content)
+
+    async def edit_message(self, **kwargs):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        await self._interaction.http.round_trip()
+        self._interaction.message.apply_edit(**kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content=None, *, file=None, files=None, view=None, **kwargs):
+        http = self._interaction.http
+        await http.round_trip()
+        http.requests += 1
+        files = files or ([file] if file else [])
+        message = FakeMessage(http, self._interaction.channel_id, content, http.upload(files))
+        message.view = view
+        return message
+
+
+class FakeInteraction:
+    """Un clic de joueur sur un composant d'un message de partie."""
+
+    def __init__(self, http: FakeHTTP, user: FakeUser, message: Optional[FakeMessage] = None,
+                 guild_id: int = 1, channel_id: int = 2, custom_id: Optional[str] = None, values: Optional[list] = None):
+        self.http = http
+        self.id = snowflake()
+        self.user = user
+        self.message = message
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.type = discord.InteractionType.component
+        self.data = {"custom_id": custom_id, "values": values or []}
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.ephemeral_messages: list = []
+
+    async def edit_original_response(self, **kwargs):
+        await self.http.round_trip()
+        self.message.apply_edit(**kwargs)
+        return self.message
+
+    async def original_response(self):
+        return self.message
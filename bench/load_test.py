@@ -0,0 +1,335 @@
+# bench/load_test.py
+"""
+Banc de charge du cog d'échecs Royal, sans connexion à Discord.
+
+Les vrais callbacks (GameRequestView.accept, Dropdown.callback, Button.callback) sont appelés
+avec de fausses interactions, sur des parties scriptées (toutes les capacités) et aléatoires.
+
+    python -m bench.load_test --games 40 --render none --json avant.json
+    python -m bench.load_test --games 40 --render sprite --baseline avant.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Optional
+
+# La sauvegarde des parties du banc part dans un fichier jetable.
+os.environ.setdefault("GAME_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="royal-bench-"), "bench.sqlite3"))
+
+import chess
+import discord
+
+from bench.fakes import FakeHTTP, FakeInteraction, FakeMessage, FakeUser
+from cogs import chess_cog
+from cogs.chess_cog import ChessCog, GameRequestView
+from royal import metrics, render, shedding
+
+W, B = chess.WHITE, chess.BLACK
+
+# Une partie qui passe par toutes les capacités, puis se termine par la capture du roi blanc.
+SCRIPTED_GAME = [
+    (W, "piece_select", chess.E2), (W, "destination_select", chess.E4),
+    # Double Assaut annulé, puis joué pour de bon
+    (B, "piece_select", chess.G8), (B, "double_assault_start_btn", None),
+    (B, "double_assault_move1_select", chess.F6), (B, "cancel_ability_btn", None),
+    (B, "piece_select", chess.B8), (B, "double_assault_start_btn", None),
+    (B, "double_assault_move1_select", chess.C6), (B, "double_assault_move2_select", chess.D4),
+    # Promotion Royale
+    (W, "piece_select", chess.E1), (W, "royal_promotion_start_btn", None), (W, "royal_promotion_target_select", chess.E4),
+    # Contrôle mental sur le pion royal
+    (B, "piece_select", chess.D8), (B, "mind_control_start_btn", None),
+    (B, "mind_control_target_select", chess.E4), (B, "mind_control_destination_select", "e4e5"),
+    # Téléportation à côté d'une pièce noire
+    (W, "piece_select", chess.F1), (W, "teleport_start_btn", None),
+    (W, "teleport_target_black_select", chess.E7), (W, "teleport_destination_select", chess.F6),
+    (B, "piece_select", chess.D4), (B, "destination_select", chess.C2),
+    (W, "piece_select", chess.G1), (W, "cancel_btn", None),
+    (W, "piece_select", chess.G1), (W, "destination_select", chess.F3),
+    (B, "piece_select", chess.A7), (B, "destination_select", chess.A6),
+    # Équipe de secours : le pion pris en c2 revient en g1
+    (W, "piece_select", chess.H1), (W, "rescue_team_start_btn", None),
+    (W, "rescue_team_piece_select", chess.PAWN), (W, "rescue_team_destination_select", chess.G1),
+    (B, "piece_select", chess.C2), (B, "destination_select", chess.E1),
+]
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Harness:
+    def __init__(self, cog: ChessCog, http: FakeHTTP, wrong_user_rate: float = 0.05, double_click_rate: float = 0.0,
+                 pause: float = 0.0):
+        self.cog = cog
+        self.http = http
+        self.wrong_user_rate = wrong_user_rate
+        self.double_click_rate = double_click_rate
+        self.pause = pause # Réflexion simulée après chaque clic (laisse le temps au pré-rendu)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.clicks = 0
+        self.games_completed = 0
+        self.stale_frames = 0 # Messages dont l'image jointe n'est pas celle que la vue croit afficher
+        self.replaced_clicks = 0 # Clics exécutés sur un composant qui n'est plus dans l'interface (ne doit jamais arriver)
+
+    async def start_game(self):
+        initiator, opponent = FakeUser("initiateur"), FakeUser("adversaire")
+        request = GameRequestView(initiator=initiator, opponent=opponent, cog=self.cog)
+        challenge = FakeMessage(self.http, channel_id=2, content="défi")
+        interaction = FakeInteraction(self.http, opponent, challenge, custom_id="accept")
+        started = time.perf_counter()
+        await request.accept.callback(interaction)
+        self.latencies["accept"].append(time.perf_counter() - started)
+        # Le message de la partie est celui qui porte la vue avec ces deux joueurs.
+        return next(m for m in reversed(self.http.messages.values())
+                    if m.view is not None and {m.view.white_player, m.view.black_player} == {initiator, opponent})
+
+    async def click(self, message, user, custom_id: str, value=None, redeliver: bool = False):
+        """Un clic ; `redeliver` livre la même interaction deux fois en parallèle, comme un renvoi de la passerelle."""
+        view = message.view
+        item = next(i for i in view.children if getattr(i, "custom_id", None) == custom_id)
+        values = [str(value)] if value is not None else []
+        if isinstance(item, discord.ui.Select):
+            item._values = values
+        interaction = FakeInteraction(self.http, user, message, custom_id=custom_id, values=values)
+        started = time.perf_counter()
+        await asyncio.gather(*(self._dispatch(view, item, interaction) for _ in range(2 if redeliver else 1)))
+        self.latencies[custom_id].append(time.perf_counter() - started)
+        self.clicks += 1
+        if message.attachments and message.attachments[0] != view.shown_image:
+            self.stale_frames += 1
+        if self.pause:
+            await asyncio.sleep(self.pause)
+
+    async def _dispatch(self, view, item, interaction):
+        # Même enchaînement que discord.py (View._scheduled_task).
+        self._watch_replaced(item)
+        if await view.interaction_check(interaction):
+            await item.callback(interaction)
+
+    def _watch_replaced(self, item):
+        # Au moment où le clic agit sur la partie (sous son verrou), le composant doit encore être affiché ;
+        # sinon le clic est joué contre une position qu'il ne visait pas.
+        handle = type(item).handle
+
+        async def checked(interaction):
+            if item not in item.game_view.children:
+                self.replaced_clicks += 1
+            await handle(item, interaction)
+        item.handle = checked
+
+    @staticmethod
+    def players(message):
+        view = message.view
+        return {W: view.white_player, B: view.black_player}
+
+    async def play_scripted(self, rng: random.Random):
+        message = await self.start_game()
+        players = self.players(message)
+        for color, custom_id, value in SCRIPTED_GAME:
+            await self.click(message, players[color], custom_id, value)
+        if not message.view.is_finished():
+            raise RuntimeError(f"la partie scriptée n'est pas terminée : {message.view.board.fen()}")
+        self.games_completed += 1
+
+    async def play_random(self, rng: random.Random, max_clicks: int = 200):
+        message = await self.start_game()
+        players = self.players(message)
+        for _ in range(max_clicks):
+            view = message.view
+            if view.is_finished():
+                break
+            user = players[view.board.turn]
+            if rng.random() < self.wrong_user_rate:
+                user = players[not view.board.turn] # Chemin "Ce n'est pas votre tour"
+            items = [i for i in view.children if not i.disabled and i.custom_id != "forfeit_btn"]
+            if not items:
+                break
+            # On évite de tourner en rond sur les boutons d'annulation.
+            weights = [0.1 if "cancel" in i.custom_id else 1.0 for i in items]
+            item = rng.choices(items, weights)[0]
+            value = rng.choice(item.options).value if isinstance(item, discord.ui.Select) else None
+            if rng.random() < self.double_click_rate:
+                # Double clic impatient (deux interactions) ou interaction livrée deux fois.
+                if rng.random() < 0.5:
+                    await asyncio.gather(self.click(message, user, item.custom_id, value), self.click(message, user, item.custom_id, value))
+                else:
+                    await self.click(message, user, item.custom_id, value, redeliver=True)
+                continue
+            await self.click(message, user, item.custom_id, value)
+        if not message.view.is_finished():
+            await self.click(message, players[message.view.board.turn], "forfeit_btn")
+        self.games_completed += 1
+
+    def callback_report(self) -> dict:
+        report = {}
+        for custom_id, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            report[custom_id] = {
+                "count": len(values),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 3),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 3),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+            }
+        return report
+
+
+def _use_null_renderer():
+    # Image factice (mais distincte par position) : on mesure le cog seul, sans rastérisation.
+    async def render_uncached(self, backend, board_fen, fill, options, image_format, size):
+        return hashlib.sha256(repr((backend, board_fen, sorted(fill.items()), options, image_format, size)).encode()).digest()
+    render.BoardRenderer._render_uncached = render_uncached
+
+
+async def run(args) -> dict:
+    if args.render == "none":
+        _use_null_renderer()
+    # Les nouvelles parties lisent le moteur de rendu par défaut du cog.
+    chess_cog.RENDER_BACKEND = args.render if args.render != "none" else "svg"
+    renderer = render.get_renderer()
+    if args.no_cache:
+        renderer.cache.max_entries = 0
+
+    cog = ChessCog(bot=None)
+    http = FakeHTTP(latency=args.http_latency)
+    # Les fausses interactions viennent toutes du serveur 1 : on passe par le réglage /affichage.
+    cog.guild_settings[1] = {"image_format": args.format, "image_size": args.size}
+    harness = Harness(cog, http, wrong_user_rate=args.wrong_user_rate, double_click_rate=args.double_click_rate,
+                      pause=args.pause)
+    rng = random.Random(args.seed)
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one_game(index: int):
+        async with slots:
+            game_rng = random.Random(rng.random())
+            scripted = args.mode == "scripted" or (args.mode == "mixed" and index % 2 == 0)
+            await (harness.play_scripted(game_rng) if scripted else harness.play_random(game_rng))
+
+    # Allègement sous charge : sans objectif donné, il ne se déclenche jamais pendant le banc.
+    watchers = []
+    if args.shed_slo:
+        shedding.SHED_RENDER_WAIT_SLO = args.shed_slo
+        watchers = [asyncio.create_task(cog.shedder.run()),
+                    asyncio.create_task(metrics.watch_event_loop(listener=cog.shedder.observe_loop_lag))]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_game(i) for i in range(args.games)))
+    wall = time.perf_counter() - started
+    for task in watchers:
+        task.cancel()
+
+    cache = renderer.cache.stats()
+    render_workers = renderer.workers if args.render != "none" else 0
+    cores = min(os.cpu_count() or 1, 1 + render_workers)
+    clicks_per_second = harness.clicks / wall
+    report = {
+        "config": vars(args),
+        "wall_seconds": round(wall, 3),
+        "callbacks": harness.callback_report(),
+        "renders": {
+            "frames": cache["hits"] + cache["misses"],
+            "rasterized": cache["misses"],
+            "per_second": round((cache["hits"] + cache["misses"]) / wall, 2),
+            "rasterized_per_second": round(cache["misses"] / wall, 2),
+        },
+        "cache": cache,
+        "prerender": {result: metrics.PRERENDERS.value(result=result) for result in ("rendered", "busy", "served")},
+        "shedding": {f"{scope}:{mode}": metrics.SHED_SWITCHES.value(scope=scope, mode=mode)
+                     for scope in ("global", "game") for mode in shedding.SHED_MODES},
+        "images": renderer.output_stats(),
+        "http": http.stats(),
+        "games": {
+            "completed": harness.games_completed,
+            "clicks": harness.clicks,
+            "stale_frames": harness.stale_frames,
+            "replaced_clicks": harness.replaced_clicks,
+            "clicks_per_second": round(clicks_per_second, 2),
+            "cores": cores,
+            # Parties qu'un cœur peut suivre si chaque joueur clique toutes les `think_time` secondes.
+            "sustained_games_per_core": round(clicks_per_second * args.think_time / cores, 1),
+        },
+    }
+    render.shutdown_renderer()
+    await asyncio.to_thread(cog.store.close)
+    return report
+
+
+def scaling(args) -> list[dict]:
+    """Débit pour un nombre croissant de parties simultanées : il doit croître tant que les parties sont indépendantes."""
+    rows = []
+    for count in args.scaling:
+        report = asyncio.run(run(argparse.Namespace(**{**vars(args), "games": count, "concurrency": count})))
+        rows.append({"games": count, "clicks_per_second": report["games"]["clicks_per_second"],
+                     "p95_ms": max(stats["p95_ms"] for stats in report["callbacks"].values())})
+        print(f"{count:>4} parties : {rows[-1]['clicks_per_second']:>9} clics/s, p95 max {rows[-1]['p95_ms']} ms")
+    return rows
+
+
+def compare(report: dict, baseline: dict):
+    print(f"{'custom_id':34} {'p95 avant':>10} {'p95 après':>10}")
+    for custom_id, stats in report["callbacks"].items():
+        before = baseline["callbacks"].get(custom_id, {}).get("p95_ms")
+        print(f"{custom_id:34} {before if before is not None else '-':>10} {stats['p95_ms']:>10}")
+    print(f"rendus/s : {baseline['renders']['per_second']} -> {report['renders']['per_second']}")
+    print(f"octets envoyés : {baseline['http']['upload_bytes']} -> {report['http']['upload_bytes']}")
+    print(f"parties/cœur : {baseline['games']['sustained_games_per_core']} -> {report['games']['sustained_games_per_core']}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20, help="parties jouées en même temps")
+    parser.add_argument("--mode", choices=("scripted", "random", "mixed"), default="mixed")
+    parser.add_argument("--render", choices=("svg", "sprite", "none"), default="none")
+    parser.add_argument("--format", choices=render.RENDER_FORMATS, default=render.RENDER_FORMAT, help="encodage des images")
+    parser.add_argument("--size", type=int, default=render.RENDER_SIZE, help="côté des images en pixels")
+    parser.add_argument("--no-cache", action="store_true", help="désactive le cache d'images")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="aller-retour simulé vers l'API Discord, en secondes")
+    parser.add_argument("--double-click-rate", type=float, default=0.0, help="part des clics doublés (parties aléatoires)")
+    parser.add_argument("--scaling", type=lambda text: [int(n) for n in text.split(",")],
+                        help="mesure le débit pour ces nombres de parties simultanées, ex. 1,2,4,8,16")
+    parser.add_argument("--wrong-user-rate", type=float, default=0.05, help="part des clics faits par le mauvais joueur")
+    parser.add_argument("--think-time", type=float, default=5.0, help="secondes entre deux clics d'un joueur humain")
+    parser.add_argument("--pause", type=float, default=0.0, help="secondes de réflexion simulée après chaque clic")
+    parser.add_argument("--shed-slo", type=float, default=0.0,
+                        help="active l'allègement sous charge avec cet objectif d'attente de rendu (secondes)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit le rapport complet dans ce fichier")
+    parser.add_argument("--baseline", help="rapport JSON d'un run précédent à comparer")
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        rows = scaling(args)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        return 0
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    else:
+        print(json.dumps({k: report[k] for k in ("wall_seconds", "renders", "images", "games", "http", "shedding")}, indent=2, ensure_ascii=False))
+        print(f"{'custom_id':34} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} (ms)")
+        for custom_id, stats in report["callbacks"].items():
+            print(f"{custom_id:34} {stats['count']:>6} {stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+    if report["games"]["replaced_clicks"]:
+        print(f"ÉCHEC : {report['games']['replaced_clicks']} clic(s) joué(s) sur un composant déjà remplacé")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
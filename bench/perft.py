@@ -0,0 +1,366 @@
+# bench/perft.py
+"""
+Perft de la variante Royal : nombre de feuilles de l'arbre des tours (capacités comprises) jusqu'à une
+profondeur donnée, avec la vitesse en nœuds par seconde. Une position où un roi a été pris est une feuille.
+
+Positions : une par ligne, « FEN ; pions royaux ; D1 n ; D2 n ... » (pions royaux séparés par des espaces
+ou des virgules, « - » si aucun ; les comptes Dn attendus sont facultatifs et vérifiés s'ils sont donnés).
+Par défaut, la suite bench/perft_royal.txt.
+
+Mode différentiel : compare un générateur candidat, fonction (board, royal_pawns) -> liste de tours,
+à l'implémentation actuelle (royal.engine.generate_turns). Par défaut, le candidat est le générateur naïf
+d'origine (pseudo_legal_moves case par case, tour inversé pour le Contrôle mental), réécrit ici comme oracle.
+Chaque écart est réduit à une position minimale (pièces, pions royaux et droits retirés tant que l'écart reste).
+
+    python -m bench.perft --depth 3
+    python -m bench.perft --fen "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 ; e2 d7" --depth 2 --divide
+    python -m bench.perft --diff 1000000 --workers 4 --json diff.json
+    python -m bench.perft --diff 100000 --candidate mon_module:generate_turns
+    python -m bench.perft --compare --fen "8/8/8/8/8/8/4P3/4K2k w - - 0 1 ; e2"
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import chess
+
+from royal.engine import INITIAL_COUNTS, generate_turns, play_turn, undo_turn
+from royal.record import to_text
+from royal.rules import king_capture_winner
+
+SUITE = Path(__file__).with_name("perft_royal.txt")
+DIFF_CHUNK = 500 # Positions par tâche envoyée aux processus du mode différentiel
+
+
+# --- POSITIONS ---
+def parse_position(line: str) -> tuple[chess.Board, set, dict[int, int]]:
+    fields = [field.strip() for field in line.split(";")]
+    board = chess.Board(fields[0])
+    royal = fields[1].replace(",", " ").split() if len(fields) > 1 else []
+    royal_pawns = {chess.parse_square(name) for name in royal if name != "-"}
+    expected = {}
+    for field in fields[2:]:
+        if field:
+            depth, count = field.split()
+            expected[int(depth.lstrip("Dd"))] = int(count)
+    return board, royal_pawns, expected
+
+
+def format_position(board: chess.Board, royal_pawns) -> str:
+    # Case de prise en passant toujours écrite : le reproducteur doit redonner exactement la même position.
+    return f"{board.fen(en_passant='fen')} ; {' '.join(chess.square_name(square) for square in sorted(royal_pawns)) or '-'}"
+
+
+def load_positions(fens: list[str], path: Optional[str]) -> list[tuple[chess.Board, set, dict[int, int]]]:
+    lines = list(fens)
+    if path or not fens:
+        with open(path or SUITE, encoding="utf-8") as f:
+            lines += [line for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return [parse_position(line) for line in lines]
+
+
+# --- PERFT ---
+def perft(board: chess.Board, royal_pawns, depth: int, generate: Callable = generate_turns) -> int:
+    if depth == 0 or king_capture_winner(board) is not None:
+        return 1
+    turns = generate(board, royal_pawns)
+    if depth == 1:
+        return len(turns)
+    color, nodes = board.turn, 0
+    for turn in turns:
+        nodes += perft(board, play_turn(board, royal_pawns, turn), depth - 1, generate)
+        undo_turn(board, turn, color)
+    return nodes
+
+
+def divide(board: chess.Board, royal_pawns, depth: int, generate: Callable = generate_turns) -> dict[str, int]:
+    """Feuilles sous chaque tour de la racine, pour localiser un écart de perft."""
+    color, counts = board.turn, {}
+    for turn in generate(board, royal_pawns):
+        counts[to_text(turn)] = perft(board, play_turn(board, royal_pawns, turn), depth - 1, generate)
+        undo_turn(board, turn, color)
+    return counts
+
+
+# --- GÉNÉRATEUR DE RÉFÉRENCE ---
+# Les règles telles que les appliquait la première version du cog, sans masques ni précalcul :
+# lente mais facile à relire, elle sert d'oracle pour le mode différentiel.
+def reference_destinations(board: chess.Board, square: int, royal_pawns=()) -> list[int]:
+    piece = board.piece_at(square)
+    if not piece:
+        return []
+    # Pièce adverse (Contrôle mental) : on inverse le tour le temps du calcul, comme le faisait le cog,
+    # mais sans prise en passant : elle n'appartient qu'au camp au trait (voir royal/movegen.py).
+    flipped, ep_square = piece.color != board.turn, board.ep_square
+    if flipped:
+        board.turn, board.ep_square = not board.turn, None
+    try:
+        possible = [move.to_square for move in board.generate_pseudo_legal_moves(chess.BB_SQUARES[square])]
+    finally:
+        if flipped:
+            board.turn, board.ep_square = not board.turn, ep_square
+    if piece.piece_type == chess.PAWN:
+        direction = 8 if piece.color == chess.WHITE else -8
+        back = square - direction
+        if 0 <= back < 64 and board.piece_at(back) is None:
+            possible.append(back)
+        if square in royal_pawns:
+            for step in (1, 2, 3):
+                target = square + step * direction
+                if not 0 <= target < 64 or board.piece_at(target) is not None:
+                    break
+                possible.append(target)
+            file = chess.square_file(square)
+            for delta, allowed in ((-1, file > 0), (1, file < 7)):
+                target = square + direction + delta
+                if allowed and 0 <= target < 64 and board.piece_at(target) is None:
+                    possible.append(target)
+    # Les promotions donnent plusieurs coups vers la même case.
+    return sorted(set(possible))
+
+
+def reference_turns(board: chess.Board, royal_pawns) -> list[tuple]:
+    us = board.turn
+    turns, abilities = [], set()
+    for square, piece in board.piece_map().items():
+        if piece.color != us:
+            continue
+        destinations = reference_destinations(board, square, royal_pawns)
+        turns.extend((("move", square, to),) for to in destinations)
+        if piece.piece_type == chess.KNIGHT:
+            for middle in destinations:
+                if board.piece_type_at(middle) == chess.KING:
+                    turns.append((("double1", square, middle),))
+                    continue
+                board.push(chess.Move(square, middle))
+                board.turn = us
+                seconds = [move.to_square for move in board.generate_pseudo_legal_moves(chess.BB_SQUARES[middle])]
+                board.pop()
+                turns.extend((("double1", square, middle), ("double2", middle, to)) for to in seconds)
+        elif piece.piece_type == chess.BISHOP:
+            landing = set()
+            for target in board.piece_map():
+                landing.update(to for to in chess.SquareSet(chess.BB_KING_ATTACKS[target]) if board.piece_at(to) is None)
+            turns.extend((("teleport", square, to),) for to in landing)
+        elif piece.piece_type == chess.ROOK:
+            empty = [to for to in chess.SquareSet(chess.BB_KING_ATTACKS[square]) if board.piece_at(to) is None]
+            for rescued, count in INITIAL_COUNTS.items():
+                if len(board.pieces(rescued, us)) < count:
+                    abilities.update((("rescue", rescued, to),) for to in empty)
+        elif piece.piece_type == chess.QUEEN:
+            for target, other in board.piece_map().items():
+                if other.color != us and other.piece_type != chess.KING:
+                    abilities.update((("mind", target, to),) for to in reference_destinations(board, target, royal_pawns))
+        elif piece.piece_type == chess.KING:
+            for pawn in board.pieces(chess.PAWN, us):
+                if pawn not in royal_pawns:
+                    abilities.add((("royal", pawn),))
+    return turns + sorted(abilities)
+
+
+def load_generator(spec: str) -> Callable:
+    """« reference », « current » ou « module:fonction »."""
+    if spec == "reference":
+        return reference_turns
+    if spec == "current":
+        return generate_turns
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+# --- MODE DIFFÉRENTIEL ---
+def random_positions(rng: random.Random) -> Iterator[tuple[chess.Board, set]]:
+    """
+    Positions au hasard, à comparer au fur et à mesure (l'échiquier renvoyé est réutilisé ensuite) :
+    une sur deux vient d'une partie jouée au hasard et reprise à zéro quand un roi tombe, l'autre de pièces
+    posées au hasard (pions sur les rangées du bord, roques et prise en passant compris).
+    """
+    game, game_royal = chess.Board(), set()
+    while True:
+        if rng.random() < 0.5:
+            if king_capture_winner(game) is not None or game.ply() >= 300:
+                game, game_royal = chess.Board(), set()
+            yield game, game_royal
+            game_royal = play_turn(game, game_royal, rng.choice(generate_turns(game, game_royal)))
+            continue
+        board = chess.Board(None)
+        squares = rng.sample(chess.SQUARES, 64)
+        for color in chess.COLORS:
+            if rng.random() < 0.95:
+                board.set_piece_at(squares.pop(), chess.Piece(chess.KING, color))
+            for _ in range(rng.randrange(16)):
+                piece_type = rng.choice((chess.PAWN,) * 4 + (chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN))
+                board.set_piece_at(squares.pop(), chess.Piece(piece_type, color))
+        board.turn = rng.choice(chess.COLORS)
+        board.set_castling_fen("KQkq")
+        if rng.random() < 0.3:
+            board.ep_square = chess.square(rng.randrange(8), 5 if board.turn == chess.WHITE else 2)
+        yield board, {square for square in chess.scan_forward(board.pawns) if rng.random() < 0.3}
+
+
+def compare(board: chess.Board, royal_pawns, candidate: Callable) -> Optional[dict]:
+    """Écart entre le candidat et l'implémentation actuelle sur une position, ou None s'ils sont d'accord."""
+    fen = board.fen()
+    expected = Counter(generate_turns(board, royal_pawns))
+    try:
+        got = Counter(candidate(board, set(royal_pawns)))
+    except Exception as e:
+        return {"error": repr(e)}
+    if board.fen() != fen:
+        return {"error": "le candidat a modifié l'échiquier"}
+    if got == expected:
+        return None
+    return {"missing": sorted(map(to_text, expected - got)), "extra": sorted(map(to_text, got - expected))}
+
+
+def shrink(board: chess.Board, royal_pawns: set, candidate: Callable) -> tuple[chess.Board, set, dict]:
+    """Retire pièces, pions royaux, roques et prise en passant tant que l'écart persiste."""
+    board, royal_pawns = board.copy(stack=False), set(royal_pawns)
+    difference = compare(board, royal_pawns, candidate)
+    changed = True
+    while changed:
+        changed = False
+        trials = [("piece", square) for square in chess.scan_reversed(board.occupied)]
+        trials += [("royal", square) for square in sorted(royal_pawns)] + [("castling", None), ("ep", None)]
+        for kind, square in trials:
+            trial, trial_royal = board.copy(stack=False), set(royal_pawns)
+            if kind == "piece" and trial.piece_at(square):
+                chess.BaseBoard.remove_piece_at(trial, square)
+                trial_royal.discard(square)
+            elif kind == "royal" and square in trial_royal:
+                trial_royal.discard(square)
+            elif kind == "castling" and trial.castling_rights:
+                trial.castling_rights = chess.BB_EMPTY
+            elif kind == "ep" and trial.ep_square is not None:
+                trial.ep_square = None
+            else:
+                continue
+            trial_difference = compare(trial, trial_royal, candidate)
+            if trial_difference is not None:
+                board, royal_pawns, difference = trial, trial_royal, trial_difference
+                changed = True
+    return board, royal_pawns, difference
+
+
+def diff_chunk(spec: str, seed: int, start: int, count: int, max_mismatches: int) -> tuple[int, list[dict]]:
+    """Compare `count` positions tirées au hasard (reproductibles : graine et numéro de la première position)."""
+    candidate = load_generator(spec)
+    mismatches = []
+    for index, (board, royal_pawns) in zip(range(start, start + count), random_positions(random.Random(f"{seed}:{start}"))):
+        if compare(board, royal_pawns, candidate) is None:
+            continue
+        minimal, minimal_royal, difference = shrink(board, royal_pawns, candidate)
+        mismatches.append({"index": index, "position": format_position(board, royal_pawns),
+                           "minimal": format_position(minimal, minimal_royal), **difference})
+        if len(mismatches) >= max_mismatches:
+            return index - start + 1, mismatches
+    return count, mismatches
+
+
+def report_mismatch(mismatch: dict, spec: str):
+    print(f"\nÉcart (position n°{mismatch.get('index', '-')}) : {mismatch['position']}")
+    print(f"  minimal  : {mismatch['minimal']}")
+    if "error" in mismatch:
+        print(f"  erreur   : {mismatch['error']}")
+    for label, key in (("manquants", "missing"), ("en trop", "extra")):
+        turns = mismatch.get(key, [])
+        if turns:
+            print(f"  {label:9}: {len(turns)} — {', '.join(turns[:10])}{' …' if len(turns) > 10 else ''}")
+    print(f'  reproduire : python -m bench.perft --compare --candidate {spec} --fen "{mismatch["minimal"]}"')
+
+
+def run_diff(total: int, spec: str, seed: int, workers: int, max_mismatches: int) -> dict:
+    chunks = [(spec, seed, start, min(DIFF_CHUNK, total - start), max_mismatches) for start in range(0, total, DIFF_CHUNK)]
+    checked, mismatches = 0, []
+    started = time.perf_counter()
+    # Même contexte « spawn » que les pools de rendu et de l'ordinateur.
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        for done, found in pool.imap_unordered(_diff_chunk, chunks):
+            checked += done
+            mismatches += found
+            if len(mismatches) >= max_mismatches:
+                pool.terminate()
+                break
+            elapsed = time.perf_counter() - started
+            print(f"\r{checked}/{total} positions, {checked / elapsed:.0f}/s", end="", file=sys.stderr, flush=True)
+    seconds = time.perf_counter() - started
+    print(file=sys.stderr)
+    mismatches.sort(key=lambda mismatch: mismatch["index"])
+    for mismatch in mismatches[:max_mismatches]:
+        report_mismatch(mismatch, spec)
+    print(f"\n{checked} positions comparées en {seconds:.1f} s ({checked / seconds:.0f}/s) : {len(mismatches)} écart(s)")
+    return {"positions": checked, "seconds": round(seconds, 2), "mismatches": mismatches[:max_mismatches]}
+
+
+def _diff_chunk(args: tuple) -> tuple[int, list[dict]]:
+    return diff_chunk(*args)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fen", action="append", default=[], help="« FEN ; pions royaux » (répétable)")
+    parser.add_argument("--file", help="fichier de positions (par défaut bench/perft_royal.txt)")
+    parser.add_argument("--depth", type=int, help="profondeur maximale (par défaut la plus grande attendue, ou 2)")
+    parser.add_argument("--divide", action="store_true", help="détaille les feuilles sous chaque tour de la racine")
+    parser.add_argument("--generator", default="current", help="générateur compté par le perft")
+    parser.add_argument("--diff", type=int, metavar="N", help="compare le candidat sur N positions au hasard")
+    parser.add_argument("--compare", action="store_true", help="compare le candidat sur les positions données")
+    parser.add_argument("--candidate", default="reference", help="« reference », « current » ou « module:fonction »")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-mismatches", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    args = parser.parse_args(argv)
+
+    report = {"config": vars(args)}
+    failed = False
+    if args.diff:
+        report["diff"] = run_diff(args.diff, args.candidate, args.seed, args.workers, args.max_mismatches)
+        failed = bool(report["diff"]["mismatches"])
+    elif args.compare:
+        candidate = load_generator(args.candidate)
+        report["compare"] = []
+        for board, royal_pawns, _ in load_positions(args.fen, args.file):
+            difference = compare(board, royal_pawns, candidate)
+            if difference is None:
+                print(f"identique : {format_position(board, royal_pawns)}")
+                continue
+            minimal, minimal_royal, difference = shrink(board, royal_pawns, candidate)
+            mismatch = {"position": format_position(board, royal_pawns), "minimal": format_position(minimal, minimal_royal), **difference}
+            report_mismatch(mismatch, args.candidate)
+            report["compare"].append(mismatch)
+        failed = bool(report["compare"])
+    else:
+        generate = load_generator(args.generator)
+        report["perft"] = []
+        for board, royal_pawns, expected in load_positions(args.fen, args.file):
+            print(format_position(board, royal_pawns))
+            for depth in range(1, (args.depth or max(expected, default=2)) + 1):
+                started = time.perf_counter()
+                nodes = perft(board, royal_pawns, depth, generate)
+                seconds = time.perf_counter() - started
+                status = "" if depth not in expected else " ok" if expected[depth] == nodes else f" ATTENDU {expected[depth]}"
+                failed |= depth in expected and expected[depth] != nodes
+                print(f"  D{depth} {nodes:>12} feuilles en {seconds:8.2f} s, {nodes / seconds if seconds else 0:>9.0f} nœuds/s{status}")
+                report["perft"].append({"position": format_position(board, royal_pawns), "depth": depth, "nodes": nodes,
+                                        "expected": expected.get(depth), "seconds": round(seconds, 3)})
+            if args.divide:
+                for turn, nodes in divide(board, royal_pawns, depth, generate).items():
+                    print(f"    {turn:24} {nodes}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# bench/replay_bench.py
+"""
+Banc des replays animés (/replay) : temps de fabrication, poids du fichier et mémoire du processus
+pour une longue partie jouée au hasard.
+
+    python -m bench.replay_bench --actions 600
+    python -m bench.replay_bench --actions 1000 --formats webp --json replay.json
+"""
+
+import argparse
+import json
+import random
+import resource
+import time
+import tracemalloc
+from typing import Optional
+
+import chess
+
+from royal import render_worker
+from royal.engine import generate_turns, play_turn
+from royal.record import GameRecord, encode
+from royal.render import REPLAY_FORMATS, REPLAY_FRAME_MS, REPLAY_LAST_FRAME_MS, RENDER_SIZE
+from royal.rules import king_capture_winner
+
+
+def random_game(actions: int, seed: int) -> GameRecord:
+    """Partie d'au moins `actions` actions (tours au hasard, on recommence si un roi tombe trop tôt)."""
+    rng = random.Random(seed)
+    while True:
+        board, royal_pawns, played = chess.Board(), set(), []
+        while len(played) < actions:
+            turn = rng.choice(generate_turns(board, royal_pawns))
+            played.extend(turn)
+            royal_pawns = play_turn(board, royal_pawns, turn)
+            if king_capture_winner(board) is not None:
+                break
+        if len(played) >= actions:
+            return GameRecord(chess.STARTING_FEN, frozenset(), tuple(played))
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actions", type=int, default=600, help="longueur de la partie")
+    parser.add_argument("--formats", nargs="+", default=list(REPLAY_FORMATS), choices=REPLAY_FORMATS)
+    parser.add_argument("--size", type=int, default=RENDER_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    args = parser.parse_args(argv)
+
+    record = encode(random_game(args.actions, args.seed))
+    render_worker.warm_up()
+    report = {"config": vars(args), "record_bytes": len(record)}
+    for image_format in args.formats:
+        tracemalloc.start()
+        started = time.perf_counter()
+        data, _ = render_worker.render_replay(record, image_format, args.size, REPLAY_FRAME_MS, REPLAY_LAST_FRAME_MS)
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report[image_format] = {
+            "seconds": round(seconds, 2),
+            "bytes": len(data),
+            "python_peak_kib": peak // 1024,
+            "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        }
+        print(f"{image_format:5} {report[image_format]}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
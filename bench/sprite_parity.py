@@ -0,0 +1,109 @@
+# bench/sprite_parity.py
+"""
+Vérifie le compositeur de sprites (royal/sprites.py) contre le rendu SVG (chess.svg + cairosvg) :
+mêmes positions, mêmes surbrillances, pixels comparés un à un, puis débit de chaque moteur.
+
+Une position échoue si plus de `--max-pixels` de ses pixels s'écartent de plus de `--tolerance`
+(sur un canal) de l'image SVG ; le code de sortie vaut alors 1.
+
+    python -m bench.sprite_parity
+    python -m bench.sprite_parity --positions 200 --repeat 3 --json parity.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from io import BytesIO
+from typing import Optional
+
+import chess
+from PIL import Image, ImageChops
+
+from bench.engine_bench import sample_positions
+from royal import render_worker
+from royal.render import RENDER_BACKENDS
+from royal.sprites import BOARD_SIZE, HIGHLIGHT_COLORS
+
+# Surbrillances comme en partie : dernier coup, pions royaux, et parfois une case d'alerte.
+LAST_MOVE, _, ALERT, ROYAL = HIGHLIGHT_COLORS
+
+
+def sample_fills(positions: list[tuple[str, list[int]]], seed: int) -> list[tuple[str, dict[int, str]]]:
+    rng = random.Random(seed)
+    samples = []
+    for fen, royal_pawns in positions:
+        fill = dict.fromkeys(rng.sample(chess.SQUARES, 2), LAST_MOVE)
+        fill.update(dict.fromkeys(royal_pawns, ROYAL))
+        if rng.random() < 0.25:
+            fill[rng.choice(chess.SQUARES)] = rng.choice(HIGHLIGHT_COLORS)
+        samples.append((fen.split()[0], fill))
+    return samples
+
+
+def decode_rgb(data: bytes) -> Image.Image:
+    return Image.open(BytesIO(data)).convert("RGB")
+
+
+def compare(board_fen: str, fill: dict[int, str], tolerance: int) -> dict:
+    """Écart maximal sur un canal et part des pixels au-delà de la tolérance."""
+    images = {backend: decode_rgb(render_worker.render_image(backend, board_fen, fill, {}, "png", BOARD_SIZE)[0])
+              for backend in RENDER_BACKENDS}
+    # Écart par pixel = le plus grand des trois canaux.
+    channels = ImageChops.difference(images["svg"], images["sprite"]).split()
+    difference = ImageChops.lighter(ImageChops.lighter(channels[0], channels[1]), channels[2])
+    histogram = difference.histogram()
+    over = sum(histogram[tolerance + 1:])
+    return {
+        "max_diff": max(value for value, count in enumerate(histogram) if count),
+        "pixels_over": round(over / (BOARD_SIZE * BOARD_SIZE), 6),
+    }
+
+
+def throughput(samples: list[tuple[str, dict[int, str]]], backend: str, repeat: int) -> float:
+    """Images PNG par seconde, encodage compris (comme dans un processus de rendu)."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for board_fen, fill in samples:
+            render_worker.render_image(backend, board_fen, fill, {}, "png", BOARD_SIZE)
+    return repeat * len(samples) / (time.perf_counter() - started)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tolerance", type=int, default=4, help="écart toléré sur un canal (0-255)")
+    parser.add_argument("--max-pixels", type=float, default=0.005, help="part maximale de pixels au-delà de la tolérance")
+    parser.add_argument("--repeat", type=int, default=2, help="passes sur les positions pour mesurer le débit")
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    args = parser.parse_args(argv)
+
+    render_worker.warm_up()
+    samples = sample_fills(sample_positions(args.positions, args.seed), args.seed)
+    report = {"config": vars(args), "mismatches": []}
+    worst = {"max_diff": 0, "pixels_over": 0.0}
+    for board_fen, fill in samples:
+        result = compare(board_fen, fill, args.tolerance)
+        worst = {key: max(worst[key], result[key]) for key in worst}
+        if result["pixels_over"] > args.max_pixels:
+            mismatch = {"board_fen": board_fen, "fill": {chess.square_name(square): color for square, color in fill.items()}, **result}
+            report["mismatches"].append(mismatch)
+            print(f"ÉCART {board_fen} : {result['pixels_over']:.2%} des pixels, jusqu'à {result['max_diff']}")
+    report["worst"] = worst
+    print(f"{len(samples) - len(report['mismatches'])}/{len(samples)} positions identiques à la tolérance près "
+          f"(écart maximal {worst['max_diff']}, au pire {worst['pixels_over']:.3%} des pixels au-delà de {args.tolerance})")
+
+    report["throughput"] = {backend: round(throughput(samples, backend, args.repeat), 1) for backend in RENDER_BACKENDS}
+    report["speedup"] = round(report["throughput"]["sprite"] / report["throughput"]["svg"], 2)
+    print(f"débit : svg {report['throughput']['svg']} images/s, sprite {report['throughput']['sprite']} images/s "
+          f"(× {report['speedup']})")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 1 if report["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,14 @@
 # bot.py
 
+import time
+STARTED_AT = time.perf_counter() # Pour le rapport de démarrage (voir royal/startup.py)
+
 import discord
 from discord.ext import commands
 import logging
 import os
 import asyncio
+import signal
 
     # Forcer la mise à jour de Render v1.1
 
@@ -16,42 +20,76 @@ from dotenv import load_dotenv
 load_dotenv() # Cette ligne est utile pour tester sur ton PC
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 
-logging.basicConfig(
-    level=logging.INFO,
+from royal.cluster import CLUSTER_ID, sharding_options
+from royal.logs import setup_logging
+from royal.startup import StartupTimer, sync_if_changed
+
+startup = StartupTimer(origin=STARTED_AT)
+startup.mark("imports")
+
+# Les lignes de journal sont écrites par un thread à part (royal/logs.py) : la boucle asyncio n'attend jamais le terminal.
+setup_logging(
     format='%(asctime)s - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="/", intents=intents)
+# Sharding (voir royal/cluster.py) : un bot classique par défaut, AutoShardedBot avec BOT_SHARDING=auto,
+# ou seulement quelques shards quand le processus est lancé par supervisor.py.
+shard_options = sharding_options()
+if shard_options is None:
+    bot = commands.Bot(command_prefix="/", intents=intents)
+else:
+    bot = commands.AutoShardedBot(command_prefix="/", intents=intents, **shard_options)
 
 # --- DÉMARRAGE ASYNCHRONE ET CHARGEMENT DES COGS ---
 async def main():
     # On utilise 'async with' pour une gestion propre de la connexion et déconnexion.
     async with bot:
-        # On parcourt tous les fichiers dans le dossier 'cogs'.
-        for filename in os.listdir('./cogs'):
-            # On ne charge que les fichiers qui se terminent par .py
-            if filename.endswith('.py'):
-                try:
-                    # On charge le cog en utilisant son nom de fichier (sans le .py)
-                    await bot.load_extension(f'cogs.{filename[:-3]}')
-                    logging.info(f"✅ Cog '{filename}' chargé avec succès.")
-                except Exception as e:
-                    logging.error(f"❌ Erreur lors du chargement du cog '{filename}': {e}")
-        
-        # On démarre le bot APRÈS avoir chargé les cogs.
-        await bot.start(DISCORD_TOKEN)
+        # Arrêt propre sur SIGTERM (superviseur, hébergeur) : les cogs vident leurs écritures avant de quitter.
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            # Windows : pas de gestionnaire de signal dans la boucle, on passe par signal.signal.
+            signal.signal(signal.SIGTERM, lambda *_: loop.call_soon_threadsafe(lambda: asyncio.create_task(bot.close())))
+        # On charge tous les cogs du dossier 'cogs' en même temps : les imports et cog_load se recouvrent.
+        extensions = [f'cogs.{filename[:-3]}' for filename in sorted(os.listdir('./cogs')) if filename.endswith('.py')]
+        with startup.step("cogs"):
+            await asyncio.gather(*(load_cog(extension) for extension in extensions))
+
+        # On démarre le bot APRÈS avoir chargé les cogs (login puis connexion, comme bot.start).
+        with startup.step("login"):
+            await bot.login(DISCORD_TOKEN)
+        await bot.connect()
+
+async def load_cog(extension: str):
+    started = time.perf_counter()
+    try:
+        await bot.load_extension(extension)
+        logging.info(f"✅ Cog '{extension}' chargé avec succès en {time.perf_counter() - started:.2f} s.")
+    except Exception as e:
+        logging.error(f"❌ Erreur lors du chargement du cog '{extension}': {e}")
 
 # --- ÉVÉNEMENT DE DÉMARRAGE ---
 @bot.event
 async def on_ready():
-    logging.info(f'--- {bot.user.name} est en ligne ! ---')
-    try:
-        synced = await bot.tree.sync()
-        logging.info(f"Synchronisé {len(synced)} commande(s).")
-    except Exception as e:
-        logging.error(f"Erreur de synchronisation : {e}")
+    logging.info(f'--- {bot.user.name} est en ligne ! (shards {getattr(bot, "shard_ids", None) or "-"}, cluster {CLUSTER_ID}) ---')
+    # on_ready revient à chaque reconnexion : la synchro et le rapport ne se font qu'une fois.
+    if startup.reported:
+        return
+    startup.mark("ready")
+    # Les commandes sont globales : un seul processus du cluster les synchronise, et seulement si elles ont changé.
+    if CLUSTER_ID == 0:
+        try:
+            with startup.step("sync"):
+                # L'empreinte de la dernière synchro est gardée dans la base de jeu (celle du cog d'échecs).
+                store = getattr(bot.get_cog("ChessCog"), "store", None)
+                if not await sync_if_changed(bot.tree, bot.application_id, store):
+                    logging.info("Commandes inchangées : pas de synchronisation.")
+        except Exception as e:
+            logging.error(f"Erreur de synchronisation : {e}")
+    logging.info(f"⏱️ Démarrage : {startup.report()}")
 
 # --- DÉMARRAGE DU BOT (LA PARTIE LA PLUS IMPORTANTE !) ---
 # C'est cette section qui lance toute la machine.
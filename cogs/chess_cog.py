@@ -1,20 +1,72 @@
 # cogs/chess_cog.py
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 from io import BytesIO
+from collections import OrderedDict
+import asyncio
+import contextvars
+import hashlib
+import logging
+import time
+import uuid
 import chess
-import chess.svg
-import cairosvg
-from typing import Optional
+import chess.polyglot
+from typing import Optional, Union
 import random
 from discord import ui
 from discord import SelectOption
+from royal import metrics, profiling
+from royal.cluster import owns_guild
+from royal.engine import ENGINE_LEVELS, EngineError, describe_turn, get_engine, shutdown_engine
+from royal.explorer import EXPLORER_INDEX_INTERVAL, ExplorerIndex, ExplorerStats
+from royal.manager import GameManager
+from royal.matchmaking import MATCH_TICK, RATING_PROVISIONAL_GAMES, MatchQueue, Ratings, Waiting
+from royal.movegen import build_move_table
+from royal.prerender import PRERENDER_BUDGET, prerender
+from royal.record import encode as encode_record
+from royal.render import (IMAGE_EXTENSIONS, RENDER_BACKEND, RENDER_DEGRADED_SIZE, RENDER_FORMAT, RENDER_FORMATS, RENDER_PREWARM,
+                          RENDER_SIZE, REPLAY_FORMATS, RenderError, get_renderer, shutdown_renderer)
+from royal.rules import apply_action, king_capture_winner
+from royal.shedding import LoadShedder, TextBoard, text_board
+from royal.spectate import SPECTATE_MAX_PER_GAME, Frame, SpectatorHub
+from royal.store import GAME_SNAPSHOT_EVERY, GameStore
+from royal.tournament import TOURNAMENT_FORMATS, Tournament, TournamentGame, TournamentHub
+
+# Composants qui ne font que choisir (pièce, cible, capacité) sans toucher à l'échiquier :
+# si le même joueur reclique dessus avant que le premier clic soit traité, seul le dernier compte.
+COALESCED_COMPONENTS = frozenset({
+    "piece_select", "cancel_btn", "teleport_target_white_select", "teleport_target_black_select",
+    "rescue_team_piece_select", "mind_control_target_select", "royal_promotion_start_btn",
+    "double_assault_start_btn", "teleport_start_btn", "rescue_team_start_btn", "mind_control_start_btn",
+})
+SEEN_INTERACTIONS = 64 # IDs d'interaction retenus par partie pour repérer les doublons
+MESSAGE_LIMIT = 2000 # Caractères par message Discord
+# Valeurs d'un menu pour un clic transmis à une partie reconstruite (voir ChessCog.on_interaction).
+_forwarded_values: contextvars.ContextVar[Optional[list[str]]] = contextvars.ContextVar("royal_forwarded_values", default=None)
+
+
+def parse_message_id(text: str) -> Optional[int]:
+    """ID d'un message donné tel quel ou par son lien (qui se termine par l'ID)."""
+    last = text.strip().rstrip("/").rsplit("/", 1)[-1]
+    return int(last) if last.isdigit() else None
+
+
+def chunk_lines(lines: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Regroupe des lignes en messages d'au plus `limit` caractères."""
+    chunks, current = [], ""
+    for line in lines:
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line[:limit]
+    return chunks + [current] if current else chunks
 
 # --- L'INTERFACE DE JEU ---
 class GameView(ui.View):
-    def __init__(self, game_board: chess.Board, white_player: discord.Member, black_player: discord.Member):
+    def __init__(self, game_board: chess.Board, white_player: discord.abc.User, black_player: discord.abc.User,
+                 store: Optional[GameStore] = None, game_id: Optional[str] = None):
         super().__init__(timeout=None)
         self.board = game_board
         self.white_player = white_player
@@ -22,82 +74,420 @@ class GameView(ui.View):
         self.selected_square: Optional[int] = None
         self.ability_piece_type: Optional[chess.PieceType] = None
         self.mind_control_target: Optional[int] = None
+        self.teleport_target: Optional[int] = None
         self.royal_pawns = set() # Pour stocker les cases (int) des pions royaux
+        self.stage = "selection" # Étape de l'interface affichée (sauvegardée pour pouvoir la reconstruire)
+        # --- Sauvegarde (voir royal/store.py) ---
+        self.store = store
+        self.game_id = game_id or uuid.uuid4().hex
+        self.action_seq = 0 # Numéro de la dernière action jouée
+        self._actions_since_snapshot = 0
+        # Message de la partie (renseigné à l'envoi) et dernière interaction, pour le GameManager
+        self.message_id: Optional[int] = None
+        self.channel_id: Optional[int] = None
+        self.guild_id: Optional[int] = None
+        self.last_interaction = time.monotonic()
+        self.render_backend = RENDER_BACKEND # "svg" ou "sprite" (voir royal/render.py)
+        self.image_format = RENDER_FORMAT # "png", "png8" ou "webp" (réglable par serveur avec /affichage)
+        self.image_size = RENDER_SIZE
+        self.shown_image: Optional[str] = None # Empreinte de l'image actuellement jointe au message
+        self._move_table_key = None
+        self._move_table: dict[int, chess.SquareSet] = {}
+        # Un seul clic à la fois modifie la partie (l'échiquier est modifié sur place : push, pop, changement de tour...).
+        self._lock = asyncio.Lock()
+        self._seen_interactions: OrderedDict[int, None] = OrderedDict()
+        self._latest_clicks: dict[tuple[str, int], int] = {} # (custom_id, joueur) -> ID du dernier clic reçu
+        self._interface_generation = 0 # Incrémenté par clear_items : un composant d'une génération passée est périmé
+        # Pré-rendu des prochaines images pendant la réflexion du joueur (voir royal/prerender.py)
+        self._prerender_task: Optional[asyncio.Task] = None
+        self._prerender_key = None
+        # Partie contre l'ordinateur (voir royal/engine.py) : son niveau, et la recherche en cours
+        self.engine_level: Optional[str] = None
+        self._engine_task: Optional[asyncio.Task] = None
+        # Messages spectateurs (voir royal/spectate.py) et dernier état qui leur a été publié
+        self.spectators: Optional[SpectatorHub] = None
+        self._broadcast_state = None
+        self.outcome: Optional[str] = None
+        # Classements Elo (voir royal/matchmaking.py), mis à jour à la fin des parties entre joueurs
+        self.ratings: Optional[Ratings] = None
+        # Allègement de l'affichage sous charge (voir royal/shedding.py)
+        self.shedder: Optional[LoadShedder] = None
+        # Tournois (voir royal/tournament.py), prévenus de la fin de chaque partie
+        self.tournaments: Optional[TournamentHub] = None
         self.create_selection_interface()
         
-    # Dans la classe GameView (vous pouvez l'ajouter après la méthode __init__)
+    @classmethod
+    def from_record(cls, record: dict, white_player: discord.abc.User, black_player: discord.abc.User, store: GameStore) -> "GameView":
+        """Reconstruit une partie sauvegardée : dernier instantané, actions jouées depuis, puis l'interface affichée."""
+        view = cls(chess.Board(record["fen"]), white_player, black_player, store=store, game_id=record["id"])
+        view.royal_pawns = set(record["royal_pawns"])
+        view.engine_level = record.get("engine_level")
+        view.action_seq = record["seq"]
+        for seq, action in record["actions"]:
+            apply_action(view.board, view.royal_pawns, action)
+            view.action_seq = seq
+        view._actions_since_snapshot = len(record["actions"])
+        view.message_id, view.channel_id, view.guild_id = record["message_id"], record["channel_id"], record["guild_id"]
+        view.restore_interface(record["ui"])
+        # Inconnue après un redémarrage : la première image sera renvoyée, par prudence.
+        view.shown_image = record.get("shown_image")
+        return view
+
+    def to_record(self) -> dict:
+        """Forme compacte de la partie, relisible par from_record."""
+        board, actions = self.board, []
+        if self.stage == "double_assault_2" and self.board.move_stack:
+            # Le premier saut doit rester annulable : on le garde comme action à rejouer.
+            board = self.board.copy(stack=1); last_move = board.pop()
+            actions = [(self.action_seq, ("double1", last_move.from_square, last_move.to_square))]
+        return {
+            "id": self.game_id,
+            "guild_id": self.guild_id,
+            "channel_id": self.channel_id,
+            "message_id": self.message_id,
+            "white_id": self.white_player.id,
+            "black_id": self.black_player.id,
+            "fen": board.fen(),
+            "royal_pawns": sorted(self.royal_pawns),
+            "seq": self.action_seq - len(actions),
+            "actions": actions,
+            "ui": self.ui_state(),
+            "engine_level": self.engine_level,
+            "shown_image": self.shown_image,
+        }
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        self.last_interaction = time.monotonic()
+        return True
 
-    def _update_royal_pawn_status(self, move: chess.Move):
+    def add_item(self, item: ui.Item) -> "GameView":
+        # Selon la version de discord.py, clear_items() remet ou non item.view à None : on garde nous-mêmes
+        # la partie et la génération de l'interface où le composant a été ajouté.
+        item.game_view = self
+        item.interface_generation = self._interface_generation
+        return super().add_item(item)
+
+    def clear_items(self) -> "GameView":
+        self._interface_generation += 1
+        return super().clear_items()
+
+    async def dispatch_click(self, item: ui.Item, interaction: discord.Interaction, handle):
         """
-        Met à jour le set des pions royaux après un coup.
-        Cette méthode gère correctement les déplacements simples et les captures.
+        Exécute le callback d'un composant, un clic à la fois pour cette partie.
+        Les autres parties ne sont pas bloquées : chacune a son propre verrou.
         """
-        # Étape 1 : On vérifie si une pièce CAPTURÉE était un pion royal.
-        # Cette vérification doit se faire AVANT de mettre à jour le pion qui se déplace.
-        is_capture = self.board.is_capture(move)
-        if is_capture and move.to_square in self.royal_pawns:
-            self.royal_pawns.remove(move.to_square)
+        # Interaction livrée deux fois : la première y répond déjà.
+        if interaction.id in self._seen_interactions:
+            metrics.CLICKS_DROPPED.inc(reason="duplicate")
+            return
+        self._seen_interactions[interaction.id] = None
+        if len(self._seen_interactions) > SEEN_INTERACTIONS:
+            self._seen_interactions.popitem(last=False)
+        click_key = (item.custom_id, interaction.user.id)
+        self._latest_clicks[click_key] = interaction.id
 
-        # Étape 2 : On vérifie si la pièce qui SE DÉPLACE est un pion royal et on met à jour sa position.
-        if move.from_square in self.royal_pawns:
-            self.royal_pawns.remove(move.from_square)
-            self.royal_pawns.add(move.to_square)
+        with metrics.interaction(item.custom_id, game_id=self.game_id), profiling.watch(item.custom_id, game_id=self.game_id):
+            with metrics.phase("queue"):
+                await self._lock.acquire()
+            try:
+                if item.interface_generation != self._interface_generation:
+                    # L'interface a changé pendant l'attente : ce composant n'existe plus.
+                    metrics.CLICKS_DROPPED.inc(reason="stale")
+                    await interaction.response.send_message("La partie a avancé entre-temps : ce clic a été ignoré.", ephemeral=True)
+                    return
+                if item.custom_id in COALESCED_COMPONENTS and self._latest_clicks.get(click_key) != interaction.id:
+                    # Un clic plus récent du même joueur sur le même menu attend derrière : on ne garde que celui-là.
+                    metrics.CLICKS_DROPPED.inc(reason="coalesced")
+                    await interaction.response.defer()
+                    return
+                try:
+                    await handle(interaction)
+                except RenderError as e:
+                    # L'action est déjà jouée et sauvegardée : le message doit montrer la nouvelle position.
+                    await self.show_text_position(interaction, e)
+                self.schedule_broadcast()
+                self.schedule_engine_turn(interaction)
+                self.schedule_prerender()
+            finally:
+                if self._latest_clicks.get(click_key) == interaction.id:
+                    del self._latest_clicks[click_key]
+                self._lock.release()
 
-        
-    # Dans la classe GameView
-    def get_all_possible_moves(self, square: int) -> list[int]:
-        """Calcule tous les coups possibles pour une pièce, incluant les règles personnalisées."""
-        piece = self.board.piece_at(square)
-        if not piece:
-            return []
+    def schedule_prerender(self):
+        """Lance le pré-rendu de la position affichée ; celui d'une position précédente est annulé."""
+        if PRERENDER_BUDGET <= 0 or self.stage != "selection" or self.is_finished() or self.engine_to_move():
+            return
+        if self.display_mode() != "full":
+            return
+        key = (self.board.board_fen(), self.board.turn, frozenset(self.royal_pawns))
+        if key == self._prerender_key and self._prerender_task is not None and not self._prerender_task.done():
+            return
+        self.cancel_prerender()
+        self._prerender_key = key
+        # Contexte vierge : les rendus d'arrière-plan ne s'ajoutent pas à la fiche du clic qui les a lancés.
+        self._prerender_task = asyncio.get_running_loop().create_task(prerender(self), context=contextvars.Context())
+        self._prerender_task.add_done_callback(self._prerender_done)
 
-        # On commence avec les coups de base de la bibliothèque (captures, etc.)
-        possible_moves = [move.to_square for move in self.board.pseudo_legal_moves if move.from_square == square]
-        
-        # On ajoute nos règles personnalisées
-        if piece.piece_type == chess.PAWN:
-            direction = 8 if piece.color == chess.WHITE else -8
-            
-            # Règle : Reculer d'une case (pour tous les pions)
-            back_square = square - direction
-            if 0 <= back_square < 64 and not self.board.piece_at(back_square):
-                if back_square not in possible_moves: possible_moves.append(back_square)
-                
-            # --- DÉBUT DE LA CORRECTION POUR LE PION ROYAL ---
-            if square in self.royal_pawns:
-                # On vérifie les mouvements vers l'avant pas à pas
-                one_step = square + direction
-                if 0 <= one_step < 64 and self.board.piece_at(one_step) is None:
-                    # Le pion royal peut toujours avancer d'une case
-                    if one_step not in possible_moves: possible_moves.append(one_step)
-
-                    two_steps = square + (2 * direction)
-                    # S'il peut avancer d'une case, peut-il en avancer de deux ?
-                    if 0 <= two_steps < 64 and self.board.piece_at(two_steps) is None:
-                        if two_steps not in possible_moves: possible_moves.append(two_steps)
-
-                        three_steps = square + (3 * direction)
-                        # S'il peut avancer de deux cases, peut-il en avancer de trois ?
-                        if 0 <= three_steps < 64 and self.board.piece_at(three_steps) is None:
-                            if three_steps not in possible_moves: possible_moves.append(three_steps)
-
-                # Se déplacer sur les diagonales avant (sans capture)
-                file, _ = chess.square_file(square), chess.square_rank(square)
-                if file > 0: # Diagonale gauche
-                    diag_left = square + direction - 1
-                    if 0 <= diag_left < 64 and self.board.piece_at(diag_left) is None:
-                        if diag_left not in possible_moves: possible_moves.append(diag_left)
-                if file < 7: # Diagonale droite
-                    diag_right = square + direction + 1
-                    if 0 <= diag_right < 64 and self.board.piece_at(diag_right) is None:
-                        if diag_right not in possible_moves: possible_moves.append(diag_right)
-            # --- FIN DE LA CORRECTION ---
-                        
-        return possible_moves
+    def cancel_prerender(self):
+        if self._prerender_task is not None and not self._prerender_task.done():
+            self._prerender_task.cancel()
+        self._prerender_task = None
+        self._prerender_key = None
+
+    @staticmethod
+    def _prerender_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f"Pré-rendu interrompu : {task.exception()!r}")
+
+    def engine_to_move(self) -> bool:
+        """Vrai si c'est à l'ordinateur de jouer (il a pour compte utilisateur celui du bot)."""
+        player = self.white_player if self.board.turn == chess.WHITE else self.black_player
+        return self.engine_level is not None and getattr(player, "bot", False)
+
+    def schedule_engine_turn(self, target):
+        """
+        Fait jouer l'ordinateur si c'est son tour. `target` sert à modifier le message de la partie :
+        l'interaction du dernier clic, ou le message lui-même (début de partie, redémarrage).
+        """
+        if self.stage != "selection" or self.is_finished() or not self.engine_to_move():
+            return
+        if self._engine_task is not None and not self._engine_task.done():
+            return
+        self._engine_task = asyncio.get_running_loop().create_task(self.play_engine_turn(target), context=contextvars.Context())
+
+    async def play_engine_turn(self, target):
+        seq = self.action_seq
+        with metrics.interaction("engine_turn", game_id=self.game_id, level=self.engine_level):
+            try:
+                turn = await get_engine().choose_turn(self.board.fen(), self.royal_pawns, self.engine_level)
+            except EngineError as e:
+                logging.error(f"❌ L'ordinateur n'a pas pu jouer dans la partie {self.game_id} : {e}")
+                return
+            async with self._lock:
+                # Un abandon (ou autre) est passé pendant la réflexion : ce coup ne vaut plus rien.
+                if self.action_seq != seq or self.is_finished():
+                    return
+                for action in turn:
+                    self.apply(action)
+                played = f"🤖 L'ordinateur a joué : **{describe_turn(turn)}**."
+                try:
+                    winner_color = king_capture_winner(self.board)
+                    if winner_color is not None:
+                        winner = "Blancs" if winner_color == chess.WHITE else "Noirs"
+                        self.finish(winner_color, "roi capturé"); final_image = await self.generate_board_image()
+                        await self.update_message(target, content=f"{played}\n**Partie terminée ! Le roi a été capturé. Victoire des {winner} !**", attachments=[final_image], view=self)
+                        self.schedule_broadcast()
+                        return
+                    self.create_selection_interface(); new_image = await self.generate_board_image()
+                    next_player_mention = self.white_player.mention if self.board.turn else self.black_player.mention
+                    await self.update_message(target, content=f"{played} C'est au tour de {next_player_mention}.", attachments=[new_image], view=self)
+                except RenderError as e:
+                    await self.show_text_position(target, e, played)
+                self.schedule_broadcast()
+        self.schedule_prerender()
+
+    def spectator_content(self) -> str:
+        header = f"👀 {self.white_player.mention} (Blancs) contre {self.black_player.mention} (Noirs)"
+        if self.is_finished():
+            return f"{header}\n**Partie terminée.** {self.outcome or ''}"
+        turn = "Blancs" if self.board.turn == chess.WHITE else "Noirs"
+        return f"{header}\nAction n°{self.action_seq}, au tour des {turn}."
+
+    async def spectator_frame(self) -> Frame:
+        """Position actuelle telle que la voient les spectateurs (sans les surbrillances de sélection)."""
+        seq, content, mode = self.action_seq, self.spectator_content(), self.display_mode()
+        if mode == "text":
+            return Frame(seq, f"{content}\n{text_board(self.board.board_fen(), self.royal_pawns)}", None, "")
+        size = self.image_size if mode == "full" else min(self.image_size, RENDER_DEGRADED_SIZE)
+        image = await get_renderer().render(self.board.board_fen(), self.frame_fill({}), {}, backend=self.render_backend,
+                                            image_format=self.image_format, size=size)
+        return Frame(seq, content, image, f"echiquier.{IMAGE_EXTENSIONS[self.image_format]}")
+
+    def schedule_broadcast(self, force: bool = False):
+        """
+        Publie la position aux spectateurs si elle a changé depuis la dernière publication (ou si `force`).
+        Un seul rendu par position, quel que soit le nombre de spectateurs (et c'est souvent celui des joueurs, déjà en cache).
+        """
+        if self.spectators is None or not self.spectators.watching(self.game_id):
+            return
+        state = (self.action_seq, self.is_finished())
+        if state == self._broadcast_state and not force:
+            return
+        self._broadcast_state = state
+        asyncio.get_running_loop().create_task(self._broadcast(state), context=contextvars.Context())
+
+    async def _broadcast(self, state: tuple):
+        try:
+            frame = await self.spectator_frame()
+        except RenderError as e:
+            logging.warning(f"Position non diffusée aux spectateurs de la partie {self.game_id} : {e}")
+            return
+        # Une position plus récente est partie entre-temps : elle seule compte.
+        if state != self._broadcast_state:
+            return
+        metrics.SPECTATOR_RENDERS.inc()
+        self.spectators.publish(self.game_id, frame)
+        if state[1]:
+            self.spectators.close_game(self.game_id)
+            if self.store:
+                self.store.remove_spectators(self.game_id)
+
+    def stop(self):
+        # Fin de partie ou éviction par le GameManager : plus la peine de préparer des images ni de chercher un coup.
+        self.cancel_prerender()
+        if self._engine_task is not None and not self._engine_task.done() and self._engine_task is not asyncio.current_task():
+            self._engine_task.cancel()
+        super().stop()
+
+    def apply(self, action: tuple):
+        """Joue une action (voir royal/rules.py) et l'ajoute au journal de la partie."""
+        apply_action(self.board, self.royal_pawns, action)
+        self.cancel_prerender() # Les images préparées concernaient la position précédente
+        self.action_seq += 1
+        self._actions_since_snapshot += 1
+        if not self.store:
+            return
+        self.store.append_action(self.game_id, self.action_seq, action)
+        # Pas d'instantané au milieu d'un Double Assaut : le premier saut doit encore pouvoir être annulé.
+        if self._actions_since_snapshot >= GAME_SNAPSHOT_EVERY and action[0] != "double1":
+            self.store.save_snapshot(self.game_id, self.action_seq, self.board.fen(), self.royal_pawns)
+            self._actions_since_snapshot = 0
+
+    def finish(self, winner: Optional[chess.Color], reason: str):
+        """Termine la partie (nulle si `winner` est None) : plus aucun bouton actif, et elle n'est plus restaurée au redémarrage."""
+        self.disable_all_items()
+        self.stage = "finished"
+        if winner is None:
+            result, white_score, self.outcome = "1/2-1/2", 0.5, f"Partie nulle ({reason})."
+        else:
+            result, white_score = ("1-0", 1.0) if winner == chess.WHITE else ("0-1", 0.0)
+            self.outcome = f"Victoire des {'Blancs' if winner == chess.WHITE else 'Noirs'} ({reason})."
+        if self.shedder is not None:
+            self.shedder.forget(self.game_id)
+        if self.store:
+            self.store.finish_game(self.game_id, result, reason)
+        if self.ratings is not None and self.engine_level is None and self.white_player.id != self.black_player.id:
+            asyncio.get_running_loop().create_task(self.ratings.record_game(self.white_player.id, self.black_player.id, white_score))
+        if self.tournaments is not None:
+            self.tournaments.game_finished(self.game_id, result)
+
+    async def adjourn(self, target, reason: str):
+        """Arrête la partie sur une nulle (fin du temps de ronde d'un tournoi) et met à jour son message."""
+        async with self._lock:
+            if self.is_finished():
+                return
+            self.finish(None, reason)
+            final_image = await self.generate_board_image()
+            await self.update_message(target, content=f"**Partie terminée : {reason}.** Partie nulle.", attachments=[final_image], view=self)
+        self.schedule_broadcast()
+
+    def ui_state(self) -> dict:
+        return {
+            "stage": self.stage,
+            "selected_square": self.selected_square,
+            "ability_piece_type": self.ability_piece_type,
+            "mind_control_target": self.mind_control_target,
+            "teleport_target": self.teleport_target,
+        }
+
+    def _set_stage(self, stage: str):
+        self.stage = stage
+        if self.store:
+            self.store.save_ui(self.game_id, self.ui_state())
+
+    def restore_interface(self, ui_state: Optional[dict]):
+        """Remet les composants de l'étape sauvegardée, pour que ceux du message continuent de fonctionner."""
+        if not ui_state or ui_state["stage"] in ("selection", "finished"):
+            self.create_selection_interface()
+            return
+        stage = ui_state["stage"]
+        self.selected_square = ui_state["selected_square"]
+        self.ability_piece_type = ui_state["ability_piece_type"]
+        self.mind_control_target = ui_state["mind_control_target"]
+        self.teleport_target = ui_state["teleport_target"]
+        square = self.selected_square
+
+        if stage == "piece": self.create_action_and_destination_interface(square)
+        elif stage == "double_assault_1": self.create_double_assault_interface(square, self.get_all_possible_moves(square), step=1)
+        elif stage == "double_assault_2": self.create_double_assault_interface(square, self.get_all_possible_moves(square), step=2)
+        elif stage == "teleport_target": self.create_teleport_target_interface()
+        elif stage == "teleport_destination": self.create_teleport_destination_interface(self.teleport_target, self.empty_neighbors(self.teleport_target))
+        elif stage == "rescue_piece": self.create_rescue_team_piece_select_interface(self.rescue_team_piece_options())
+        elif stage == "rescue_destination": self.create_rescue_team_destination_interface(self.square_options(self.empty_neighbors(square)))
+        elif stage == "mind_control_target": self.create_mind_control_target_interface(self.mind_control_target_options()[0])
+        elif stage == "mind_control_destination": self.create_mind_control_destination_interface(self.mind_control_destination_options(self.mind_control_target))
+        elif stage == "royal_promotion_target": self.create_royal_promotion_target_interface(self.royal_promotion_options())
+        else: self.create_selection_interface()
+
+    # --- OPTIONS DES MENUS (partagées entre les callbacks et la restauration) ---
+    @staticmethod
+    def square_options(squares) -> list[discord.SelectOption]:
+        return [discord.SelectOption(label=chess.square_name(sq), value=str(sq)) for sq in squares]
+
+    def empty_neighbors(self, square: int) -> list[int]:
+        """Cases vides autour d'une pièce (Téléportation, Équipe de secours)."""
+        return [sq for sq in chess.SquareSet(chess.BB_KING_ATTACKS[square]) if self.board.piece_at(sq) is None]
+
+    def royal_promotion_options(self) -> list[discord.SelectOption]:
+        allied_pawns = []
+        # On cherche tous les pions de la couleur du joueur
+        for pawn_square, pawn_piece in self.board.piece_map().items():
+            if pawn_piece.piece_type == chess.PAWN and pawn_piece.color == self.board.turn:
+                # On s'assure qu'il n'est pas déjà un pion royal
+                if pawn_square not in self.royal_pawns:
+                    allied_pawns.append(discord.SelectOption(
+                        label=f"Pion en {chess.square_name(pawn_square)}",
+                        value=str(pawn_square)
+                    ))
+        return allied_pawns
+
+    def rescue_team_piece_options(self) -> list[discord.SelectOption]:
+        initial_counts = { chess.PAWN: 8, chess.KNIGHT: 2, chess.BISHOP: 2, chess.ROOK: 2, chess.QUEEN: 1 }
+        captured_pieces_options = []
+        for piece_type, initial_count in initial_counts.items():
+            if len(self.board.pieces(piece_type, self.board.turn)) < initial_count:
+                captured_pieces_options.append(discord.SelectOption(label=chess.piece_name(piece_type).capitalize(), value=str(piece_type)))
+        return captured_pieces_options
+
+    def mind_control_target_options(self) -> tuple[list[discord.SelectOption], list[int]]:
+        target_options = []
+        valid_targets = []
+        for target_square, piece in self.board.piece_map().items():
+            if piece.color != self.board.turn and piece.piece_type != chess.KING:
+                label = f"{chess.piece_name(piece.piece_type).capitalize()} en {chess.square_name(target_square)}"
+                target_options.append(discord.SelectOption(label=label, value=str(target_square)))
+                valid_targets.append(target_square)
+        return target_options, valid_targets
+
+    def mind_control_destination_options(self, target_square: int) -> list[discord.SelectOption]:
+        # On a besoin d'inverser le tour pour que board.san() fonctionne correctement.
+        possible_moves_obj = [chess.Move(target_square, dest) for dest in self.get_all_possible_moves(target_square)]
+        self.board.turn = not self.board.turn
+        destination_options = [discord.SelectOption(label=self.board.san(m), value=m.uci()) for m in possible_moves_obj]
+        self.board.turn = not self.board.turn # Restauration immédiate de l'état correct
+        return destination_options
+
+    def move_table(self) -> dict[int, chess.SquareSet]:
+        """
+        Table des coups de la position courante, pour toutes les pièces des deux couleurs.
+        Elle n'est recalculée que lorsque la position (hash Zobrist) ou les pions royaux changent.
+        """
+        key = (chess.polyglot.zobrist_hash(self.board), self.board.ep_square, frozenset(self.royal_pawns))
+        if key != self._move_table_key:
+            with metrics.phase("movegen"):
+                self._move_table = build_move_table(self.board, self.royal_pawns)
+            self._move_table_key = key
+        return self._move_table
+
+    # Dans la classe GameView
+    def get_all_possible_moves(self, square: int) -> chess.SquareSet:
+        """Calcule tous les coups possibles pour une pièce (de n'importe quelle couleur), incluant les règles personnalisées."""
+        return self.move_table().get(square, chess.SquareSet())
     # Dans la classe GameView
     def create_action_and_destination_interface(self, square: int):
         self.clear_items()
         self.selected_square = square
+        self._set_stage("piece")
         piece = self.board.piece_at(square)
 
         # --- PARTIE 1 : Création du menu des destinations ---
@@ -127,16 +517,21 @@ class GameView(ui.View):
             self.selected_square = None
             self.ability_piece_type = None
             self.mind_control_target = None
+            self.teleport_target = None
+            self._set_stage("selection")
 
             # --- NOUVELLE LOGIQUE DE SÉLECTION ---
             piece_options = []
             current_turn_color = self.board.turn
+            move_table = self.move_table()
             # On parcourt toutes les pièces sur l'échiquier
             for square, piece in self.board.piece_map().items():
                 # Si la pièce appartient au joueur dont c'est le tour
                 if piece.color == current_turn_color:
-                    # On vérifie si la pièce a au moins un coup pseudo-légal
-                    # (pour ne pas proposer des pièces complètement bloquées)
+                    # On ne propose pas les pièces complètement bloquées : un pion ou un cavalier
+                    # sans coup n'a rien à faire (les autres pièces gardent leur capacité).
+                    if not move_table[square] and piece.piece_type in (chess.PAWN, chess.KNIGHT):
+                        continue
                 
                     piece_name_fr = {
                         chess.PAWN: "Pion", chess.KNIGHT: "Cavalier", chess.BISHOP: "Fou",
@@ -153,6 +548,7 @@ class GameView(ui.View):
             self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))    
     def create_double_assault_interface(self, from_square: int, possible_moves: list[int], step: int):
         self.clear_items(); self.selected_square = from_square
+        self._set_stage("double_assault_1" if step == 1 else "double_assault_2")
         placeholder = "Première destination..." if step == 1 else "Seconde destination..."
         custom_id = "double_assault_move1_select" if step == 1 else "double_assault_move2_select"
         move_options = [discord.SelectOption(label=chess.square_name(sq), value=str(sq)) for sq in possible_moves]
@@ -161,7 +557,7 @@ class GameView(ui.View):
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id=cancel_custom_id))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
     def create_teleport_target_interface(self):
-        self.clear_items()
+        self.clear_items(); self._set_stage("teleport_target")
         white_options = []; black_options = []
         for square, piece in self.board.piece_map().items():
             piece_name = chess.piece_name(piece.piece_type).capitalize(); label = f"{piece_name} en {chess.square_name(square)}"
@@ -173,47 +569,122 @@ class GameView(ui.View):
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id="cancel_btn"))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
     def create_teleport_destination_interface(self, target_square: int, possible_destinations: list[int]):
-        self.clear_items()
+        self.clear_items(); self.teleport_target = target_square; self._set_stage("teleport_destination")
         move_options = [discord.SelectOption(label=chess.square_name(sq), value=str(sq)) for sq in possible_destinations]
         self.add_item(Dropdown(placeholder="Choisissez la case d'atterrissage...", options=move_options, custom_id="teleport_destination_select"))
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id="cancel_btn"))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
     def create_rescue_team_piece_select_interface(self, piece_options: list[discord.SelectOption]):
-        self.clear_items()
+        self.clear_items(); self._set_stage("rescue_piece")
         self.add_item(Dropdown(placeholder="Quelle pièce capturée ramener ?", options=piece_options, custom_id="rescue_team_piece_select"))
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id="cancel_btn"))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
     def create_rescue_team_destination_interface(self, destination_options: list[discord.SelectOption]):
-        self.clear_items()
+        self.clear_items(); self._set_stage("rescue_destination")
         self.add_item(Dropdown(placeholder="Où la placer ?", options=destination_options, custom_id="rescue_team_destination_select"))
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id="cancel_btn"))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
     def create_mind_control_target_interface(self, target_options: list[discord.SelectOption]):
-        self.clear_items()
+        self.clear_items(); self._set_stage("mind_control_target")
         self.add_item(Dropdown(placeholder="Quelle pièce ennemie contrôler ?", options=target_options, custom_id="mind_control_target_select"))
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id="cancel_btn"))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
     def create_mind_control_destination_interface(self, destination_options: list[discord.SelectOption]):
-        self.clear_items()
+        self.clear_items(); self._set_stage("mind_control_destination")
         self.add_item(Dropdown(placeholder="Quel coup forcer ?", options=destination_options, custom_id="mind_control_destination_select"))
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id="cancel_btn"))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
-    async def generate_board_image(self, **kwargs) -> discord.File:
-        fill_colors = kwargs.pop('fill', {}) # Récupère les couleurs existantes
-    
-    # Ajoute la couleur dorée pour les pions royaux
-        for royal_pawn_square in self.royal_pawns:
-        # On ne surcharge pas une couleur de sélection ou de mouvement
+    def frame_fill(self, fill: dict[int, str], royal_pawns: Optional[set] = None) -> dict[int, str]:
+        """Couleurs de cases d'une image : `fill`, plus l'or des pions royaux là où `fill` ne met rien."""
+        fill_colors = dict(fill)
+        for royal_pawn_square in self.royal_pawns if royal_pawns is None else royal_pawns:
+            # On ne surcharge pas une couleur de sélection ou de mouvement
             if royal_pawn_square not in fill_colors:
                 fill_colors[royal_pawn_square] = "#ffd700aa" # Or avec transparence
-            
-        svg_board = chess.svg.board(board=self.board, fill=fill_colors, **kwargs)
-        png_board = cairosvg.svg2png(bytestring=svg_board.encode('utf-8'))
-        return discord.File(fp=BytesIO(png_board), filename="echiquier.png")
+        return fill_colors
+
+    def selection_fill(self, square: int) -> dict[int, str]:
+        """Couleurs affichées quand la pièce de `square` est sélectionnée : elle-même et ses destinations."""
+        selection_color = "#ffcc00aa"; moves_color = "#228B22aa"
+        fill_colors = dict.fromkeys(self.get_all_possible_moves(square), moves_color)
+        fill_colors[square] = selection_color
+        return fill_colors
+
+    def display_mode(self) -> str:
+        """« full », « lowres » ou « text » selon la charge (voir royal/shedding.py)."""
+        return self.shedder.mode(self.game_id) if self.shedder is not None else "full"
+
+    async def generate_board_image(self, backend: Optional[str] = None, **kwargs) -> Union[discord.File, TextBoard]:
+        fill = kwargs.pop('fill', {})
+        fill_colors = self.frame_fill(fill)
+        mode = self.display_mode()
+        metrics.annotate(display_mode=mode)
+        if mode == "text":
+            # Aucun rendu : l'échiquier part dans le texte du message (voir update_message).
+            return TextBoard(f"{text_board(self.board.board_fen(), self.royal_pawns, fill)}\n-# Affichage allégé pendant un pic de charge.")
+        if self.shedder is not None:
+            self.shedder.note_render(self.game_id)
+
+        # Le SVG et la rastérisation se font dans un processus de rendu : la boucle reste libre.
+        size = self.image_size if mode == "full" else min(self.image_size, RENDER_DEGRADED_SIZE)
+        try:
+            with metrics.phase("render"):
+                image = await get_renderer().render(self.board.board_fen(), fill_colors, kwargs, backend=backend or self.render_backend,
+                                                    image_format=self.image_format, size=size)
+        except RenderError as e:
+            # Pool saturé ou rendu trop long : c'est précisément le cas du mode texte.
+            logging.warning(f"Image de la partie {self.game_id} indisponible, échiquier envoyé en texte : {e}")
+            metrics.annotate(display_mode="text")
+            return TextBoard(f"{text_board(self.board.board_fen(), self.royal_pawns, fill)}\n-# Image indisponible pour le moment : affichage en texte.")
+        metrics.annotate(image_bytes=len(image), image_format=self.image_format)
+        return discord.File(fp=BytesIO(image), filename=f"echiquier.{IMAGE_EXTENSIONS[self.image_format]}")
+
+    async def show_text_position(self, target, error: RenderError, prefix: str = ""):
+        """L'image n'a pas pu être fabriquée : le message montre quand même la position actuelle, en caractères."""
+        logging.warning(f"Image de la partie {self.game_id} indisponible, échiquier envoyé en texte : {error}")
+        if self.is_finished():
+            status = f"**Partie terminée.** {self.outcome or ''}"
+        else:
+            status = f"C'est au tour de {self.white_player.mention if self.board.turn else self.black_player.mention}."
+        board = TextBoard(f"{text_board(self.board.board_fen(), self.royal_pawns)}\n-# Image indisponible pour le moment : réessayez dans un instant.")
+        await self.update_message(target, content=f"{prefix} {status}".strip(), attachments=[board], view=self)
+
+    async def update_message(self, target, **kwargs):
+        """
+        Met à jour le message de la partie : par l'interaction du clic (réponse directe, ou après un defer()),
+        ou directement par le message quand l'ordinateur joue hors d'un clic.
+        Si l'image est identique à celle déjà jointe au message, on ne la renvoie pas :
+        sans `attachments`, Discord garde le fichier en place et seuls le texte et les composants changent.
+        """
+        digest = None
+        files = kwargs.get("attachments")
+        if files and len(files) == 1 and isinstance(files[0], TextBoard):
+            # Mode allégé : l'échiquier passe dans le texte, et l'image précédente (qui n'est plus à jour) est retirée.
+            kwargs["content"] = f"{kwargs.get('content') or ''}\n{files[0].text}"
+            kwargs["attachments"] = []
+            digest = ""
+            metrics.UPLOADS.inc(result="text")
+        elif files and len(files) == 1 and isinstance(files[0], discord.File):
+            digest = hashlib.sha256(files[0].fp.getbuffer()).hexdigest()
+            if digest == self.shown_image:
+                del kwargs["attachments"]
+                metrics.UPLOADS.inc(result="skipped")
+            else:
+                metrics.UPLOADS.inc(result="sent")
+        with metrics.phase("upload"):
+            response = getattr(target, "response", None)
+            if response is None:
+                await target.edit(**kwargs)
+            elif response.is_done():
+                await target.edit_original_response(**kwargs)
+            else:
+                await response.edit_message(**kwargs)
+        if digest is not None:
+            self.shown_image = digest or None
     def disable_all_items(self):
         for item in self.children: item.disabled = True; self.stop()
     def create_royal_promotion_target_interface(self, pawn_options: list[discord.SelectOption]):
-        self.clear_items()
+        self.clear_items(); self._set_stage("royal_promotion_target")
         self.add_item(Dropdown(placeholder="Quel pion anoblir ?", options=pawn_options, custom_id="royal_promotion_target_select"))
         self.add_item(Button(label="Annuler", style=discord.ButtonStyle.secondary, custom_id="cancel_btn"))
         self.add_item(Button(label="Abandonner", style=discord.ButtonStyle.danger, row=4, custom_id="forfeit_btn"))
@@ -223,10 +694,20 @@ class GameView(ui.View):
 
 # --- COMPOSANTS D'INTERFACE ---
 class Dropdown(ui.Select):
+    @property
+    def values(self) -> list[str]:
+        # discord.py remplit les valeurs avant d'appeler le callback ; un clic transmis après reconstruction
+        # de la partie les apporte lui-même (propres à la tâche du clic, comme celles de discord.py).
+        forwarded = _forwarded_values.get()
+        return forwarded if forwarded is not None else super().values
+
     async def callback(self, interaction: discord.Interaction):
-        view: GameView = self.view
+        await self.game_view.dispatch_click(self, interaction, self.handle)
+
+    async def handle(self, interaction: discord.Interaction):
+        view: GameView = self.game_view
         current_player = view.white_player if view.board.turn == chess.WHITE else view.black_player
-        if interaction.user != current_player:
+        if interaction.user.id != current_player.id:
             await interaction.response.send_message("Ce n'est pas votre tour de jouer !", ephemeral=True)
             return
         from_square = view.selected_square
@@ -238,86 +719,72 @@ class Dropdown(ui.Select):
             
             # --- NOUVELLE LOGIQUE SIMPLIFIÉE ---
             # On appelle notre nouvelle fonction unifiée
-            possible_moves = view.create_action_and_destination_interface(selected_square)
+            view.create_action_and_destination_interface(selected_square)
             
-            # On prépare l'image pour la réponse
-
-            selection_color = "#ffcc00aa"; moves_color = "#228B22aa"
-            fill_colors = dict.fromkeys(chess.SquareSet(possible_moves), moves_color)
-            fill_colors[selected_square] = selection_color
-            new_image = await view.generate_board_image(fill=fill_colors)
+            # On prépare l'image pour la réponse (souvent déjà pré-rendue, voir royal/prerender.py)
+            new_image = await view.generate_board_image(fill=view.selection_fill(selected_square))
 
-            await interaction.edit_original_response(content=f"Pièce en **{chess.square_name(selected_square)}** sélectionnée. Choisissez un coup ou une capacité.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Pièce en **{chess.square_name(selected_square)}** sélectionnée. Choisissez un coup ou une capacité.", attachments=[new_image], view=view)
         elif self.custom_id == "destination_select":
-            to_square = int(self.values[0]); move = chess.Move(from_square, to_square)
-                        # On met à jour la position du pion royal s'il a bougé
-                        
-            view._update_royal_pawn_status(move)
-            view.board.push(move)
+            to_square = int(self.values[0])
+            # On joue le coup (la position du pion royal est mise à jour s'il a bougé)
+            view.apply(("move", from_square, to_square))
     
-            if not view.board.king(chess.WHITE) or not view.board.king(chess.BLACK):
-                winner = "Noirs" if not view.board.king(chess.WHITE) else "Blancs"
-                view.disable_all_items(); final_image = await view.generate_board_image()
-                await interaction.response.edit_message(content=f"**Partie terminée ! Le roi a été capturé. Victoire des {winner} !**", attachments=[final_image], view=view)
+            winner_color = king_capture_winner(view.board)
+            if winner_color is not None:
+                winner = "Blancs" if winner_color == chess.WHITE else "Noirs"
+                view.finish(winner_color, "roi capturé"); final_image = await view.generate_board_image()
+                await view.update_message(interaction, content=f"**Partie terminée ! Le roi a été capturé. Victoire des {winner} !**", attachments=[final_image], view=view)
                 return
             view.create_selection_interface(); new_image = await view.generate_board_image()
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Coup joué ! C'est au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Coup joué ! C'est au tour de {next_player_mention}.", attachments=[new_image], view=view)
         elif self.custom_id == "royal_promotion_target_select":
             pawn_to_promote_square = int(self.values[0])
         
-            # On ajoute le pion à notre liste de suivi
-            view.royal_pawns.add(pawn_to_promote_square)
-        
-            # On passe le tour
-            view.board.push(chess.Move.null())
+            # On ajoute le pion à notre liste de suivi et on passe le tour
+            view.apply(("royal", pawn_to_promote_square))
         
             view.create_selection_interface()
             # On surligne le nouveau pion royal en or
             new_image = await view.generate_board_image(fill={pawn_to_promote_square: "#ffd700aa"})
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Le pion en **{chess.square_name(pawn_to_promote_square)}** est devenu un **Pion Royal** ! Au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Le pion en **{chess.square_name(pawn_to_promote_square)}** est devenu un **Pion Royal** ! Au tour de {next_player_mention}.", attachments=[new_image], view=view)
 
         elif self.custom_id == "double_assault_move1_select":
-            to_square = int(self.values[0]); move = chess.Move(from_square, to_square)
-                
-                        
-            view._update_royal_pawn_status(move)
-        
-
-            view.board.push(move); view.board.turn = not view.board.turn
+            to_square = int(self.values[0])
+            # Premier saut : le tour reste au même joueur
+            view.apply(("double1", from_square, to_square))
             
-            if not view.board.king(chess.WHITE) or not view.board.king(chess.BLACK):
-                winner = "Noirs" if not view.board.king(chess.WHITE) else "Blancs"
-                view.disable_all_items(); final_image = await view.generate_board_image()
-                await interaction.response.edit_message(content=f"**Partie terminée ! Le roi a été capturé. Victoire des {winner} !**", attachments=[final_image], view=view)
+            winner_color = king_capture_winner(view.board)
+            if winner_color is not None:
+                winner = "Blancs" if winner_color == chess.WHITE else "Noirs"
+                view.finish(winner_color, "roi capturé"); final_image = await view.generate_board_image()
+                await view.update_message(interaction, content=f"**Partie terminée ! Le roi a été capturé. Victoire des {winner} !**", attachments=[final_image], view=view)
                 return
             new_from_square = to_square
-            possible_moves = [m.to_square for m in view.board.pseudo_legal_moves if m.from_square == new_from_square]
+            possible_moves = view.get_all_possible_moves(new_from_square)
             view.create_double_assault_interface(new_from_square, possible_moves, step=2)
             selection_color = "#ffcc00aa"; moves_color = "#228B22aa"
             fill_colors = dict.fromkeys(chess.SquareSet(possible_moves), moves_color); fill_colors[new_from_square] = selection_color
             new_image = await view.generate_board_image(fill=fill_colors)
-            await interaction.response.edit_message(content=f"Premier coup joué ! Choisissez la seconde destination pour le cavalier en **{chess.square_name(new_from_square)}**.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Premier coup joué ! Choisissez la seconde destination pour le cavalier en **{chess.square_name(new_from_square)}**.", attachments=[new_image], view=view)
         elif self.custom_id == "double_assault_move2_select":
-            to_square = int(self.values[0]); move = chess.Move(from_square, to_square)
-                        # On met à jour la position du pion royal s'il a bougé
-                        
-            view._update_royal_pawn_status(move)
-            view.board.push(move)
+            to_square = int(self.values[0])
+            view.apply(("double2", from_square, to_square))
         
-            if not view.board.king(chess.WHITE) or not view.board.king(chess.BLACK):
-                winner = "Noirs" if not view.board.king(chess.WHITE) else "Blancs"
-                view.disable_all_items(); final_image = await view.generate_board_image()
-                await interaction.response.edit_message(content=f"**Partie terminée ! Le roi a été capturé. Victoire des {winner} !**", attachments=[final_image], view=view)
+            winner_color = king_capture_winner(view.board)
+            if winner_color is not None:
+                winner = "Blancs" if winner_color == chess.WHITE else "Noirs"
+                view.finish(winner_color, "roi capturé"); final_image = await view.generate_board_image()
+                await view.update_message(interaction, content=f"**Partie terminée ! Le roi a été capturé. Victoire des {winner} !**", attachments=[final_image], view=view)
                 return
             view.create_selection_interface(); new_image = await view.generate_board_image()
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Double Assaut terminé ! C'est au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Double Assaut terminé ! C'est au tour de {next_player_mention}.", attachments=[new_image], view=view)
         elif self.custom_id in ["teleport_target_white_select", "teleport_target_black_select"]:
             target_square = int(self.values[0])
-            neighbor_squares = chess.SquareSet(chess.BB_KING_ATTACKS[target_square])
-            possible_destinations = [sq for sq in neighbor_squares if view.board.piece_at(sq) is None]
+            possible_destinations = view.empty_neighbors(target_square)
             if not possible_destinations:
                 await interaction.response.send_message("Il n'y a aucune case d'atterrissage VIDE autour de cette pièce.", ephemeral=True); return
             view.create_teleport_destination_interface(target_square, possible_destinations)
@@ -325,36 +792,32 @@ class Dropdown(ui.Select):
             fill_colors = dict.fromkeys(chess.SquareSet(possible_destinations), moves_color)
             fill_colors[from_square] = selection_color; fill_colors[target_square] = target_color
             new_image = await view.generate_board_image(fill=fill_colors)
-            await interaction.response.edit_message(content="Cible sélectionnée. Choisissez une case d'atterrissage.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content="Cible sélectionnée. Choisissez une case d'atterrissage.", attachments=[new_image], view=view)
         elif self.custom_id == "teleport_destination_select":
             to_square = int(self.values[0])
-            bishop_piece = view.board.remove_piece_at(from_square)
-            view.board.set_piece_at(to_square, bishop_piece)
-            view.board.push(chess.Move.null())
+            view.apply(("teleport", from_square, to_square))
             view.create_selection_interface(); new_image = await view.generate_board_image()
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Téléportation réussie ! C'est au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Téléportation réussie ! C'est au tour de {next_player_mention}.", attachments=[new_image], view=view)
         elif self.custom_id == "rescue_team_piece_select":
             view.ability_piece_type = int(self.values[0])
             rook_square = from_square
-            neighbor_squares = chess.SquareSet(chess.BB_KING_ATTACKS[rook_square])
-            empty_squares = [sq for sq in neighbor_squares if view.board.piece_at(sq) is None]
+            empty_squares = view.empty_neighbors(rook_square)
             if not empty_squares:
                 await interaction.response.send_message("Il n'y a aucune case vide autour de votre tour pour placer la pièce.", ephemeral=True); return
-            destination_options = [discord.SelectOption(label=chess.square_name(sq), value=str(sq)) for sq in empty_squares]
+            destination_options = view.square_options(empty_squares)
             view.create_rescue_team_destination_interface(destination_options)
             selection_color = "#ffcc00aa"; moves_color = "#228B22aa"
             fill_colors = dict.fromkeys(chess.SquareSet(empty_squares), moves_color); fill_colors[rook_square] = selection_color
             new_image = await view.generate_board_image(fill=fill_colors)
-            await interaction.response.edit_message(content="Pièce choisie. Maintenant, sélectionnez une case vide pour la faire revenir.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content="Pièce choisie. Maintenant, sélectionnez une case vide pour la faire revenir.", attachments=[new_image], view=view)
         elif self.custom_id == "rescue_team_destination_select":
             to_square = int(self.values[0])
             new_piece = chess.Piece(view.ability_piece_type, view.board.turn)
-            view.board.set_piece_at(to_square, new_piece)
-            view.board.push(chess.Move.null())
+            view.apply(("rescue", view.ability_piece_type, to_square))
             view.create_selection_interface(); new_image = await view.generate_board_image()
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Équipe de secours réussie ! Un(e) {chess.piece_name(new_piece.piece_type)} est de retour ! Au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Équipe de secours réussie ! Un(e) {chess.piece_name(new_piece.piece_type)} est de retour ! Au tour de {next_player_mention}.", attachments=[new_image], view=view)
         # Dans la classe Dropdown, méthode callback
         elif self.custom_id == "mind_control_target_select":
             # On diffère la réponse pour éviter les timeouts
@@ -366,23 +829,17 @@ class Dropdown(ui.Select):
             # --- DÉBUT DE LA CORRECTION SÉCURISÉE ---
 
             # Étape 1 : Calculer les coups possibles de la pièce ennemie
-            # On inverse le tour JUSTE pour le calcul, puis on le restaure immédiatement.
-            view.board.turn = not view.board.turn
+            # Le générateur se base sur la couleur de la pièce : plus besoin d'inverser le tour.
             destination_squares = view.get_all_possible_moves(target_square)
-            view.board.turn = not view.board.turn # Restauration immédiate de l'état correct
 
             # Si aucun coup n'est possible, on peut s'arrêter ici en toute sécurité.
             if not destination_squares:
                 # On utilise edit_original_response car on a "defer" au début
-                await interaction.edit_original_response(content="Cette pièce ennemie ne peut effectuer aucun coup.", view=view)
+                await view.update_message(interaction, content="Cette pièce ennemie ne peut effectuer aucun coup.", view=view)
                 return
 
             # Étape 2 : Obtenir la notation des coups (ex: "Nf3")
-            # On a besoin de ré-inverser le tour pour que board.san() fonctionne correctement.
-            possible_moves_obj = [chess.Move(target_square, dest) for dest in destination_squares]
-            view.board.turn = not view.board.turn
-            destination_options = [discord.SelectOption(label=view.board.san(m), value=m.uci()) for m in possible_moves_obj]
-            view.board.turn = not view.board.turn # Restauration immédiate de l'état correct
+            destination_options = view.mind_control_destination_options(target_square)
 
             # --- FIN DE LA CORRECTION SÉCURISÉE ---
 
@@ -396,7 +853,7 @@ class Dropdown(ui.Select):
             fill_colors[from_square] = selection_color; fill_colors[target_square] = target_color
             new_image = await view.generate_board_image(fill=fill_colors)
             
-            await interaction.edit_original_response(
+            await view.update_message(interaction,
                 content="Pièce ennemie sous contrôle. Quel coup désastreux allez-vous la forcer à jouer ?", 
                 attachments=[new_image], 
                 view=view
@@ -404,33 +861,26 @@ class Dropdown(ui.Select):
         elif self.custom_id == "mind_control_destination_select":
             move_uci = self.values[0]
             forced_move = chess.Move.from_uci(move_uci)
-                        # On met à jour la position du pion royal s'il a bougé
-            view._update_royal_pawn_status(forced_move)
-            view.board.turn = not view.board.turn; view.board.push(forced_move); view.board.turn = not view.board.turn
+            # On met à jour la position du pion royal s'il a bougé, puis on joue le coup pour l'adversaire
+            view.apply(("mind", forced_move.from_square, forced_move.to_square))
             view.create_selection_interface(); new_image = await view.generate_board_image()
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Contrôle mental réussi ! Le coup forcé a été joué. C'est maintenant au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Contrôle mental réussi ! Le coup forcé a été joué. C'est maintenant au tour de {next_player_mention}.", attachments=[new_image], view=view)
         else: await interaction.response.defer()
 
 class Button(ui.Button):
     async def callback(self, interaction: discord.Interaction):
-        view: GameView = self.view
+        await self.game_view.dispatch_click(self, interaction, self.handle)
+
+    async def handle(self, interaction: discord.Interaction):
+        view: GameView = self.game_view
         current_player = view.white_player if view.board.turn == chess.WHITE else view.black_player
-        if interaction.user != current_player:
+        if interaction.user.id != current_player.id:
             await interaction.response.send_message("Ce n'est pas votre tour de jouer !", ephemeral=True)
             return
         square = view.selected_square
         if self.custom_id == "royal_promotion_start_btn":
-            allied_pawns = []
-            # On cherche tous les pions de la couleur du joueur
-            for pawn_square, pawn_piece in view.board.piece_map().items():
-                if pawn_piece.piece_type == chess.PAWN and pawn_piece.color == view.board.turn:
-                    # On s'assure qu'il n'est pas déjà un pion royal
-                    if pawn_square not in view.royal_pawns:
-                        allied_pawns.append(discord.SelectOption(
-                            label=f"Pion en {chess.square_name(pawn_square)}",
-                            value=str(pawn_square)
-                        ))
+            allied_pawns = view.royal_promotion_options()
             
             if not allied_pawns:
                 await interaction.response.send_message("Vous n'avez aucun pion non-royal à promouvoir.", ephemeral=True)
@@ -439,67 +889,58 @@ class Button(ui.Button):
             view.create_royal_promotion_target_interface(allied_pawns)
             
             selection_color = "#ffcc00aa"; target_color = "#ffd700aa" # Gold for pawns
-            fill_colors = {sq.value: target_color for sq in allied_pawns}
+            fill_colors = {int(sq.value): target_color for sq in allied_pawns}
             fill_colors[square] = selection_color
             new_image = await view.generate_board_image(fill=fill_colors)
 
-            await interaction.response.edit_message(content="**Promotion Royale** : Choisissez un pion à anoblir.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content="**Promotion Royale** : Choisissez un pion à anoblir.", attachments=[new_image], view=view)
 
         elif self.custom_id == "double_assault_start_btn":
-            possible_moves = [m.to_square for m in view.board.pseudo_legal_moves if m.from_square == square]
+            possible_moves = view.get_all_possible_moves(square)
             if not possible_moves: await interaction.response.send_message("Ce cavalier ne peut pas bouger.", ephemeral=True); return
             view.create_double_assault_interface(square, possible_moves, step=1)
             selection_color = "#ffcc00aa"; moves_color = "#228B22aa"
             fill_colors = dict.fromkeys(chess.SquareSet(possible_moves), moves_color); fill_colors[square] = selection_color
             new_image = await view.generate_board_image(fill=fill_colors)
-            await interaction.response.edit_message(content=f"Double Assaut : Choisissez la première destination pour le cavalier en **{chess.square_name(square)}**.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Double Assaut : Choisissez la première destination pour le cavalier en **{chess.square_name(square)}**.", attachments=[new_image], view=view)
         elif self.custom_id == "teleport_start_btn":
             view.create_teleport_target_interface()
             selection_color = "#ffcc00aa"
             fill_colors = {square: selection_color}
             new_image = await view.generate_board_image(fill=fill_colors)
-            await interaction.response.edit_message(content="Téléportation : Choisissez une pièce sur l'échiquier qui servira de balise.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content="Téléportation : Choisissez une pièce sur l'échiquier qui servira de balise.", attachments=[new_image], view=view)
         elif self.custom_id == "rescue_team_start_btn":
-            initial_counts = { chess.PAWN: 8, chess.KNIGHT: 2, chess.BISHOP: 2, chess.ROOK: 2, chess.QUEEN: 1 }
-            captured_pieces_options = []
-            for piece_type, initial_count in initial_counts.items():
-                if len(view.board.pieces(piece_type, view.board.turn)) < initial_count:
-                    captured_pieces_options.append(discord.SelectOption(label=chess.piece_name(piece_type).capitalize(), value=str(piece_type)))
+            captured_pieces_options = view.rescue_team_piece_options()
             if not captured_pieces_options:
                 await interaction.response.send_message("Aucune de vos pièces n'a été capturée.", ephemeral=True); return
             view.create_rescue_team_piece_select_interface(captured_pieces_options)
             new_image = await view.generate_board_image(fill={square: "#ffcc00aa"})
-            await interaction.response.edit_message(content="Équipe de secours : Une de vos pièces peut revenir au combat !", attachments=[new_image], view=view)
+            await view.update_message(interaction, content="Équipe de secours : Une de vos pièces peut revenir au combat !", attachments=[new_image], view=view)
         elif self.custom_id == "mind_control_start_btn":
-            target_options = []
-            valid_targets = []
-            for target_square, piece in view.board.piece_map().items():
-                if piece.color != view.board.turn and piece.piece_type != chess.KING:
-                    label = f"{chess.piece_name(piece.piece_type).capitalize()} en {chess.square_name(target_square)}"
-                    target_options.append(discord.SelectOption(label=label, value=str(target_square)))
-                    valid_targets.append(target_square)
+            target_options, valid_targets = view.mind_control_target_options()
             if not target_options:
                 await interaction.response.send_message("Il n'y a aucune pièce ennemie (hors Roi) à contrôler.", ephemeral=True); return
             view.create_mind_control_target_interface(target_options)
             selection_color = "#ffcc00aa"; target_color = "#ff4500aa"
             fill_colors = dict.fromkeys(chess.SquareSet(valid_targets), target_color); fill_colors[square] = selection_color
             new_image = await view.generate_board_image(fill=fill_colors)
-            await interaction.response.edit_message(content="Contrôle mental : Choisissez une victime...", attachments=[new_image], view=view)
+            await view.update_message(interaction, content="Contrôle mental : Choisissez une victime...", attachments=[new_image], view=view)
         elif self.custom_id == "forfeit_btn":
-            winner = view.black_player if interaction.user == view.white_player else view.white_player
-            view.disable_all_items()
+            winner_color = chess.BLACK if interaction.user.id == view.white_player.id else chess.WHITE
+            winner = view.white_player if winner_color == chess.WHITE else view.black_player
+            view.finish(winner_color, "abandon")
             final_image = await view.generate_board_image()
             content = f"**Partie terminée !** {interaction.user.mention} a abandonné. La victoire revient à {winner.mention} !"
-            await interaction.response.edit_message(content=content, attachments=[final_image], view=view)
+            await view.update_message(interaction, content=content, attachments=[final_image], view=view)
         elif self.custom_id == "cancel_ability_btn":
-            view.board.pop()
+            view.apply(("undo",))
             view.create_selection_interface(); new_image = await view.generate_board_image()
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Capacité annulée. C'est toujours au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Capacité annulée. C'est toujours au tour de {next_player_mention}.", attachments=[new_image], view=view)
         elif self.custom_id == "cancel_btn":
             view.create_selection_interface(); new_image = await view.generate_board_image()
             next_player_mention = view.white_player.mention if view.board.turn else view.black_player.mention
-            await interaction.response.edit_message(content=f"Sélection annulée. C'est toujours au tour de {next_player_mention}.", attachments=[new_image], view=view)
+            await view.update_message(interaction, content=f"Sélection annulée. C'est toujours au tour de {next_player_mention}.", attachments=[new_image], view=view)
 
 class GameRequestView(ui.View):
     message: discord.Message = None
@@ -508,13 +949,18 @@ class GameRequestView(ui.View):
         self.initiator = initiator
         self.opponent = opponent
         self.cog = cog
+        self.answered = False # Un double clic sur "Accepter" ne doit lancer qu'une partie
 
     @discord.ui.button(label="Accepter", style=discord.ButtonStyle.success)
     async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user != self.opponent:
             await interaction.response.send_message("Vous n'êtes pas l'adversaire ciblé pour cette partie.", ephemeral=True)
             return
-        
+        if self.answered:
+            await interaction.response.defer()
+            return
+        self.answered = True
+
         await interaction.response.edit_message(        
                                         content=f"🔥 Défi accepté par {interaction.user.mention} ! La partie commence.",        
                                         view=None  )
@@ -522,19 +968,7 @@ class GameRequestView(ui.View):
         # Assignation aléatoire des couleurs
         players = [self.initiator, self.opponent]
         random.shuffle(players)
-        white_player, black_player = players[0], players[1]
-
-        board = chess.Board()
-        view = GameView(game_board=board, white_player=white_player, black_player=black_player)
-        file = await view.generate_board_image()
-        
-        # Message de départ mis à jour
-        await interaction.followup.send(
-            f"Nouvelle partie lancée ! {white_player.mention} (Blancs) contre {black_player.mention} (Noirs).\n"
-            f"C'est au tour des Blancs ({white_player.mention}).",
-            file=file,
-            view=view
-        )
+        await self.cog.start_game(interaction, white_player=players[0], black_player=players[1])
         self.stop()
 
     @discord.ui.button(label="Refuser", style=discord.ButtonStyle.danger)
@@ -542,6 +976,10 @@ class GameRequestView(ui.View):
         if interaction.user != self.opponent:
             await interaction.response.send_message("Vous n'êtes pas l'adversaire ciblé pour cette partie.", ephemeral=True)
             return
+        if self.answered:
+            await interaction.response.defer()
+            return
+        self.answered = True
 
         await interaction.response.edit_message(content=f"Défi refusé par {interaction.user.mention}.", view=None)
         self.stop()
@@ -556,7 +994,303 @@ class GameRequestView(ui.View):
             await self.message.edit(content="**Ce défi a expiré.**", view=self)
 
 class ChessCog(commands.Cog):
-    def __init__(self, bot: commands.Bot): self.bot = bot
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.store = GameStore()
+        self.games = GameManager(self.rebuild_game)
+        self.guild_settings: dict[int, dict] = {} # Réglages d'affichage par serveur (voir /affichage)
+        self.spectators = SpectatorHub(self.edit_spectator)
+        self.ratings = Ratings(self.store)
+        self.shedder = LoadShedder(lambda: get_renderer().drain_waits(), lambda: get_renderer().occupancy())
+        self._shed_task: Optional[asyncio.Task] = None
+        self.queues: dict[int, MatchQueue] = {} # File d'attente de chaque serveur (voir /file_attente)
+        self._joining: set[int] = set() # Joueurs dont le /file_attente est en cours, avant leur entrée dans la file
+        self.tournaments = TournamentHub(self.store, self.launch_tournament_game, self.announce_tournament, self.adjourn_game)
+        self._tournament_task: Optional[asyncio.Task] = None
+        self.explorer = ExplorerIndex()
+        self.metrics_server: Optional[metrics.MetricsServer] = None
+        self._loop_watcher: Optional[asyncio.Task] = None
+        metrics.ACTIVE_GAMES.function = lambda: len(self.games.resident)
+        metrics.SPECTATORS.function = self.spectators.count
+        metrics.MATCH_QUEUE_DEPTH.function = lambda: sum(map(len, self.queues.values()))
+        metrics.SHED_LEVEL.function = lambda: self.shedder.level
+        metrics.SHED_GAMES.function = self.shedder.degraded_games
+        metrics.EVICTED_GAMES.function = lambda: len(self.games.evicted)
+        metrics.RENDER_PENDING.function = lambda: get_renderer().pending
+
+    async def cog_load(self):
+        self.guild_settings = await asyncio.to_thread(self.store.load_guild_settings)
+        for game_id, channel_id, message_id in await asyncio.to_thread(self.store.load_spectators):
+            self.spectators.add(game_id, channel_id, message_id)
+        self.tournaments.restore(await asyncio.to_thread(self.store.load_tournaments))
+        # Les parties sont restaurées une fois le bot connecté (il faut pouvoir retrouver les joueurs).
+        asyncio.create_task(self.restore_games())
+        if RENDER_PREWARM:
+            asyncio.create_task(self.prewarm_renderer())
+        self.evict_idle_games.start()
+        self.log_render_stats.start()
+        self.match_waiting.start()
+        self.index_explorer.start()
+        self._loop_watcher = asyncio.create_task(metrics.watch_event_loop(listener=self.shedder.observe_loop_lag))
+        self._shed_task = asyncio.create_task(self.shedder.run())
+        self._tournament_task = asyncio.create_task(self.tournaments.run())
+        metrics.enable_log_sink()
+        if metrics.METRICS_PORT:
+            try:
+                self.metrics_server = metrics.MetricsServer()
+                self.metrics_server.start()
+            except OSError as e:
+                logging.error(f"❌ Impossible d'ouvrir l'endpoint des métriques : {e}")
+                self.metrics_server = None
+
+    async def cog_unload(self):
+        # On arrête les processus de rendu avec le cog, et on vide les écritures en attente.
+        self.evict_idle_games.cancel()
+        self.log_render_stats.cancel()
+        self.match_waiting.cancel()
+        self.index_explorer.cancel()
+        if self._loop_watcher:
+            self._loop_watcher.cancel()
+        if self._shed_task:
+            self._shed_task.cancel()
+        if self._tournament_task:
+            self._tournament_task.cancel()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.spectators.shutdown()
+        shutdown_renderer()
+        shutdown_engine()
+        await asyncio.to_thread(profiling.shutdown_profiler)
+        await asyncio.to_thread(self.store.close)
+
+    async def rebuild_game(self, record: dict) -> GameView:
+        """Recrée la vue d'une partie (sauvegardée ou évincée) et la rebranche sur son message."""
+        white_player = await self.resolve_user(record["white_id"])
+        black_player = await self.resolve_user(record["black_id"])
+        view = GameView.from_record(record, white_player, black_player, self.store)
+        self.prepare_view(view)
+        self.bot.add_view(view, message_id=record["message_id"])
+        # Redémarrage pendant que l'ordinateur réfléchissait : il rejoue, en modifiant directement le message.
+        if view.engine_to_move() and record["channel_id"] is not None:
+            view.schedule_engine_turn(self.bot.get_partial_messageable(record["channel_id"]).get_partial_message(record["message_id"]))
+        return view
+
+    async def start_game(self, interaction: discord.Interaction, white_player: discord.abc.User, black_player: discord.abc.User,
+                         engine_level: Optional[str] = None) -> GameView:
+        """Envoie le message d'une nouvelle partie (en suivi de l'interaction, déjà répondue) et l'enregistre."""
+        return await self.open_game(interaction.followup.send, interaction.guild_id, interaction.channel_id,
+                                    white_player, black_player, engine_level=engine_level)
+
+    async def open_game(self, send, guild_id: Optional[int], channel_id: Optional[int], white_player: discord.abc.User,
+                        black_player: discord.abc.User, engine_level: Optional[str] = None, game_id: Optional[str] = None,
+                        title: str = "Nouvelle partie lancée !") -> GameView:
+        """Envoie le message d'une nouvelle partie avec `send` (suivi d'interaction ou salon) et l'enregistre."""
+        board = chess.Board()
+        view = GameView(game_board=board, white_player=white_player, black_player=black_player, store=self.store, game_id=game_id)
+        view.guild_id = guild_id
+        view.engine_level = engine_level
+        self.prepare_view(view)
+        board_image = await view.generate_board_image()
+        content = (f"{title} {white_player.mention} (Blancs) contre {black_player.mention} (Noirs).\n"
+                   f"C'est au tour des Blancs ({white_player.mention}).")
+
+        # Message de départ mis à jour (discord.py ferme le fichier après l'envoi : on prend l'empreinte avant)
+        if isinstance(board_image, TextBoard):
+            shown_image, extra = None, {}
+            content = f"{content}\n{board_image.text}"
+        else:
+            shown_image, extra = hashlib.sha256(board_image.fp.getbuffer()).hexdigest(), {"file": board_image}
+        message = await send(content, view=view, **extra)
+        # On sauvegarde la partie avec l'ID du message, pour pouvoir y rebrancher la vue après un redémarrage.
+        view.message_id, view.channel_id = message.id, channel_id
+        view.shown_image = shown_image
+        self.store.create_game(view.game_id, guild_id, channel_id, message.id,
+                               white_player.id, black_player.id, board.fen(), engine_level=engine_level)
+        self.games.track(view)
+        view.schedule_engine_turn(message)
+        view.schedule_prerender()
+        return view
+
+    def prepare_view(self, view: GameView):
+        """Branche une vue neuve ou reconstruite sur les services du cog."""
+        view.spectators = self.spectators
+        view.ratings = self.ratings
+        view.shedder = self.shedder
+        view.tournaments = self.tournaments
+        self.apply_image_settings(view)
+
+    def apply_image_settings(self, view: GameView):
+        settings = self.guild_settings.get(view.guild_id, {})
+        view.image_format = settings.get("image_format") or RENDER_FORMAT
+        view.image_size = settings.get("image_size") or RENDER_SIZE
+
+    @tasks.loop(minutes=10)
+    async def log_render_stats(self):
+        stats = get_renderer().output_stats()
+        if stats:
+            logging.info(f"🖼️ Poids moyen des images envoyées : {stats}")
+
+    @tasks.loop(seconds=60)
+    async def evict_idle_games(self):
+        evicted = self.games.evict_idle()
+        if evicted:
+            logging.info(f"💤 {evicted} partie(s) inactive(s) sortie(s) de la mémoire. {self.games.stats()}")
+
+    @tasks.loop(seconds=EXPLORER_INDEX_INTERVAL)
+    async def index_explorer(self):
+        """Ajoute à l'explorateur les parties terminées depuis la dernière passe (dans un thread : SQLite est bloquant)."""
+        try:
+            added = await asyncio.to_thread(self.explorer.index_store, self.store)
+        except Exception as e:
+            logging.error(f"❌ Indexation de l'explorateur impossible : {e!r}")
+            return
+        if added:
+            metrics.EXPLORER_GAMES.inc(added, source="store")
+            logging.info(f"🔭 {added} partie(s) ajoutée(s) à l'explorateur.")
+
+    @tasks.loop(seconds=MATCH_TICK)
+    async def match_waiting(self):
+        """Apparie les joueurs dont la fourchette s'est élargie, et renvoie ceux qui attendent depuis trop longtemps."""
+        now = time.monotonic()
+        pairs = []
+        # Une erreur ici arrêterait la boucle pour tous les serveurs : on la journalise et on repart au tick suivant.
+        try:
+            for queue in list(self.queues.values()):
+                for entry in queue.expire(now):
+                    metrics.MATCH_WAIT_SECONDS.observe(now - entry.joined, result="expired")
+                    try:
+                        await entry.payload.edit_original_response(content="Aucun adversaire trouvé pour le moment, réessayez un peu plus tard.")
+                    except discord.HTTPException:
+                        pass
+                pairs.extend(queue.pair_waiting(now))
+            await asyncio.gather(*(self.start_match(first, second, now) for first, second in pairs))
+        except Exception as e:
+            logging.error(f"❌ Erreur dans l'appariement des files d'attente : {e!r}")
+
+    async def start_match(self, first: Waiting, second: Waiting, now: float):
+        """Lance la partie de deux joueurs appariés, dans le salon de celui qui attendait depuis le plus longtemps."""
+        for entry in (first, second):
+            metrics.MATCH_WAIT_SECONDS.observe(now - entry.joined, result="matched")
+        host, guest = sorted((first, second), key=lambda entry: entry.joined)
+        players = [host.payload.user, guest.payload.user]
+        random.shuffle(players)
+        try:
+            view = await self.start_game(host.payload, white_player=players[0], black_player=players[1])
+        except (discord.HTTPException, RenderError) as e:
+            logging.error(f"❌ Impossible de lancer la partie de la file d'attente : {e}")
+            return
+        link = f"https://discord.com/channels/{view.guild_id}/{view.channel_id}/{view.message_id}"
+        for entry, opponent in ((host, guest), (guest, host)):
+            try:
+                await entry.payload.edit_original_response(
+                    content=f"⚔️ Adversaire trouvé : {opponent.payload.user.mention} (Elo {round(opponent.rating)}). La partie : {link}")
+            except discord.HTTPException:
+                pass
+
+    async def launch_tournament_game(self, tournament: Tournament, game: TournamentGame) -> Optional[int]:
+        """Lance une partie de tournoi dans le salon du tournoi ; renvoie l'ID de son message, ou None."""
+        channel = self.bot.get_partial_messageable(tournament.channel_id, guild_id=tournament.guild_id)
+        try:
+            white_player = await self.resolve_user(game.white_id)
+            black_player = await self.resolve_user(game.black_id)
+            view = await self.open_game(channel.send, tournament.guild_id, tournament.channel_id, white_player, black_player,
+                                        game_id=game.game_id, title=f"🏆 **{tournament.name}**, ronde {game.round} :")
+        except (discord.HTTPException, RenderError) as e:
+            logging.error(f"❌ Impossible de lancer une partie du tournoi {tournament.name} : {e}")
+            return None
+        self.games.track(view)
+        return view.message_id
+
+    async def announce_tournament(self, tournament: Tournament, lines: list[str], ping: bool):
+        # Appariements : un seul message (ou quelques-uns) qui prévient tous les joueurs de la ronde.
+        channel = self.bot.get_partial_messageable(tournament.channel_id, guild_id=tournament.guild_id)
+        mentions = discord.AllowedMentions(users=True) if ping else discord.AllowedMentions.none()
+        for chunk in chunk_lines(lines):
+            try:
+                await channel.send(chunk, allowed_mentions=mentions)
+            except discord.HTTPException as e:
+                logging.warning(f"Annonce du tournoi {tournament.name} non envoyée : {e}")
+                return
+
+    async def adjourn_game(self, message_id: int) -> bool:
+        """Arrête une partie de tournoi à la fin du temps de ronde ; False si elle est introuvable ou déjà finie."""
+        view = self.games.resident.get(message_id)
+        if view is None and self.games.is_evicted(message_id):
+            view = await self.games.rehydrate(message_id)
+        if view is None or view.is_finished():
+            return False
+        message = self.bot.get_partial_messageable(view.channel_id).get_partial_message(message_id)
+        try:
+            await view.adjourn(message, "temps de ronde écoulé")
+        except (discord.HTTPException, RenderError) as e:
+            # La partie est terminée (et comptée) même si son message n'a pas pu être mis à jour.
+            logging.warning(f"Message de la partie {view.game_id} non mis à jour : {e}")
+        return True
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        # Un clic sur une partie évincée n'a trouvé aucune vue : on la reconstruit puis on lui transmet le clic.
+        if interaction.type != discord.InteractionType.component or interaction.message is None:
+            return
+        if not self.games.is_evicted(interaction.message.id):
+            return
+        try:
+            view = await self.games.rehydrate(interaction.message.id)
+        except Exception as e:
+            logging.error(f"❌ Impossible de reconstruire la partie du message {interaction.message.id} : {e}")
+            return
+        # La vue est enregistrée (bot.add_view dans rebuild_game) : les clics suivants passent par discord.py.
+        # Celui-ci est transmis par l'API publique des vues, comme le ferait discord.py.
+        data = interaction.data
+        item = next((item for item in view.children if getattr(item, "custom_id", None) == data.get("custom_id")), None) if view else None
+        if item is None:
+            return
+        if isinstance(item, ui.Select):
+            _forwarded_values.set(list(data.get("values", [])))
+        if await view.interaction_check(interaction):
+            await item.callback(interaction)
+
+    async def edit_spectator(self, channel_id: int, message_id: int, frame: Frame) -> bool:
+        """Met à jour un message spectateur ; False s'il a été supprimé (ou n'est plus accessible)."""
+        message = self.bot.get_partial_messageable(channel_id).get_partial_message(message_id)
+        try:
+            files = [discord.File(fp=BytesIO(frame.image), filename=frame.filename)] if frame.image is not None else []
+            await message.edit(content=frame.content, attachments=files)
+        except (discord.NotFound, discord.Forbidden):
+            self.store.remove_spectator(message_id)
+            return False
+        return True
+
+    async def resolve_user(self, user_id: int) -> discord.User:
+        return self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+
+    async def prewarm_renderer(self):
+        # Après la connexion seulement : cairo et les processus de rendu ne ralentissent pas le démarrage.
+        await self.bot.wait_until_ready()
+        try:
+            await get_renderer().prewarm()
+        except Exception as e:
+            logging.error(f"❌ Échec du démarrage des processus de rendu : {e}")
+
+    async def restore_games(self):
+        """Recharge les parties en cours et rebranche leurs vues sur les messages existants."""
+        await self.bot.wait_until_ready()
+        records = await asyncio.to_thread(self.store.load_active_games)
+        # En mode cluster, chaque processus ne reprend que les parties des serveurs de ses shards.
+        records = [record for record in records if owns_guild(self.bot, record["guild_id"])]
+        restored = 0
+        for record in records:
+            if record["message_id"] is None:
+                continue
+            try:
+                view = await self.rebuild_game(record)
+            except Exception as e:
+                logging.error(f"❌ Impossible de restaurer la partie {record['id']} : {e}")
+                continue
+            self.games.track(view)
+            restored += 1
+        if records:
+            logging.info(f"♻️ {restored} partie(s) restaurée(s) sur {len(records)}.")
 
     async def send_message(self, member: discord.Member, content: str):
         try:
@@ -571,7 +1305,7 @@ class ChessCog(commands.Cog):
         # On ne fait plus de defer() ici. On répond directement.
         if adversaire.bot:
             # On envoie une réponse initiale et on s'arrête.
-            await interaction.response.send_message("Vous ne pouvez pas affronter un bot.", ephemeral=True)
+            await interaction.response.send_message("Vous ne pouvez pas affronter un bot. Pour jouer contre l'ordinateur : `/partie_ordi`.", ephemeral=True)
             return
         if adversaire == interaction.user:
             # Idem ici.
@@ -592,5 +1326,261 @@ class ChessCog(commands.Cog):
         message = await interaction.original_response()
         view.message = message
 
+    @app_commands.command(name="file_attente", description="Rejoint la file d'attente : un adversaire de niveau proche vous est trouvé.")
+    @app_commands.describe(quitter="Quitter la file au lieu de la rejoindre.")
+    @app_commands.guild_only()
+    async def file_attente(self, interaction: discord.Interaction, quitter: bool = False):
+        queue = self.queues.setdefault(interaction.guild_id, MatchQueue())
+        if quitter:
+            entry = queue.remove(interaction.user.id)
+            if entry is None:
+                await interaction.response.send_message("Vous n'êtes pas dans la file d'attente.", ephemeral=True)
+                return
+            metrics.MATCH_WAIT_SECONDS.observe(time.monotonic() - entry.joined, result="left")
+            await interaction.response.send_message("Vous avez quitté la file d'attente.", ephemeral=True)
+            return
+
+        user_id = interaction.user.id
+        if user_id in self._joining or any(user_id in other for other in self.queues.values()):
+            await interaction.response.send_message("Vous êtes déjà dans une file d'attente.", ephemeral=True)
+            return
+        # Place réservée avant le premier await : un second appel rapide du même joueur est refusé juste au-dessus.
+        self._joining.add(user_id)
+        try:
+            rating, games = await self.ratings.get(user_id)
+            provisional = " (provisoire)" if games < RATING_PROVISIONAL_GAMES else ""
+            await interaction.response.send_message(
+                f"🔎 Vous êtes dans la file d'attente, Elo {round(rating)}{provisional}. La partie se lancera ici dès qu'un adversaire "
+                f"de niveau proche sera trouvé (`/file_attente quitter:True` pour en sortir).", ephemeral=True)
+            # L'interaction sert à lancer la partie dans ce salon, puis à prévenir le joueur.
+            now = time.monotonic()
+            entry = Waiting(user_id, rating, now, interaction)
+            opponent = queue.add(entry, now)
+        finally:
+            self._joining.discard(user_id)
+        if opponent is not None:
+            await self.start_match(opponent, entry, now)
+
+    tournoi = app_commands.Group(name="tournoi", description="Tournois Royal : système suisse ou toutes rondes.", guild_only=True)
+
+    @staticmethod
+    def can_manage(interaction: discord.Interaction, tournament: Tournament) -> bool:
+        return interaction.user.id == tournament.organizer_id or interaction.user.guild_permissions.manage_guild
+
+    @tournoi.command(name="creer", description="Ouvre les inscriptions d'un tournoi dans ce salon.")
+    @app_commands.describe(nom="Nom du tournoi.", format="suisse : appariements selon le score ; toutes_rondes : chacun contre tous.",
+                           rondes="Nombre de rondes du système suisse (par défaut selon le nombre d'inscrits).")
+    @app_commands.choices(format=[app_commands.Choice(name=fmt, value=fmt) for fmt in TOURNAMENT_FORMATS])
+    async def tournoi_creer(self, interaction: discord.Interaction, nom: app_commands.Range[str, 1, 80], format: str = "suisse",
+                            rondes: Optional[app_commands.Range[int, 1, 15]] = None):
+        current = self.tournaments.get(interaction.guild_id)
+        if current is not None and current.status in ("registration", "running"):
+            await interaction.response.send_message(f"Le tournoi **{current.name}** est déjà ouvert sur ce serveur.", ephemeral=True)
+            return
+        tournament = self.tournaments.create(interaction.guild_id, interaction.channel_id, nom, format, interaction.user.id, rondes or 0)
+        rounds = f"{rondes} rondes" if rondes and format == "suisse" else "rondes selon le nombre d'inscrits"
+        await interaction.response.send_message(
+            f"🏆 Tournoi **{tournament.name}** ({format.replace('_', ' ')}, {rounds}) : inscriptions ouvertes avec `/tournoi inscription`, "
+            f"jusqu'à {tournament.max_players()} joueurs. {interaction.user.mention} le lancera avec `/tournoi lancer`.")
+
+    @tournoi.command(name="inscription", description="S'inscrit au tournoi ouvert sur ce serveur.")
+    @app_commands.describe(quitter="Se désinscrire au lieu de s'inscrire.")
+    async def tournoi_inscription(self, interaction: discord.Interaction, quitter: bool = False):
+        tournament = self.tournaments.get(interaction.guild_id)
+        if tournament is None or tournament.status != "registration":
+            await interaction.response.send_message("Aucun tournoi n'est ouvert aux inscriptions sur ce serveur.", ephemeral=True)
+            return
+        if quitter:
+            removed = self.tournaments.unregister(tournament, interaction.user.id)
+            await interaction.response.send_message("Vous êtes désinscrit." if removed else "Vous n'étiez pas inscrit.", ephemeral=True)
+            return
+        if interaction.user.id in tournament.players:
+            await interaction.response.send_message("Vous êtes déjà inscrit.", ephemeral=True)
+            return
+        rating, _ = await self.ratings.get(interaction.user.id)
+        if not self.tournaments.register(tournament, interaction.user.id, rating):
+            await interaction.response.send_message("Le tournoi est complet.", ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"✅ Inscrit au tournoi **{tournament.name}** (Elo {round(rating)}). {len(tournament.players)} joueur(s) inscrit(s).", ephemeral=True)
+
+    @tournoi.command(name="lancer", description="Clôt les inscriptions et lance la première ronde.")
+    async def tournoi_lancer(self, interaction: discord.Interaction):
+        tournament = self.tournaments.get(interaction.guild_id)
+        if tournament is None or tournament.status != "registration":
+            await interaction.response.send_message("Aucun tournoi n'attend d'être lancé sur ce serveur.", ephemeral=True)
+            return
+        if not self.can_manage(interaction, tournament):
+            await interaction.response.send_message("Seul l'organisateur du tournoi peut le lancer.", ephemeral=True)
+            return
+        if len(tournament.players) < 2:
+            await interaction.response.send_message("Il faut au moins deux joueurs inscrits.", ephemeral=True)
+            return
+        # Avant le premier await : un second /tournoi lancer trouve déjà le tournoi en cours et s'arrête plus haut.
+        self.tournaments.close_registration(tournament)
+        await interaction.response.send_message(f"🏁 Le tournoi **{tournament.name}** commence avec {len(tournament.players)} joueurs !")
+        # Les parties de la ronde partent par vagues : la commande rend la main pendant ce temps.
+        await self.tournaments.start(tournament)
+
+    @tournoi.command(name="classement", description="Affiche le classement du tournoi de ce serveur.")
+    async def tournoi_classement(self, interaction: discord.Interaction):
+        tournament = self.tournaments.get(interaction.guild_id)
+        if tournament is None or not tournament.players:
+            await interaction.response.send_message("Aucun tournoi sur ce serveur.", ephemeral=True)
+            return
+        status = {"registration": "inscriptions ouvertes", "running": f"ronde {tournament.round}/{tournament.rounds}",
+                  "finished": "terminé", "cancelled": "annulé"}[tournament.status]
+        lines = [f"🏆 **{tournament.name}** ({status})"] + self.tournaments.standings_lines(tournament, limit=30)
+        await interaction.response.send_message(chunk_lines(lines)[0], allowed_mentions=discord.AllowedMentions.none())
+
+    @tournoi.command(name="annuler", description="Annule le tournoi de ce serveur (les parties en cours continuent, sans compter).")
+    async def tournoi_annuler(self, interaction: discord.Interaction):
+        tournament = self.tournaments.get(interaction.guild_id)
+        if tournament is None or tournament.status not in ("registration", "running"):
+            await interaction.response.send_message("Aucun tournoi en cours sur ce serveur.", ephemeral=True)
+            return
+        if not self.can_manage(interaction, tournament):
+            await interaction.response.send_message("Seul l'organisateur du tournoi peut l'annuler.", ephemeral=True)
+            return
+        self.tournaments.cancel(tournament)
+        await interaction.response.send_message(f"Le tournoi **{tournament.name}** est annulé.")
+
+    @app_commands.command(name="partie_ordi", description="Lance une partie d'échecs Royal contre l'ordinateur.")
+    @app_commands.describe(niveau="Force de l'ordinateur.", couleur="Votre couleur (au hasard par défaut).")
+    @app_commands.choices(niveau=[app_commands.Choice(name=level.capitalize(), value=level) for level in ENGINE_LEVELS],
+                          couleur=[app_commands.Choice(name="Blancs", value="blancs"), app_commands.Choice(name="Noirs", value="noirs")])
+    async def partie_ordi(self, interaction: discord.Interaction, niveau: str = "moyen", couleur: Optional[str] = None):
+        if couleur is None:
+            couleur = random.choice(("blancs", "noirs"))
+        await interaction.response.defer()
+        # L'ordinateur joue sous le compte du bot.
+        if couleur == "blancs":
+            await self.start_game(interaction, white_player=interaction.user, black_player=self.bot.user, engine_level=niveau)
+        else:
+            await self.start_game(interaction, white_player=self.bot.user, black_player=interaction.user, engine_level=niveau)
+
+    @app_commands.command(name="regarder", description="Affiche ici une partie en cours, mise à jour à chaque coup.")
+    @app_commands.describe(partie="Lien ou ID du message de la partie.")
+    async def regarder(self, interaction: discord.Interaction, partie: str):
+        message_id = parse_message_id(partie)
+        view = self.games.resident.get(message_id)
+        if view is None and message_id is not None and self.games.is_evicted(message_id):
+            view = await self.games.rehydrate(message_id)
+        if view is None or view.is_finished():
+            await interaction.response.send_message("Aucune partie en cours sur ce message.", ephemeral=True)
+            return
+        if view.spectators.watching(view.game_id) >= SPECTATE_MAX_PER_GAME:
+            await interaction.response.send_message("Cette partie a déjà trop de spectateurs.", ephemeral=True)
+            return
+        await interaction.response.defer()
+        try:
+            frame = await view.spectator_frame()
+        except RenderError:
+            await interaction.followup.send("L'échiquier n'a pas pu être affiché, réessayez dans un instant.", ephemeral=True)
+            return
+        # Message sans composants : les spectateurs ne peuvent que regarder.
+        extra = {"file": discord.File(fp=BytesIO(frame.image), filename=frame.filename)} if frame.image is not None else {}
+        message = await interaction.followup.send(frame.content, allowed_mentions=discord.AllowedMentions.none(), **extra)
+        if self.spectators.add(view.game_id, interaction.channel_id, message.id):
+            self.store.add_spectator(view.game_id, interaction.channel_id, message.id)
+        # Un coup joué pendant l'envoi : ce nouveau spectateur le reçoit aussi.
+        if view.action_seq != frame.seq or view.is_finished():
+            view.schedule_broadcast(force=True)
+
+    @app_commands.command(name="replay", description="Rejoue une partie en image animée.")
+    @app_commands.describe(partie="Lien ou ID du message de la partie (par défaut : votre dernière partie terminée).",
+                           format="gif : lisible partout, webp : bien plus léger.")
+    @app_commands.choices(format=[app_commands.Choice(name=fmt, value=fmt) for fmt in REPLAY_FORMATS])
+    async def replay(self, interaction: discord.Interaction, partie: Optional[str] = None, format: str = "gif"):
+        message_id = parse_message_id(partie) if partie is not None else None
+        if partie is not None and message_id is None:
+            await interaction.response.send_message("Donnez le lien ou l'ID du message de la partie.", ephemeral=True)
+            return
+        await interaction.response.defer()
+        game = await asyncio.to_thread(self.store.find_game_record, message_id=message_id, player_id=interaction.user.id)
+        if game is None:
+            await interaction.followup.send("Aucune partie trouvée.", ephemeral=True)
+            return
+        # Les images sont fabriquées et encodées une à une dans un processus de rendu : la boucle reste libre.
+        try:
+            data = await get_renderer().replay(encode_record(game["record"]), format)
+        except RenderError as e:
+            logging.warning(f"Replay de la partie {game['id']} impossible : {e}")
+            await interaction.followup.send("Le replay n'a pas pu être fabriqué, réessayez dans un instant.", ephemeral=True)
+            return
+        white_player = await self.resolve_user(game["white_id"])
+        black_player = await self.resolve_user(game["black_id"])
+        result = f" ({game['result']})" if game["result"] else ""
+        await interaction.followup.send(
+            f"Replay : {white_player.mention} (Blancs) contre {black_player.mention} (Noirs){result}, "
+            f"{len(game['record'].actions)} actions.",
+            file=discord.File(fp=BytesIO(data), filename=f"replay.{format}"),
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
+    @app_commands.command(name="explorer", description="Statistiques d'une position dans les parties déjà jouées.")
+    @app_commands.describe(partie="Lien ou ID du message d'une partie en cours (sa position actuelle).",
+                           fen="Position en notation FEN (par défaut : position de départ).",
+                           royaux="Cases des pions royaux de la position FEN, ex. « e2 d7 ».")
+    async def explorer(self, interaction: discord.Interaction, partie: Optional[str] = None, fen: Optional[str] = None,
+                       royaux: Optional[str] = None):
+        if partie is not None:
+            message_id = parse_message_id(partie)
+            view = self.games.resident.get(message_id)
+            if view is None and message_id is not None and self.games.is_evicted(message_id):
+                view = await self.games.rehydrate(message_id)
+            if view is None:
+                await interaction.response.send_message("Aucune partie en cours sur ce message.", ephemeral=True)
+                return
+            board, royal_pawns = view.board.copy(stack=1), set(view.royal_pawns)
+            if view.stage == "double_assault_2" and board.move_stack:
+                board.pop() # Double Assaut à moitié joué : on regarde la position du début du tour
+        else:
+            try:
+                board = chess.Board(fen) if fen else chess.Board()
+                royal_pawns = {chess.parse_square(name) for name in (royaux or "").replace(",", " ").split()}
+            except ValueError:
+                await interaction.response.send_message("Position invalide : vérifiez la FEN et les cases des pions royaux.", ephemeral=True)
+                return
+        started = time.perf_counter()
+        entry = await asyncio.to_thread(self.explorer.lookup, board, royal_pawns)
+        elapsed = time.perf_counter() - started
+        metrics.EXPLORER_QUERY_SECONDS.observe(elapsed)
+        if entry is None:
+            await interaction.response.send_message("Aucune partie indexée n'est passée par cette position.", ephemeral=True)
+            return
+
+        def results(stats: ExplorerStats) -> str:
+            return (f"Blancs {100 * stats.white / stats.games:.0f} % · nulles {100 * stats.draws / stats.games:.0f} %"
+                    f" · Noirs {100 * stats.black / stats.games:.0f} %")
+
+        lines = [f"🔭 **{entry.stats.games} partie(s)** sont passées par cette position : {results(entry.stats)}"]
+        for rank, continuation in enumerate(entry.continuations, 1):
+            lines.append(f"{rank}. {describe_turn(continuation.turn)} — {continuation.stats.games} partie(s), {results(continuation.stats)}")
+        lines.append(f"-# Recherche : {elapsed * 1000:.1f} ms")
+        await interaction.response.send_message(chunk_lines(lines)[0])
+
+    @app_commands.command(name="affichage", description="Règle le format et la taille des images d'échiquier sur ce serveur.")
+    @app_commands.describe(format="png : couleurs complètes, png8 : palette (plus léger), webp : sans perte (le plus léger).",
+                           taille="Côté de l'image en pixels (200 à 800).")
+    @app_commands.choices(format=[app_commands.Choice(name=fmt, value=fmt) for fmt in RENDER_FORMATS])
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.guild_only()
+    async def affichage(self, interaction: discord.Interaction, format: Optional[str] = None,
+                        taille: Optional[app_commands.Range[int, 200, 800]] = None):
+        settings = self.guild_settings.setdefault(interaction.guild_id, {"image_format": None, "image_size": None})
+        if format is not None:
+            settings["image_format"] = format
+        if taille is not None:
+            settings["image_size"] = taille
+        self.store.save_guild_settings(interaction.guild_id, settings["image_format"], settings["image_size"])
+        # Les parties déjà lancées sur ce serveur en profitent dès leur prochaine image.
+        for view in self.games.resident.values():
+            if view.guild_id == interaction.guild_id:
+                self.apply_image_settings(view)
+        await interaction.response.send_message(
+            f"Images d'échiquier : format **{settings['image_format'] or RENDER_FORMAT}**, "
+            f"**{settings['image_size'] or RENDER_SIZE} px**.", ephemeral=True)
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(ChessCog(bot))
\ No newline at end of file
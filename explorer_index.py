@@ -0,0 +1,55 @@
+# explorer_index.py
+
+import argparse
+import logging
+import time
+
+from dotenv import load_dotenv
+
+from royal.explorer import EXPLORER_DB_PATH, ExplorerIndex
+from royal.store import GAME_DB_PATH, GameStore
+
+# --- INDEXATION EN LOT DE L'EXPLORATEUR ---
+# Remplit l'index de /explorer depuis des archives (royal/record.py), lues en flux, et/ou depuis la base de jeu.
+# Peut tourner pendant que le bot joue : les parties déjà indexées (par le bot ou un passage précédent) sont ignorées.
+#
+#   python explorer_index.py parties-2024.ry parties-2025.ry
+#   python explorer_index.py --store               # parties terminées de GAME_DB_PATH pas encore indexées
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - [explorateur] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexe des parties Royal pour /explorer.")
+    parser.add_argument("archives", nargs="*", help="archives de parties (royal/record.py)")
+    parser.add_argument("--store", action="store_true", help=f"indexe aussi les parties terminées de la base de jeu ({GAME_DB_PATH})")
+    parser.add_argument("--index", default=EXPLORER_DB_PATH, help="base de l'explorateur")
+    args = parser.parse_args()
+    if not args.archives and not args.store:
+        parser.error("donnez au moins une archive, ou --store")
+
+    index = ExplorerIndex(args.index)
+    for path in args.archives:
+        started = time.perf_counter()
+        with open(path, "rb") as fp:
+            added = index.index_archive(fp)
+        logging.info(f"{path} : {added} partie(s) ajoutée(s) en {time.perf_counter() - started:.1f} s.")
+    if args.store:
+        store = GameStore()
+        try:
+            started = time.perf_counter()
+            added = index.index_store(store)
+            logging.info(f"Base de jeu : {added} partie(s) ajoutée(s) en {time.perf_counter() - started:.1f} s.")
+        finally:
+            store.close()
+    logging.info(f"{index.indexed_games()} partie(s) dans l'index.")
+
+
+if __name__ == "__main__":
+    main()
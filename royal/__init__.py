@@ -0,0 +1,2 @@
+# royal/__init__.py
+# Briques partagées par les cogs : rendu, règles, persistance...
@@ -0,0 +1,80 @@
+# royal/cache.py
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Optional
+
+RENDER_CACHE_ENTRIES = int(os.getenv("RENDER_CACHE_ENTRIES", "512"))
+RENDER_CACHE_MB = float(os.getenv("RENDER_CACHE_MB", "64"))
+
+
+def frame_key(board_fen: str, fill: dict[int, str], options: dict) -> str:
+    """
+    Empreinte canonique de tout ce qui influence les pixels d'une image.
+    Deux appels qui produiraient la même image donnent la même clé, quel que soit l'ordre du dict `fill`.
+    """
+    canonical = json.dumps(
+        {
+            "fen": board_fen,
+            "fill": sorted((int(square), color.lower()) for square, color in fill.items()),
+            "options": options,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """Cache LRU des images déjà produites, borné en nombre d'entrées ET en octets."""
+
+    def __init__(self, max_entries: int = RENDER_CACHE_ENTRIES, max_bytes: int = int(RENDER_CACHE_MB * 1024 * 1024)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        # Ne compte ni hit ni miss et ne rafraîchit pas l'entrée.
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return  # Une image plus grosse que tout le cache n'a rien à y faire.
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size_bytes -= len(old)
+        self._entries[key] = data
+        self.size_bytes += len(data)
+        # On évince les entrées les moins récemment utilisées jusqu'à respecter les deux bornes.
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
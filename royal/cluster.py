@@ -0,0 +1,155 @@
+# royal/cluster.py
+
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Optional
+
+# --- CONFIGURATION D'UN PROCESSUS DU BOT ---
+# BOT_SHARDING=auto : AutoShardedBot, Discord choisit le nombre de shards, tous gérés par ce processus.
+# SHARD_COUNT + SHARD_IDS (posés par supervisor.py) : ce processus ne gère que ces shards-là.
+BOT_SHARDING = os.getenv("BOT_SHARDING", "")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0") or 0)
+SHARD_IDS = [int(shard) for shard in os.getenv("SHARD_IDS", "").split(",") if shard.strip()]
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+
+# --- CONFIGURATION DU SUPERVISEUR ---
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "0")) or os.cpu_count() or 1
+CLUSTER_SHARDS = os.getenv("CLUSTER_SHARDS", "auto") # Nombre total de shards, ou "auto" (recommandé par Discord)
+METRICS_PORT_BASE = int(os.getenv("METRICS_PORT", "9108"))
+
+
+def sharding_options() -> Optional[dict]:
+    """Arguments de commands.AutoShardedBot pour ce processus, ou None pour un bot classique sans sharding."""
+    if SHARD_COUNT:
+        return {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS or None}
+    if BOT_SHARDING == "auto":
+        return {}
+    return None
+
+
+def shard_for_guild(guild_id: Optional[int], shard_count: int) -> int:
+    """Formule de Discord : les événements d'un serveur arrivent toujours sur ce shard (les MP sur le shard 0)."""
+    if not guild_id or shard_count <= 1:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+
+def owns_guild(bot, guild_id: Optional[int]) -> bool:
+    """Vrai si les interactions de ce serveur arrivent dans ce processus (et donc ses parties y vivent)."""
+    shard_ids = getattr(bot, "shard_ids", None)
+    if not shard_ids or not bot.shard_count:
+        return True
+    return shard_for_guild(guild_id, bot.shard_count) in shard_ids
+
+
+def partition_shards(shard_count: int, cluster_count: int) -> list[list[int]]:
+    """Répartit les shards en plages contiguës, une par processus."""
+    base, extra = divmod(shard_count, cluster_count)
+    ranges, start = [], 0
+    for cluster in range(cluster_count):
+        size = base + (cluster < extra)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def recommended_shards(token: str) -> int:
+    request = urllib.request.Request("https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {token}"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)["shards"])
+
+
+# --- SUPERVISEUR ---
+class Supervisor:
+    """
+    Lance un processus bot.py par groupe de shards et le relance s'il s'arrête.
+    Discord envoie les interactions d'un serveur sur le shard qui le possède : chaque partie vit
+    donc dans un seul processus, et chaque processus a sa boucle asyncio et son pool de rendu.
+    """
+
+    def __init__(self, token: str, cluster_count: int = CLUSTER_COUNT, shards: str = CLUSTER_SHARDS):
+        self.token = token
+        self.cluster_count = cluster_count
+        self.shards = shards
+        self.processes: dict[int, subprocess.Popen] = {}
+        self.started_at: dict[int, float] = {}
+        self.backoff: dict[int, float] = {}
+        self.restart_at: dict[int, float] = {}
+        self._stopping = False
+
+    def shard_count(self) -> int:
+        count = recommended_shards(self.token) if self.shards == "auto" else int(self.shards)
+        # Au moins un shard par processus, sinon certains n'auraient rien à faire.
+        return max(count, self.cluster_count)
+
+    def worker_env(self, cluster_id: int, shard_ids: list[int], shard_count: int) -> dict:
+        env = dict(os.environ)
+        env.update({
+            "CLUSTER_ID": str(cluster_id),
+            "SHARD_COUNT": str(shard_count),
+            "SHARD_IDS": ",".join(map(str, shard_ids)),
+            # Un endpoint de métriques par processus.
+            "METRICS_PORT": str(METRICS_PORT_BASE + cluster_id) if METRICS_PORT_BASE else "0",
+        })
+        # Les processus de rendu se partagent les cœurs au lieu d'en lancer cpu_count chacun.
+        env.setdefault("RENDER_WORKERS", str(max(1, (os.cpu_count() or 1) // self.cluster_count)))
+        return env
+
+    def spawn(self, cluster_id: int, env: dict):
+        self.processes[cluster_id] = subprocess.Popen([sys.executable, "bot.py"], env=env)
+        self.started_at[cluster_id] = time.monotonic()
+        logging.info(f"🚀 Cluster {cluster_id} démarré (pid {self.processes[cluster_id].pid}, shards {env['SHARD_IDS']}).")
+
+    def run(self):
+        shard_count = self.shard_count()
+        envs = {
+            cluster_id: self.worker_env(cluster_id, shard_ids, shard_count)
+            for cluster_id, shard_ids in enumerate(partition_shards(shard_count, self.cluster_count))
+        }
+        logging.info(f"{shard_count} shard(s) répartis sur {self.cluster_count} processus.")
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        for cluster_id, env in envs.items():
+            self.spawn(cluster_id, env)
+            # Discord limite le rythme des connexions (IDENTIFY) : on échelonne les démarrages.
+            time.sleep(5)
+
+        while not self._stopping:
+            now = time.monotonic()
+            for cluster_id, process in list(self.processes.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                if cluster_id not in self.restart_at:
+                    # Un processus resté longtemps en vie repart avec un délai court ; sinon le délai double.
+                    uptime = now - self.started_at[cluster_id]
+                    delay = 1.0 if uptime > 60 else min(60.0, self.backoff.get(cluster_id, 0.5) * 2)
+                    self.backoff[cluster_id] = delay
+                    self.restart_at[cluster_id] = now + delay
+                    logging.warning(f"⚠️ Cluster {cluster_id} arrêté (code {code}), relance dans {delay:.0f} s.")
+                elif now >= self.restart_at[cluster_id]:
+                    del self.restart_at[cluster_id]
+                    self.spawn(cluster_id, envs[cluster_id])
+            time.sleep(1)
+        self.stop()
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def stop(self, timeout: float = 15):
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for cluster_id, process in self.processes.items():
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logging.warning(f"Cluster {cluster_id} ne répond pas, arrêt forcé.")
+                process.kill()
@@ -0,0 +1,416 @@
+# royal/engine.py
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import chess
+
+from royal import metrics
+from royal.movegen import piece_destinations
+from royal.rules import apply_action, position_key
+
+# --- CONFIGURATION ---
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", "1"))
+# Temps de réflexion maximal d'un coup au niveau le plus fort, en secondes.
+ENGINE_MOVE_TIME = float(os.getenv("ENGINE_MOVE_TIME", "2"))
+# Entrées de la table de transposition de chaque processus (vidée quand elle est pleine).
+ENGINE_TT_ENTRIES = int(os.getenv("ENGINE_TT_ENTRIES", "262144"))
+
+# Niveaux proposés par /partie_ordi : profondeur maximale, temps par coup et bruit ajouté à l'évaluation.
+ENGINE_LEVELS = {
+    "facile": {"depth": 1, "time": 0.5, "noise": 150},
+    "moyen": {"depth": 2, "time": 1.0, "noise": 40},
+    "difficile": {"depth": 32, "time": ENGINE_MOVE_TIME, "noise": 0},
+}
+
+
+class EngineError(Exception):
+    """L'ordinateur n'a pas pu choisir de coup."""
+
+
+# --- COUPS ---
+# Un « tour » est le tuple des actions (voir royal/rules.py) jouées par un camp : une seule en général,
+# deux pour un Double Assaut complet.
+INITIAL_COUNTS = {chess.PAWN: 8, chess.KNIGHT: 2, chess.BISHOP: 2, chess.ROOK: 2, chess.QUEEN: 1}
+
+
+def generate_turns(board: chess.Board, royal_pawns) -> list[tuple]:
+    """Tous les tours possibles du camp au trait, capacités comprises (mêmes choix que les menus du cog)."""
+    us, them = board.turn, not board.turn
+    occupied, ours = board.occupied, board.occupied_co[us]
+    turns, abilities = [], set()
+    landing = None
+    for square in chess.scan_forward(ours):
+        piece_type = board.piece_type_at(square)
+        destinations = piece_destinations(board, square, royal_pawns)
+        turns.extend((("move", square, to),) for to in destinations)
+        if piece_type == chess.KNIGHT:
+            # Double Assaut : deux sauts ; prendre le roi au premier termine la partie.
+            for middle in destinations:
+                if board.kings & chess.BB_SQUARES[middle]:
+                    turns.append((("double1", square, middle),))
+                    continue
+                own = (ours & ~chess.BB_SQUARES[square]) | chess.BB_SQUARES[middle]
+                for to in chess.scan_forward(chess.BB_KNIGHT_ATTACKS[middle] & ~own):
+                    turns.append((("double1", square, middle), ("double2", middle, to)))
+        elif piece_type == chess.BISHOP:
+            # Téléportation : sur n'importe quelle case vide voisine d'une pièce.
+            if landing is None:
+                landing = 0
+                for other in chess.scan_forward(occupied):
+                    landing |= chess.BB_KING_ATTACKS[other]
+                landing &= ~occupied
+            turns.extend((("teleport", square, to),) for to in chess.scan_forward(landing))
+        elif piece_type == chess.ROOK:
+            for rescued, count in INITIAL_COUNTS.items():
+                if chess.popcount(board.pieces_mask(rescued, us)) < count:
+                    for to in chess.scan_forward(chess.BB_KING_ATTACKS[square] & ~occupied):
+                        abilities.add((("rescue", rescued, to),))
+        elif piece_type == chess.QUEEN:
+            for target in chess.scan_forward(board.occupied_co[them] & ~board.kings):
+                for to in piece_destinations(board, target, royal_pawns):
+                    abilities.add((("mind", target, to),))
+        elif piece_type == chess.KING:
+            for pawn in chess.scan_forward(board.pawns & ours):
+                if pawn not in royal_pawns:
+                    abilities.add((("royal", pawn),))
+    turns.extend(sorted(abilities))
+    return turns
+
+
+def play_turn(board: chess.Board, royal_pawns: set, turn: tuple) -> set:
+    """
+    Joue un tour sur l'échiquier (modifié sur place) et renvoie les nouveaux pions royaux.
+    Même résultat que apply_action, mais Téléportation et Équipe de secours passent par BaseBoard :
+    Board.set_piece_at vide la pile des coups, et la recherche en a besoin pour revenir en arrière.
+    """
+    royal_pawns = set(royal_pawns)
+    for action in turn:
+        kind = action[0]
+        if kind == "teleport":
+            chess.BaseBoard.set_piece_at(board, action[2], chess.BaseBoard.remove_piece_at(board, action[1]))
+            board.push(chess.Move.null())
+        elif kind == "rescue":
+            chess.BaseBoard.set_piece_at(board, action[2], chess.Piece(action[1], board.turn))
+            board.push(chess.Move.null())
+        else:
+            apply_action(board, royal_pawns, action)
+    return royal_pawns
+
+
+def undo_turn(board: chess.Board, turn: tuple, color: chess.Color):
+    """Annule play_turn. Téléportation et Équipe de secours modifient l'échiquier avant leur push : on les défait à la main."""
+    for action in reversed(turn):
+        board.pop()
+        if action[0] == "teleport":
+            chess.BaseBoard.set_piece_at(board, action[1], chess.BaseBoard.remove_piece_at(board, action[2]))
+        elif action[0] == "rescue":
+            chess.BaseBoard.remove_piece_at(board, action[2])
+    board.turn = color
+
+
+def describe_turn(turn: tuple) -> str:
+    """Le tour en clair, pour le message de la partie."""
+    kind, *args = turn[0]
+    if kind == "move":
+        return f"{chess.square_name(args[0])} → {chess.square_name(args[1])}"
+    if kind == "double1":
+        squares = [args[0], args[1]] + [step[2] for step in turn[1:]]
+        return "Double Assaut " + " → ".join(map(chess.square_name, squares))
+    if kind == "teleport":
+        return f"Téléportation {chess.square_name(args[0])} → {chess.square_name(args[1])}"
+    if kind == "rescue":
+        return f"Équipe de secours : {chess.piece_name(args[0])} en {chess.square_name(args[1])}"
+    if kind == "mind":
+        return f"Contrôle mental {chess.square_name(args[0])} → {chess.square_name(args[1])}"
+    if kind == "royal":
+        return f"Promotion Royale du pion en {chess.square_name(args[0])}"
+    return repr(turn)
+
+
+# --- ÉVALUATION ---
+PIECE_VALUES = [0, 100, 320, 330, 500, 900, 20000]
+ROYAL_PAWN_BONUS = 40
+MATE = 1_000_000 # Roi capturé
+_MATE_BOUND = MATE - 1000
+# Bonus de centralisation des cavaliers et des fous.
+_CENTRE = [12 - 4 * max(abs(chess.square_file(sq) * 2 - 7), abs(chess.square_rank(sq) * 2 - 7)) // 2 for sq in chess.SQUARES]
+
+
+def evaluate(board: chess.Board, royal_pawns) -> int:
+    """Évaluation statique du point de vue du camp au trait : matériel, pions royaux, avance des pions, centralisation."""
+    score = 0
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        mask = board.occupied_co[color]
+        side = 0
+        for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN):
+            side += PIECE_VALUES[piece_type] * chess.popcount(board.pieces_mask(piece_type, color))
+        for square in chess.scan_forward((board.knights | board.bishops) & mask):
+            side += _CENTRE[square]
+        for square in chess.scan_forward(board.pawns & mask):
+            rank = chess.square_rank(square) if color == chess.WHITE else 7 - chess.square_rank(square)
+            side += rank * 6
+            if square in royal_pawns:
+                side += ROYAL_PAWN_BONUS + rank * 6
+        score += sign * side
+    return score if board.turn == chess.WHITE else -score
+
+
+# --- RECHERCHE ---
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Search:
+    """
+    Alpha-bêta en approfondissement itératif, table de transposition indexée par le hash Zobrist
+    (python-chess) combiné aux pions royaux, et tri des coups : coup de la table, prises du roi,
+    prises MVV-LVA, coups « killer », puis capacités. Les feuilles passent par une recherche de prises.
+    """
+
+    def __init__(self, tt_entries: int = ENGINE_TT_ENTRIES, quiescence_depth: int = 4):
+        self.tt: dict[int, tuple] = {}
+        self.tt_entries = tt_entries
+        self.quiescence_depth = quiescence_depth
+        self.nodes = 0
+        self.noise = 0
+        self.rng = random.Random()
+        self.deadline = float("inf")
+        self.killers: list[list[tuple]] = []
+
+    def choose(self, board: chess.Board, royal_pawns, depth: int, move_time: float, noise: int = 0) -> tuple[Optional[tuple], dict]:
+        """Meilleur tour trouvé dans le temps imparti, et le détail de la recherche (nœuds, profondeur, score)."""
+        started = time.perf_counter()
+        self.deadline = started + move_time
+        self.nodes = 0
+        self.noise = noise
+        self.killers = [[] for _ in range(depth + 2)]
+        royal_pawns = set(royal_pawns)
+        if len(self.tt) >= self.tt_entries:
+            self.tt.clear()
+
+        turns = generate_turns(board, royal_pawns)
+        best_turn, best_score, completed = (turns[0] if turns else None), 0, 0
+        for current in range(1, depth + 1):
+            try:
+                best_score, turn = self._root(board, royal_pawns, turns, current, best_turn)
+            except _Timeout:
+                break
+            best_turn, completed = turn, current
+            if abs(best_score) >= _MATE_BOUND:
+                break # Issue forcée trouvée : inutile de chercher plus loin
+        seconds = time.perf_counter() - started
+        return best_turn, {"nodes": self.nodes, "depth": completed, "score": best_score, "seconds": round(seconds, 4),
+                           "nps": round(self.nodes / seconds) if seconds else 0}
+
+    def _root(self, board, royal_pawns, turns, depth, previous_best):
+        alpha, beta = -MATE - 1, MATE + 1
+        best_score, best_turn = -MATE - 1, None
+        color = board.turn
+        for turn in self._ordered(board, turns, previous_best, 0):
+            child_royal = play_turn(board, royal_pawns, turn)
+            try:
+                score = -self._negamax(board, child_royal, depth - 1, -beta, -alpha, 1)
+            finally:
+                undo_turn(board, turn, color)
+            if score > best_score:
+                best_score, best_turn = score, turn
+            alpha = max(alpha, score)
+        return best_score, best_turn
+
+    def _tick(self):
+        self.nodes += 1
+        if not self.nodes & 255 and time.perf_counter() > self.deadline:
+            raise _Timeout
+
+    def _evaluate(self, board, royal_pawns) -> int:
+        score = evaluate(board, royal_pawns)
+        return score + self.rng.randint(-self.noise, self.noise) if self.noise else score
+
+    def _negamax(self, board, royal_pawns, depth, alpha, beta, ply) -> int:
+        self._tick()
+        if not board.kings & board.occupied_co[board.turn]:
+            return -MATE + ply
+        if not board.kings & board.occupied_co[not board.turn]:
+            return MATE - ply
+        if depth <= 0:
+            return self._quiesce(board, royal_pawns, alpha, beta, ply, 0)
+
+        key = position_key(board, royal_pawns)
+        entry = self.tt.get(key)
+        tt_turn = None
+        if entry is not None:
+            entry_depth, flag, score, tt_turn = entry
+            if entry_depth >= depth:
+                score = score - ply if score > _MATE_BOUND else score + ply if score < -_MATE_BOUND else score
+                if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                    return score
+
+        turns = generate_turns(board, royal_pawns)
+        if not turns:
+            return self._evaluate(board, royal_pawns)
+        original_alpha, best_score, best_turn = alpha, -MATE - 1, None
+        color = board.turn
+        for turn in self._ordered(board, turns, tt_turn, ply):
+            quiet = not board.piece_at(turn[-1][2]) if turn[0][0] in ("move", "double1") else True
+            child_royal = play_turn(board, royal_pawns, turn)
+            try:
+                score = -self._negamax(board, child_royal, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                undo_turn(board, turn, color)
+            if score > best_score:
+                best_score, best_turn = score, turn
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if quiet and ply < len(self.killers) and turn not in self.killers[ply]:
+                    self.killers[ply] = [turn] + self.killers[ply][:1]
+                break
+
+        flag = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+        stored = best_score + ply if best_score > _MATE_BOUND else best_score - ply if best_score < -_MATE_BOUND else best_score
+        self.tt[key] = (depth, flag, stored, best_turn)
+        return best_score
+
+    def _quiesce(self, board, royal_pawns, alpha, beta, ply, qdepth) -> int:
+        """Prolonge les feuilles tant qu'il reste des prises, pour ne pas s'arrêter au milieu d'un échange."""
+        self._tick()
+        if not board.kings & board.occupied_co[board.turn]:
+            return -MATE + ply
+        stand_pat = self._evaluate(board, royal_pawns)
+        if stand_pat >= beta or qdepth >= self.quiescence_depth:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        us, enemies = board.turn, board.occupied_co[not board.turn]
+        captures = []
+        for square in chess.scan_forward(board.occupied_co[us]):
+            attacker = board.piece_type_at(square)
+            targets = (chess.BB_PAWN_ATTACKS[us][square] if attacker == chess.PAWN else board.attacks_mask(square)) & enemies
+            for to in chess.scan_forward(targets):
+                victim = board.piece_type_at(to)
+                if victim == chess.KING:
+                    return MATE - ply - 1
+                captures.append((PIECE_VALUES[victim] * 10 - PIECE_VALUES[attacker] // 100, square, to))
+        captures.sort(reverse=True)
+        for _, square, to in captures:
+            turn = (("move", square, to),)
+            child_royal = play_turn(board, royal_pawns, turn)
+            try:
+                score = -self._quiesce(board, child_royal, -beta, -alpha, ply + 1, qdepth + 1)
+            finally:
+                undo_turn(board, turn, us)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _ordered(self, board, turns, tt_turn, ply) -> list[tuple]:
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+
+        def priority(turn):
+            if turn == tt_turn:
+                return 10_000_000
+            action = turn[0]
+            kind = action[0]
+            if kind in ("move", "double1"):
+                score = 0
+                for step in turn:
+                    victim = board.piece_type_at(step[2])
+                    if victim and board.color_at(step[2]) != board.turn:
+                        score += PIECE_VALUES[victim] * 10 - PIECE_VALUES[board.piece_type_at(action[1])] // 100
+                if score:
+                    return score
+                if turn in killers:
+                    return 5000
+                return 0 if kind == "move" else -50
+            if kind == "rescue":
+                return PIECE_VALUES[action[1]]
+            if kind == "royal":
+                return -20
+            return -100 # Téléportation, Contrôle mental
+
+        return sorted(turns, key=priority, reverse=True)
+
+
+# --- CÔTÉ PROCESSUS DE RECHERCHE ---
+_search: Optional[Search] = None
+
+
+def _choose(fen: str, royal_pawns: list[int], level: str) -> tuple[Optional[tuple], dict]:
+    # Une Search par processus : sa table de transposition sert d'un coup à l'autre.
+    global _search
+    if _search is None:
+        _search = Search()
+    settings = ENGINE_LEVELS[level]
+    return _search.choose(chess.Board(fen), royal_pawns, settings["depth"], settings["time"], settings["noise"])
+
+
+# --- CÔTÉ BOUCLE D'ÉVÉNEMENTS ---
+class EnginePool:
+    """Les recherches tournent dans leurs propres processus : ni la boucle asyncio ni le pool de rendu n'attendent."""
+
+    def __init__(self, workers: int = ENGINE_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def choose_turn(self, fen: str, royal_pawns, level: str) -> tuple:
+        if level not in ENGINE_LEVELS:
+            raise ValueError(f"niveau inconnu : {level}")
+        try:
+            future = self._get_executor().submit(_choose, fen, sorted(royal_pawns), level)
+        except BrokenProcessPool:
+            logging.warning("Pool de l'ordinateur cassé, redémarrage.")
+            self._executor = None
+            future = self._get_executor().submit(_choose, fen, sorted(royal_pawns), level)
+        # La recherche s'arrête d'elle-même à son temps limite ; la marge couvre le démarrage d'un processus.
+        timeout = ENGINE_LEVELS[level]["time"] + 10
+        try:
+            turn, info = await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise EngineError(f"pas de coup après {timeout:.0f} s") from None
+        except Exception as e:
+            raise EngineError(str(e)) from e
+        if turn is None:
+            raise EngineError("aucun coup possible")
+        metrics.ENGINE_SECONDS.observe(info["seconds"], level=level)
+        metrics.ENGINE_NODES.inc(info["nodes"], level=level)
+        return turn
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_engine: Optional[EnginePool] = None
+
+
+def get_engine() -> EnginePool:
+    global _engine
+    if _engine is None:
+        _engine = EnginePool()
+    return _engine
+
+
+def shutdown_engine():
+    global _engine
+    if _engine is not None:
+        _engine.shutdown()
+        _engine = None
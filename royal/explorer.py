@@ -0,0 +1,273 @@
+# royal/explorer.py
+
+import hashlib
+import os
+import sqlite3
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
+
+import chess
+
+from royal.record import GameRecord, decode_action, encode, encode_action, read_archive
+from royal.rules import apply_action, king_capture_winner, position_key
+
+# Explorateur de positions (/explorer) : pour chaque position vue dans une partie terminée, combien de parties
+# y sont passées, leurs résultats, et les tours joués ensuite. La clé est le hash Zobrist de l'échiquier
+# combiné aux pions royaux (rules.position_key) : les positions que seules les capacités produisent
+# (téléportation, secours, pions royaux...) ont leur propre entrée.
+# Base SQLite à part de celle des parties : on y écrit par gros lots, sans gêner la sauvegarde des parties.
+EXPLORER_DB_PATH = os.getenv("EXPLORER_DB_PATH", "royal_explorer.sqlite3")
+# Intervalle (en secondes) entre deux passes d'indexation des parties terminées.
+EXPLORER_INDEX_INTERVAL = float(os.getenv("EXPLORER_INDEX_INTERVAL", "60"))
+# Entrées agrégées en mémoire avant d'être écrites : borne la mémoire de l'indexation d'une grosse archive.
+EXPLORER_BATCH_ENTRIES = int(os.getenv("EXPLORER_BATCH_ENTRIES", "200000"))
+EXPLORER_TOP_TURNS = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER PRIMARY KEY,
+    games INTEGER NOT NULL,
+    white INTEGER NOT NULL,
+    black INTEGER NOT NULL,
+    draws INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS continuations (
+    key INTEGER NOT NULL,
+    turn BLOB NOT NULL,
+    games INTEGER NOT NULL,
+    white INTEGER NOT NULL,
+    black INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    PRIMARY KEY (key, turn)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS indexed_games (
+    digest BLOB PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+UPSERT_POSITION = (
+    "INSERT INTO positions (key, games, white, black, draws) VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET"
+    " games = games + excluded.games, white = white + excluded.white, black = black + excluded.black, draws = draws + excluded.draws"
+)
+UPSERT_CONTINUATION = (
+    "INSERT INTO continuations (key, turn, games, white, black, draws) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key, turn) DO UPDATE SET"
+    " games = games + excluded.games, white = white + excluded.white, black = black + excluded.black, draws = draws + excluded.draws"
+)
+# Colonne de statistiques qui compte le résultat (après celle du nombre de parties).
+RESULT_COLUMNS = {"1-0": 1, "0-1": 2, "1/2-1/2": 3}
+
+
+class ExplorerStats(NamedTuple):
+    games: int
+    white: int
+    black: int
+    draws: int
+
+
+class Continuation(NamedTuple):
+    """Un tour joué depuis la position (une ou plusieurs actions) et les parties qui l'ont suivi."""
+    turn: tuple
+    stats: ExplorerStats
+
+
+class ExplorerEntry(NamedTuple):
+    stats: ExplorerStats
+    continuations: list[Continuation]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # L'indexation d'une archive peut tenir le verrou d'écriture un moment : les autres attendent au lieu d'échouer.
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _signed(key: int) -> int:
+    # Les entiers SQLite sont signés sur 64 bits.
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def game_digest(record: GameRecord) -> bytes:
+    """Empreinte du contenu d'une partie d'archive : une archive importée deux fois n'est comptée qu'une fois."""
+    return hashlib.blake2b(encode(record), digest_size=16).digest()
+
+
+def store_game_digest(game_id: str) -> bytes:
+    """
+    Empreinte d'une partie de la base de jeu, tirée de son identifiant : deux parties différentes aux coups identiques
+    (ouvertures courtes, roi pris vite) comptent chacune.
+    """
+    return hashlib.blake2b(b"store:" + game_id.encode("utf-8"), digest_size=16).digest()
+
+
+def pack_turn(turn: Iterable[tuple]) -> bytes:
+    return b"".join(encode_action(action) for action in turn)
+
+
+def unpack_turn(data: bytes) -> tuple:
+    return tuple(decode_action(data[i:i + 2]) for i in range(0, len(data), 2))
+
+
+def iter_turns(record: GameRecord) -> Iterator[tuple[int, Optional[bytes]]]:
+    """
+    Positions d'une partie au début de chaque tour, avec le tour joué ensuite (actions encodées, royal/record.py).
+    Un tour se termine quand le trait change ou qu'un roi tombe (Double Assaut : deux actions pour un tour) ;
+    la dernière position est renvoyée avec None.
+    """
+    board, royal_pawns = chess.Board(record.initial_fen), set(record.royal_pawns)
+    key, side, pending = position_key(board, royal_pawns), board.turn, []
+    for action in record.actions:
+        apply_action(board, royal_pawns, action)
+        if action[0] == "undo":
+            # Capacité annulée en cours de tour : elle ne fait pas partie du tour joué.
+            if pending:
+                pending.pop()
+            else:
+                key, side = position_key(board, royal_pawns), board.turn
+            continue
+        pending.append(action)
+        if board.turn != side or king_capture_winner(board) is not None:
+            yield key, pack_turn(pending)
+            key, side, pending = position_key(board, royal_pawns), board.turn, []
+    yield key, None
+
+
+class _Batch:
+    """Statistiques de plusieurs parties agrégées en mémoire, écrites ensuite d'un coup."""
+
+    def __init__(self):
+        self.positions: dict[int, list[int]] = {}
+        self.continuations: dict[tuple[int, bytes], list[int]] = {}
+        self.digests: set[bytes] = set()
+
+    def __len__(self) -> int:
+        return len(self.positions) + len(self.continuations)
+
+    def add(self, digest: bytes, record: GameRecord):
+        column = RESULT_COLUMNS.get(record.result)
+        seen = set() # Une position (ou un tour) répétée dans une partie ne compte qu'une fois
+        for key, turn in iter_turns(record):
+            key = _signed(key)
+            if key not in seen:
+                seen.add(key)
+                self._count(self.positions, key, column)
+            if turn is not None and (key, turn) not in seen:
+                seen.add((key, turn))
+                self._count(self.continuations, (key, turn), column)
+        self.digests.add(digest)
+
+    @staticmethod
+    def _count(table: dict, entry_key, column: Optional[int]):
+        stats = table.get(entry_key)
+        if stats is None:
+            stats = table[entry_key] = [0, 0, 0, 0]
+        stats[0] += 1
+        if column:
+            stats[column] += 1
+
+
+class ExplorerIndex:
+    """
+    Index des positions sur disque (SQLite, clé primaire = hash de la position) : une recherche lit une ligne
+    de `positions` et quelques lignes contiguës de `continuations`, quel que soit le nombre de parties indexées.
+    Les parties sont ajoutées par lots (index_store, index_archive), dans un thread ou un script à part ;
+    une partie déjà indexée (même empreinte : identifiant pour la base de jeu, contenu pour les archives) est ignorée.
+    """
+
+    def __init__(self, path: str = EXPLORER_DB_PATH):
+        self.path = path
+        conn = _connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    # --- INDEXATION ---
+    def add_games(self, games: Iterable[tuple[bytes, GameRecord]], batch_entries: int = EXPLORER_BATCH_ENTRIES) -> int:
+        """Indexe des parties terminées, chacune avec son empreinte ; renvoie le nombre de parties nouvelles."""
+        conn = _connect(self.path)
+        try:
+            added, batch = 0, _Batch()
+            for digest, record in games:
+                if digest in batch.digests or conn.execute("SELECT 1 FROM indexed_games WHERE digest = ?", (digest,)).fetchone():
+                    continue
+                batch.add(digest, record)
+                added += 1
+                if len(batch) >= batch_entries:
+                    self._write(conn, batch)
+                    batch = _Batch()
+            self._write(conn, batch)
+            return added
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: _Batch):
+        if not batch.digests:
+            return
+        with conn:
+            conn.executemany(UPSERT_POSITION, ((key, *stats) for key, stats in batch.positions.items()))
+            conn.executemany(UPSERT_CONTINUATION, ((key, turn, *stats) for (key, turn), stats in batch.continuations.items()))
+            conn.executemany("INSERT OR IGNORE INTO indexed_games (digest) VALUES (?)", ((digest,) for digest in batch.digests))
+
+    def index_archive(self, fp: BinaryIO) -> int:
+        """Indexe une archive (royal/record.py) en flux, partie par partie."""
+        return self.add_games((game_digest(record), record) for record in read_archive(fp))
+
+    def index_store(self, store) -> int:
+        """Indexe les parties terminées depuis la dernière passe (GameStore.iter_finished_since)."""
+        conn = _connect(self.path)
+        try:
+            row = conn.execute("SELECT value FROM state WHERE name = 'store_updated_at'").fetchone()
+        finally:
+            conn.close()
+        since = row[0] if row else 0.0
+        latest = since
+
+        def games():
+            nonlocal latest
+            for updated_at, game_id, record in store.iter_finished_since(since):
+                latest = max(latest, updated_at)
+                yield store_game_digest(game_id), record
+
+        added = self.add_games(games())
+        if latest > since:
+            # On repart de cette date à la prochaine passe ; les parties de la même seconde sont relues
+            # puis écartées par leur empreinte.
+            conn = _connect(self.path)
+            try:
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO state (name, value) VALUES ('store_updated_at', ?)", (latest,))
+            finally:
+                conn.close()
+        return added
+
+    # --- RECHERCHE ---
+    def lookup(self, board: chess.Board, royal_pawns, limit: int = EXPLORER_TOP_TURNS) -> Optional[ExplorerEntry]:
+        """Statistiques d'une position et ses tours les plus joués, ou None si aucune partie indexée n'y est passée."""
+        key = _signed(position_key(board, royal_pawns))
+        conn = _connect(self.path)
+        try:
+            row = conn.execute("SELECT games, white, black, draws FROM positions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            continuations = [
+                Continuation(unpack_turn(turn), ExplorerStats(*stats))
+                for turn, *stats in conn.execute(
+                    "SELECT turn, games, white, black, draws FROM continuations WHERE key = ? ORDER BY games DESC LIMIT ?",
+                    (key, limit))
+            ]
+            return ExplorerEntry(ExplorerStats(*row), continuations)
+        finally:
+            conn.close()
+
+    def indexed_games(self) -> int:
+        conn = _connect(self.path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM indexed_games").fetchone()[0]
+        finally:
+            conn.close()
+
@@ -0,0 +1,57 @@
+# royal/logs.py
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+from royal import metrics
+
+# Lignes de journal en attente d'écriture. File pleine (disque ou terminal bloqué) : les nouvelles lignes
+# sont perdues et comptées, plutôt que de bloquer la boucle asyncio.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Côté appelant (souvent la boucle asyncio), on ne fait que déposer l'enregistrement dans la file :
+    la mise en forme (date, traceback) et l'écriture se font dans le thread du QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Le message est figé tout de suite : ses arguments pourraient changer avant l'écriture.
+        if record.args:
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc(logger=record.name)
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # À l'arrêt, on attend une place dans la file : les dernières lignes sont écrites.
+        self.queue.put(self._sentinel)
+
+
+def queued(logger: logging.Logger, *handlers: logging.Handler) -> logging.handlers.QueueListener:
+    """Branche `handlers` sur `logger` à travers une file et un thread d'écriture (vidé à la sortie du processus)."""
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    logger.addHandler(_QueueHandler(log_queue))
+    listener = _QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def setup_logging(format: str, datefmt: str, level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Comme logging.basicConfig (sortie d'erreur), mais sans écriture sur le thread qui journalise."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(format, datefmt))
+    root = logging.getLogger()
+    root.setLevel(level)
+    return queued(root, handler)
@@ -0,0 +1,100 @@
+# royal/manager.py
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Optional
+
+# Délai (en secondes) sans interaction au bout duquel une partie quitte la mémoire.
+GAME_IDLE_TTL = float(os.getenv("GAME_IDLE_TTL", "1800"))
+
+
+def approx_size(obj, _seen: Optional[set] = None) -> int:
+    """Taille mémoire approximative d'un objet et de tout ce qu'il contient (listes, dicts, attributs)."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += approx_size(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_size(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+class GameManager:
+    """
+    Suit les parties en mémoire et la date de leur dernière interaction.
+    Une partie inactive depuis plus de `ttl` secondes est réduite à sa forme compacte
+    (FEN, pions royaux, capacité en cours, IDs des joueurs) ; sa vue est reconstruite au clic suivant.
+    """
+
+    def __init__(self, rebuild: Callable[[dict], Awaitable], ttl: float = GAME_IDLE_TTL):
+        self.ttl = ttl
+        self._rebuild = rebuild
+        self.resident: dict[int, object] = {} # ID du message -> GameView
+        self.evicted: dict[int, bytes] = {}   # ID du message -> forme compacte (JSON)
+        self.evictions = 0
+        self.rehydrations = 0
+        self._rehydrating: dict[int, asyncio.Future] = {}
+
+    def track(self, view):
+        self.evicted.pop(view.message_id, None)
+        self.resident[view.message_id] = view
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Sort de la mémoire les parties inactives ; renvoie le nombre de parties évincées."""
+        now = now if now is not None else time.monotonic()
+        count = 0
+        for message_id, view in list(self.resident.items()):
+            if view.is_finished():
+                del self.resident[message_id]
+            elif now - view.last_interaction > self.ttl:
+                # stop() retire aussi la vue du registre de discord.py : plus rien ne la référence.
+                self.evicted[message_id] = json.dumps(view.to_record(), separators=(",", ":")).encode("utf-8")
+                view.stop()
+                del self.resident[message_id]
+                count += 1
+        self.evictions += count
+        return count
+
+    def is_evicted(self, message_id: int) -> bool:
+        return message_id in self.evicted or message_id in self._rehydrating
+
+    async def rehydrate(self, message_id: int):
+        """Reconstruit la vue d'une partie évincée, ou None si ce message n'en est pas une."""
+        # Deux clics rapprochés sur la même partie attendent la même reconstruction.
+        task = self._rehydrating.get(message_id)
+        if task is None:
+            compact = self.evicted.get(message_id)
+            if compact is None:
+                return None
+            task = asyncio.ensure_future(self._rebuild(json.loads(compact)))
+            self._rehydrating[message_id] = task
+            try:
+                view = await task
+            finally:
+                del self._rehydrating[message_id]
+            self.track(view)
+            self.rehydrations += 1
+            return view
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        resident = list(self.resident.values())
+        per_game = sum(approx_size(view.board) + approx_size(view.to_components()) for view in resident) // len(resident) if resident else 0
+        return {
+            "resident": len(resident),
+            "evicted": len(self.evicted),
+            "approx_bytes_per_game": per_game,
+            "approx_bytes_per_evicted_game": sum(map(len, self.evicted.values())) // len(self.evicted) if self.evicted else 0,
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+        }
@@ -0,0 +1,162 @@
+# royal/matchmaking.py
+
+import asyncio
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Classement Elo des joueurs (parties entre joueurs uniquement, pas contre l'ordinateur).
+RATING_INITIAL = float(os.getenv("RATING_INITIAL", "1200"))
+RATING_K = float(os.getenv("RATING_K", "20"))
+# Coefficient plus fort pour les premières parties, le temps que le classement se stabilise.
+RATING_K_PROVISIONAL = float(os.getenv("RATING_K_PROVISIONAL", "40"))
+RATING_PROVISIONAL_GAMES = int(os.getenv("RATING_PROVISIONAL_GAMES", "20"))
+RATING_CACHE_ENTRIES = int(os.getenv("RATING_CACHE_ENTRIES", "4096"))
+# File d'attente (/file_attente) : écart de classement accepté au départ, élargi de MATCH_BAND_GROWTH points
+# par seconde d'attente. Au-delà de MATCH_MAX_WAIT, on abandonne (le jeton de l'interaction expire à 15 min).
+MATCH_BAND = float(os.getenv("MATCH_BAND", "100"))
+MATCH_BAND_GROWTH = float(os.getenv("MATCH_BAND_GROWTH", "5"))
+MATCH_MAX_WAIT = float(os.getenv("MATCH_MAX_WAIT", "600"))
+MATCH_TICK = float(os.getenv("MATCH_TICK", "2"))
+
+
+def expected_score(rating: float, opponent: float) -> float:
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+def rating_k(games: int) -> float:
+    return RATING_K_PROVISIONAL if games < RATING_PROVISIONAL_GAMES else RATING_K
+
+
+class Ratings:
+    """
+    Classements Elo, lus dans le GameStore à la demande et gardés dans un petit cache LRU.
+    Les écritures passent par la file du GameStore, comme le reste de la sauvegarde.
+    """
+
+    def __init__(self, store, max_entries: int = RATING_CACHE_ENTRIES):
+        self.store = store
+        self.max_entries = max_entries
+        self._values: OrderedDict[int, tuple[float, int]] = OrderedDict() # joueur -> (classement, parties jouées)
+        self._lock = asyncio.Lock()
+
+    async def get(self, player_id: int) -> tuple[float, int]:
+        value = self._values.get(player_id)
+        if value is None:
+            value = await asyncio.to_thread(self.store.load_rating, player_id) or (RATING_INITIAL, 0)
+        self._remember(player_id, value)
+        return value
+
+    def _remember(self, player_id: int, value: tuple[float, int]):
+        self._values[player_id] = value
+        self._values.move_to_end(player_id)
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+    async def record_game(self, white_id: int, black_id: int, white_score: float) -> tuple[float, float]:
+        """Met à jour les deux classements après une partie ; renvoie la variation de chacun."""
+        # Deux fins de partie simultanées pour un même joueur : la seconde part du classement mis à jour.
+        async with self._lock:
+            (white, white_games), (black, black_games) = await self.get(white_id), await self.get(black_id)
+            expected = expected_score(white, black)
+            white_delta = rating_k(white_games) * (white_score - expected)
+            black_delta = rating_k(black_games) * (expected - white_score)
+            for player_id, rating, games in ((white_id, white + white_delta, white_games + 1),
+                                             (black_id, black + black_delta, black_games + 1)):
+                self._remember(player_id, (rating, games))
+                self.store.save_rating(player_id, rating, games)
+            return white_delta, black_delta
+
+
+class Waiting:
+    """Un joueur dans la file : son classement, son heure d'arrivée (time.monotonic) et de quoi le prévenir."""
+    __slots__ = ("player_id", "rating", "joined", "payload")
+
+    def __init__(self, player_id: int, rating: float, joined: float, payload: Any = None):
+        self.player_id = player_id
+        self.rating = rating
+        self.joined = joined
+        self.payload = payload
+
+    @property
+    def key(self) -> tuple[float, float, int]:
+        return (self.rating, self.joined, self.player_id)
+
+
+class MatchQueue:
+    """
+    File d'attente d'un serveur, triée par classement.
+    L'adversaire le plus proche d'un joueur est toujours son voisin dans l'index : une recherche par bissection
+    (O(log n)) suffit pour l'arrivée d'un joueur, et un passage sur les voisins pour les joueurs qui attendent.
+    Deux joueurs sont appariés si leur écart tient dans la fourchette du plus patient des deux,
+    qui s'élargit avec l'attente.
+    """
+
+    def __init__(self, band: float = MATCH_BAND, growth: float = MATCH_BAND_GROWTH):
+        self.band_base = band
+        self.growth = growth
+        self._keys: list[tuple[float, float, int]] = []
+        self._entries: dict[int, Waiting] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self._entries
+
+    def entries(self) -> list[Waiting]:
+        return list(self._entries.values())
+
+    def band(self, entry: Waiting, now: float) -> float:
+        return self.band_base + self.growth * (now - entry.joined)
+
+    def _acceptable(self, first: Waiting, second: Waiting, now: float) -> bool:
+        return abs(first.rating - second.rating) <= max(self.band(first, now), self.band(second, now))
+
+    def add(self, entry: Waiting, now: float) -> Optional[Waiting]:
+        """Ajoute un joueur ; s'il a déjà un adversaire acceptable, celui-ci sort de la file et est renvoyé."""
+        if entry.player_id in self._entries:
+            raise ValueError(f"joueur {entry.player_id} déjà dans la file")
+        index = bisect_left(self._keys, entry.key)
+        candidates = [self._entries[self._keys[i][2]] for i in (index - 1, index) if 0 <= i < len(self._keys)]
+        candidates = [other for other in candidates if self._acceptable(entry, other, now)]
+        if candidates:
+            opponent = min(candidates, key=lambda other: abs(other.rating - entry.rating))
+            self.remove(opponent.player_id)
+            return opponent
+        self._keys.insert(index, entry.key)
+        self._entries[entry.player_id] = entry
+        return None
+
+    def remove(self, player_id: int) -> Optional[Waiting]:
+        entry = self._entries.pop(player_id, None)
+        if entry is not None:
+            del self._keys[bisect_left(self._keys, entry.key)]
+        return entry
+
+    def pair_waiting(self, now: float) -> list[tuple[Waiting, Waiting]]:
+        """Apparie les voisins dont la fourchette s'est assez élargie depuis leur arrivée."""
+        pairs, kept = [], []
+        index = 0
+        while index < len(self._keys):
+            first = self._entries[self._keys[index][2]]
+            if index + 1 < len(self._keys):
+                second = self._entries[self._keys[index + 1][2]]
+                if self._acceptable(first, second, now):
+                    pairs.append((first, second))
+                    index += 2
+                    continue
+            kept.append(self._keys[index])
+            index += 1
+        if pairs:
+            self._keys = kept
+            for first, second in pairs:
+                del self._entries[first.player_id], self._entries[second.player_id]
+        return pairs
+
+    def expire(self, now: float, max_wait: float = MATCH_MAX_WAIT) -> list[Waiting]:
+        expired = [entry for entry in self._entries.values() if now - entry.joined > max_wait]
+        for entry in expired:
+            self.remove(entry.player_id)
+        return expired
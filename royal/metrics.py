@@ -0,0 +1,278 @@
+# royal/metrics.py
+
+import asyncio
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Adresse de l'endpoint Prometheus local (METRICS_PORT=0 pour le désactiver).
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# Fichier où écrire une ligne JSON par interaction (vide = pas de journal structuré).
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH", "")
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288)
+WAIT_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock() # La boucle écrit, le thread HTTP lit
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def expose(self) -> list[str]:
+        with self._lock:
+            return [f"{self.name}{_label_text(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Valeur instantanée ; `function` est appelée à chaque lecture si elle est fournie."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text)
+        self.function = function
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    def value(self) -> float:
+        if self.function is None:
+            return self._value
+        try:
+            return self.function()
+        except Exception:
+            return float("nan")
+
+    def expose(self) -> list[str]:
+        return [f"{self.name} {self.value()}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = SECONDS_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {} # labels -> [compte par seau..., somme, total]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_label_text(key + (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(key)} {series[-1]}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render_text() -> str:
+    """Toutes les métriques au format texte de Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.header() + metric.expose()
+    return "\n".join(lines) + "\n"
+
+
+# --- MÉTRIQUES DU BOT ---
+CALLBACK_SECONDS = Histogram("royal_callback_seconds", "Durée totale d'un callback de composant, par custom_id.")
+PHASE_SECONDS = Histogram("royal_phase_seconds", "Durée de chaque étape d'un clic (queue, movegen, render, svg, rasterize, composite, encode, upload).")
+RENDERS = Counter("royal_renders_total", "Images d'échiquier demandées, par moteur et résultat du cache (hit, inflight, miss).")
+RENDER_ERRORS = Counter("royal_render_errors_total", "Rendus échoués, par type d'erreur.")
+RENDER_DOWNGRADES = Counter("royal_render_downgrades_total", "Images rendues en taille réduite parce que la file de rendu débordait.")
+CLICKS_DROPPED = Counter("royal_clicks_dropped_total", "Clics ignorés : doublon d'interaction, composant périmé ou sélection remplacée par une plus récente.")
+PRERENDERS = Counter("royal_prerenders_total", "Images pré-rendues pendant la réflexion du joueur : rendered, busy (pool occupé, abandon), served (servie depuis le cache).")
+UPLOADS = Counter("royal_uploads_total", "Images de partie envoyées (sent) ou laissées en place car identiques (skipped).")
+IMAGE_BYTES = Histogram("royal_image_bytes", "Taille des images envoyées, par format.", buckets=BYTES_BUCKETS)
+ENGINE_SECONDS = Histogram("royal_engine_seconds", "Temps de réflexion de l'ordinateur par coup, par niveau.")
+ENGINE_NODES = Counter("royal_engine_nodes_total", "Positions examinées par l'ordinateur, par niveau.")
+SPECTATOR_EDITS = Counter("royal_spectator_edits_total", "Modifications des messages spectateurs : sent, coalesced (remplacée par une position plus récente), gone, error.")
+SPECTATOR_RENDERS = Counter("royal_spectator_renders_total", "Positions rendues pour les spectateurs (une par position, quel que soit leur nombre).")
+RENDER_QUEUE_WAIT_SECONDS = Histogram("royal_render_queue_wait_seconds", "Attente d'un rendu dans la file du pool, avant qu'un processus ne s'en occupe.")
+SHED_SWITCHES = Counter("royal_shed_switches_total", "Changements de mode d'affichage sous charge (full, lowres, text), par portée (global, game).")
+MATCH_WAIT_SECONDS = Histogram("royal_match_wait_seconds", "Attente dans la file /file_attente, par issue (matched, left, expired).", buckets=WAIT_BUCKETS)
+LOOP_LAG_SECONDS = Histogram("royal_event_loop_lag_seconds", "Retard de réveil de la boucle asyncio.")
+EXPLORER_QUERY_SECONDS = Histogram("royal_explorer_query_seconds", "Durée d'une recherche /explorer dans l'index des positions.")
+EXPLORER_GAMES = Counter("royal_explorer_games_total", "Parties ajoutées à l'index de l'explorateur, par source (store, archive).")
+LOG_RECORDS_DROPPED = Counter("royal_log_records_dropped_total", "Lignes de journal perdues, file d'écriture pleine, par logger.")
+SLOW_CALLBACKS = Counter("royal_slow_callbacks_total", "Clics plus longs que PROFILE_SLOW_SECONDS, par custom_id et selon qu'un profil cProfile a été pris.")
+ACTIVE_GAMES = Gauge("royal_active_games", "Parties en mémoire.")
+EVICTED_GAMES = Gauge("royal_evicted_games", "Parties sorties de la mémoire, reconstruites au prochain clic.")
+MATCH_QUEUE_DEPTH = Gauge("royal_match_queue_depth", "Joueurs dans les files d'attente (/file_attente).")
+SHED_LEVEL = Gauge("royal_shed_level", "Mode d'affichage global : 0 = full, 1 = lowres, 2 = text.")
+SHED_GAMES = Gauge("royal_shed_games", "Parties allégées individuellement (portée « game »).")
+SPECTATORS = Gauge("royal_spectators", "Messages spectateurs suivis.")
+RENDER_PENDING = Gauge("royal_render_pending", "Rendus en cours ou en attente dans le pool.")
+
+
+# --- DÉTAIL PAR INTERACTION ---
+# Fiche du clic en cours : chaque phase() et annotate() s'y ajoute, et la ligne JSON part à la fin du callback.
+_interaction_record: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("royal_interaction_record", default=None)
+_sink = logging.getLogger("royal.metrics")
+_sink.propagate = False
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+
+def record_phase(name: str, seconds: float):
+    """Pour une étape mesurée ailleurs (dans un processus de rendu, par exemple)."""
+    PHASE_SECONDS.observe(seconds, phase=name)
+    record = _interaction_record.get()
+    if record is not None:
+        record["phases"][name] = record["phases"].get(name, 0.0) + seconds
+
+
+def current_interaction() -> Optional[dict]:
+    """Fiche du clic en cours (custom_id, phases...), ou None hors d'un callback."""
+    return _interaction_record.get()
+
+
+def annotate(**fields):
+    """Ajoute des champs à la ligne JSON du clic en cours (poids de l'image, format...)."""
+    record = _interaction_record.get()
+    if record is not None:
+        record.update(fields)
+
+
+@contextmanager
+def interaction(custom_id: str, **fields):
+    """Chronomètre un callback complet et, si le journal structuré est actif, en écrit le détail."""
+    record = {"custom_id": custom_id, **fields, "phases": {}}
+    token = _interaction_record.set(record)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        _interaction_record.reset(token)
+        CALLBACK_SECONDS.observe(elapsed, custom_id=custom_id)
+        if _sink.handlers:
+            record["ts"] = time.time()
+            record["seconds"] = round(elapsed, 6)
+            record["phases"] = {k: round(v, 6) for k, v in record["phases"].items()}
+            _sink.info(json.dumps(record, separators=(",", ":"), default=str))
+
+
+def enable_log_sink(path: str = METRICS_LOG_PATH):
+    if path and not _sink.handlers:
+        from royal.logs import queued
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # Une ligne par clic : l'écriture se fait dans un thread à part, pas sur la boucle.
+        queued(_sink, handler)
+        _sink.setLevel(logging.INFO)
+
+
+# --- RETARD DE LA BOUCLE ---
+async def watch_event_loop(interval: float = 0.5, listener: Optional[Callable[[float], None]] = None):
+    """Mesure de combien la boucle se réveille en retard : c'est le temps qu'un clic passe à attendre."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        LOOP_LAG_SECONDS.observe(lag)
+        if listener is not None:
+            listener(lag)
+
+
+# --- ENDPOINT HTTP ---
+class MetricsServer:
+    """Petit serveur Werkzeug dans un thread : GET /metrics renvoie render_text()."""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def app(environ, start_response):
+        from werkzeug.wrappers import Response
+        if environ.get("PATH_INFO") != "/metrics":
+            return Response("not found\n", status=404)(environ, start_response)
+        response = Response(render_text(), mimetype="text/plain")
+        response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+        return response(environ, start_response)
+
+    def start(self):
+        from werkzeug.serving import make_server
+        self._server = make_server(self.host, self.port, self.app, threaded=True)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name="royal-metrics", daemon=True)
+        self._thread.start()
+        logging.info(f"📈 Métriques disponibles sur http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
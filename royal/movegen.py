@@ -0,0 +1,94 @@
+# royal/movegen.py
+
+import chess
+
+# --- MASQUES PRÉCALCULÉS PAR CASE ---
+# Indexés [couleur][case] (BLACK = 0, WHITE = 1), comme chess.BB_PAWN_ATTACKS.
+
+
+def _backward_step(color: chess.Color, square: int) -> chess.Bitboard:
+    back = square - 8 if color == chess.WHITE else square + 8
+    return chess.BB_SQUARES[back] if 0 <= back < 64 else chess.BB_EMPTY
+
+
+def _forward_steps(color: chess.Color, square: int, count: int) -> chess.Bitboard:
+    direction = 8 if color == chess.WHITE else -8
+    mask = chess.BB_EMPTY
+    for step in range(1, count + 1):
+        target = square + step * direction
+        if 0 <= target < 64:
+            mask |= chess.BB_SQUARES[target]
+    return mask
+
+
+# Règle Royal : tous les pions peuvent reculer d'une case.
+BB_PAWN_BACKWARD = [[_backward_step(color, sq) for sq in chess.SQUARES] for color in (chess.BLACK, chess.WHITE)]
+# Pion royal : jusqu'à 3 cases vers l'avant (sans sauter par-dessus une pièce)...
+BB_ROYAL_FORWARD = [[_forward_steps(color, sq, 3) for sq in chess.SQUARES] for color in (chess.BLACK, chess.WHITE)]
+# ... et les diagonales avant sans capture, soit exactement les cases attaquées par un pion.
+BB_ROYAL_DIAGONALS = chess.BB_PAWN_ATTACKS
+
+# Poussées de pion classiques, reproduites à l'identique de python-chess.
+BB_DOUBLE_PUSH_TARGETS = [chess.BB_RANK_6 | chess.BB_RANK_5, chess.BB_RANK_3 | chess.BB_RANK_4]
+
+
+def _forward(color: chess.Color, bb: chess.Bitboard) -> chess.Bitboard:
+    return (bb << 8) & chess.BB_ALL if color == chess.WHITE else bb >> 8
+
+
+def _royal_forward(color: chess.Color, square: int, occupied: chess.Bitboard) -> chess.Bitboard:
+    ray = BB_ROYAL_FORWARD[color][square]
+    blockers = ray & occupied
+    if not blockers:
+        return ray
+    if color == chess.WHITE:
+        # Le premier obstacle est le bit le plus faible : on garde les cases en dessous.
+        first = blockers & -blockers
+        return ray & (first - 1)
+    # Pour les Noirs, le premier obstacle est le bit le plus fort : on garde les cases au-dessus.
+    first = 1 << (blockers.bit_length() - 1)
+    return ray & ~((first << 1) - 1)
+
+
+def piece_destinations(board: chess.Board, square: int, royal_pawns=()) -> chess.SquareSet:
+    """
+    Toutes les cases d'arrivée de la pièce en `square`, règles Royal comprises.
+    Fonctionne pour les deux couleurs sans toucher à `board.turn` : le roque et la prise en passant
+    ne sont proposés qu'au camp dont c'est le tour, comme dans python-chess.
+    """
+    piece = board.piece_at(square)
+    if not piece:
+        return chess.SquareSet()
+
+    color = piece.color
+    occupied = board.occupied
+    from_mask = chess.BB_SQUARES[square]
+
+    if piece.piece_type != chess.PAWN:
+        destinations = board.attacks_mask(square) & ~board.occupied_co[color]
+        if piece.piece_type == chess.KING and color == board.turn:
+            for move in board.generate_castling_moves(from_mask):
+                destinations |= chess.BB_SQUARES[move.to_square]
+        return chess.SquareSet(destinations)
+
+    # Coups de pion de base : captures, poussée simple et double.
+    destinations = chess.BB_PAWN_ATTACKS[color][square] & board.occupied_co[not color]
+    single = _forward(color, from_mask) & ~occupied
+    double = _forward(color, single) & ~occupied & BB_DOUBLE_PUSH_TARGETS[color]
+    destinations |= single | double
+    if color == board.turn and board.ep_square is not None:
+        for move in board.generate_pseudo_legal_ep(from_mask):
+            destinations |= chess.BB_SQUARES[move.to_square]
+
+    # Règles Royal.
+    destinations |= BB_PAWN_BACKWARD[color][square] & ~occupied
+    if square in royal_pawns:
+        destinations |= _royal_forward(color, square, occupied)
+        destinations |= BB_ROYAL_DIAGONALS[color][square] & ~occupied
+
+    return chess.SquareSet(destinations)
+
+
+def build_move_table(board: chess.Board, royal_pawns=()) -> dict[int, chess.SquareSet]:
+    """Destinations de toutes les pièces de l'échiquier, des deux couleurs, indexées par case de départ."""
+    return {square: piece_destinations(board, square, royal_pawns) for square in chess.scan_forward(board.occupied)}
@@ -0,0 +1,53 @@
+# royal/prerender.py
+
+import os
+
+import chess
+
+from royal.render import get_renderer
+from royal.rules import apply_action
+
+# Nombre maximal d'images pré-rendues par position (0 = pas de pré-rendu).
+PRERENDER_BUDGET = int(os.getenv("PRERENDER_BUDGET", "32"))
+
+# Ordre des destinations « fréquentes » : prises de la pièce la plus précieuse d'abord, puis vers le centre.
+_PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 100}
+
+
+def _destination_priority(board: chess.Board, to_square: int) -> tuple:
+    victim = board.piece_at(to_square)
+    centre = max(abs(chess.square_file(to_square) * 2 - 7), abs(chess.square_rank(to_square) * 2 - 7))
+    return (-_PIECE_VALUES[victim.piece_type] if victim else 0, centre)
+
+
+def likely_frames(view, budget: int = PRERENDER_BUDGET) -> list[tuple[str, dict[int, str]]]:
+    """
+    Images que le prochain clic a le plus de chances de demander, dans l'ordre où les rendre :
+    la sélection de chaque pièce proposée dans le menu, puis l'échiquier après les coups les plus courants.
+    Les couleurs sont celles des callbacks (GameView.selection_fill, GameView.frame_fill) : mêmes clés de cache.
+    """
+    pieces = [int(option.value) for item in view.children
+              if getattr(item, "custom_id", None) == "piece_select" for option in item.options]
+    frames = [(view.board.board_fen(), view.frame_fill(view.selection_fill(square))) for square in pieces]
+
+    move_table = view.move_table()
+    moves = [(from_square, to_square) for from_square in pieces for to_square in move_table.get(from_square, ())]
+    moves.sort(key=lambda move: _destination_priority(view.board, move[1]))
+    for from_square, to_square in moves[:max(0, budget - len(frames))]:
+        board = view.board.copy(stack=False)
+        royal_pawns = set(view.royal_pawns)
+        apply_action(board, royal_pawns, ("move", from_square, to_square))
+        frames.append((board.board_fen(), view.frame_fill({}, royal_pawns)))
+    return frames[:budget]
+
+
+async def prerender(view, budget: int = PRERENDER_BUDGET):
+    """
+    Rend en arrière-plan, pendant que le joueur réfléchit, les images de likely_frames().
+    S'arrête dès que le pool de rendu est occupé par de vrais clics ; la vue l'annule quand la position change.
+    """
+    renderer = get_renderer()
+    for board_fen, fill in likely_frames(view, budget):
+        if not await renderer.prerender(board_fen, fill, {}, backend=view.render_backend,
+                                        image_format=view.image_format, size=view.image_size):
+            return
@@ -0,0 +1,161 @@
+# royal/profiling.py
+
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+from royal import metrics
+
+# Profilage des clics lents (désactivé par défaut) : un callback de composant (Dropdown, Button) plus long que
+# PROFILE_SLOW_SECONDS laisse une fiche dans PROFILE_DIR : durée et phases du clic, pile de la tâche au moment
+# où le seuil est dépassé et, pour une partie des clics, un profil cProfile (.prof, lisible avec pstats).
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Fiches gardées : au-delà, les plus anciennes sont supprimées.
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+# Part des clics suivis par cProfile, qui ralentit tout le thread de la boucle tant qu'il tourne...
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.05"))
+# ... et part maximale du temps passée sous cProfile, en moyenne sur PROFILE_BUDGET_WINDOW secondes.
+PROFILE_MAX_OVERHEAD = float(os.getenv("PROFILE_MAX_OVERHEAD", "0.02"))
+PROFILE_BUDGET_WINDOW = 60
+PROFILE_TOP_FUNCTIONS = 40
+
+
+def awaiting_stack(task: asyncio.Task) -> list[str]:
+    """Chaîne des coroutines d'une tâche suspendue, jusqu'à ce qu'elle attend (future, verrou, pool...)."""
+    lines, awaitable = [], task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            lines.append(f"en attente de {repr(awaitable)[:200]}")
+            break
+        lines.append(f"{frame.f_code.co_filename}:{frame.f_lineno} dans {frame.f_code.co_name}")
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return lines
+
+
+class SlowCallbackProfiler:
+    """
+    Chronomètre les callbacks et garde une fiche de ceux qui dépassent le seuil.
+    cProfile voit tout ce que le thread exécute pendant le clic, y compris les autres tâches qui reprennent la main
+    pendant ses await : c'est souvent ce qui retient un clic quand la boucle est chargée.
+    Un seul profil à la fois (cProfile est global au thread), et un budget de temps plafonne le surcoût :
+    il se remplit de `max_overhead` seconde par seconde, chaque profil en consomme la durée.
+    Les fiches sont écrites par un thread à part.
+    """
+
+    def __init__(self, threshold: float = PROFILE_SLOW_SECONDS, directory: str = PROFILE_DIR,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, max_overhead: float = PROFILE_MAX_OVERHEAD,
+                 max_files: int = PROFILE_MAX_FILES):
+        self.threshold = threshold
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_overhead = max_overhead
+        self.max_files = max_files
+        self._active: Optional[cProfile.Profile] = None
+        self._budget = max_overhead * PROFILE_BUDGET_WINDOW
+        self._budget_at = time.monotonic()
+        self._rng = random.Random()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="royal-profile")
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def _start_profile(self) -> Optional[cProfile.Profile]:
+        if self._active is not None or self._rng.random() >= self.sample_rate:
+            return None
+        now = time.monotonic()
+        self._budget = min(self.max_overhead * PROFILE_BUDGET_WINDOW, self._budget + (now - self._budget_at) * self.max_overhead)
+        self._budget_at = now
+        if self._budget <= 0:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None # Un autre profileur tourne déjà (débogueur...)
+        self._active = profile
+        return profile
+
+    @contextmanager
+    def watch(self, custom_id: str, **fields):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        profile = self._start_profile()
+        stack: list[str] = []
+        task = asyncio.current_task()
+        timer = asyncio.get_running_loop().call_later(self.threshold, lambda: stack.extend(awaiting_stack(task))) if task else None
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if timer is not None:
+                timer.cancel()
+            if profile is not None:
+                profile.disable()
+                self._active = None
+                self._budget -= elapsed
+            if elapsed >= self.threshold:
+                metrics.SLOW_CALLBACKS.inc(custom_id=custom_id, profiled=str(profile is not None).lower())
+                record = {**(metrics.current_interaction() or {}), "custom_id": custom_id, **fields,
+                          "ts": time.time(), "seconds": round(elapsed, 6)}
+                record["phases"] = {name: round(seconds, 6) for name, seconds in record.get("phases", {}).items()}
+                self._writer.submit(self._write, record, stack, profile)
+
+    def _write(self, record: dict, stack: list[str], profile: Optional[cProfile.Profile]):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(record["ts"])) + f".{int(record['ts'] * 1000) % 1000:03d}"
+            name = os.path.join(self.directory, f"{stamp}-{record['custom_id']}")
+            text = io.StringIO()
+            text.write(json.dumps(record, separators=(",", ":"), default=str) + "\n\n")
+            if stack:
+                text.write(f"Pile de la tâche après {self.threshold} s :\n" + "\n".join(f"  {line}" for line in stack) + "\n\n")
+            else:
+                # Le minuteur n'a pas pu passer : le clic a bloqué la boucle jusqu'à sa fin.
+                text.write("Pile non capturée : la boucle n'a pas repris la main avant la fin du clic (code bloquant).\n\n")
+            if profile is not None:
+                profile.dump_stats(f"{name}.prof")
+                pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            with open(f"{name}.txt", "w", encoding="utf-8") as fp:
+                fp.write(text.getvalue())
+            logging.warning(f"🐢 Clic lent ({record['custom_id']}, {record['seconds']:.2f} s) : fiche {name}.txt")
+            self._rotate()
+        except Exception as e:
+            logging.error(f"❌ Fiche de profilage non écrite : {e!r}")
+
+    def _rotate(self):
+        stems = sorted({os.path.splitext(entry)[0] for entry in os.listdir(self.directory)})
+        for stem in stems[:max(0, len(stems) - self.max_files)]:
+            for extension in (".txt", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, stem + extension))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+
+
+_profiler = SlowCallbackProfiler()
+
+
+def watch(custom_id: str, **fields):
+    """Chronomètre un callback de composant ; au-delà de PROFILE_SLOW_SECONDS, une fiche est écrite (voir plus haut)."""
+    return _profiler.watch(custom_id, **fields)
+
+
+def shutdown_profiler():
+    _profiler.close()
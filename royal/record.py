@@ -0,0 +1,210 @@
+# royal/record.py
+
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
+
+import chess
+
+from royal.rules import apply_action
+
+# Format compact d'une partie Royal : position de départ, pions royaux de départ, résultat et journal d'actions.
+# Chaque action (voir royal/rules.py) tient sur 2 octets : type sur 3 bits, puis deux champs de 6 bits
+# (cases, ou type de pièce pour l'Équipe de secours). Les déplacements des pions royaux s'en déduisent :
+# rejouer les actions avec apply_action redonne exactement l'échiquier de la partie en direct.
+#
+#   binaire : b"RY" | version | FEN (varint + ASCII, vide = position initiale) | pions royaux (varint, masque 64 bits)
+#             | résultat (1 octet) | nombre d'actions (varint) | 2 octets par action
+#   archive : suite d'enregistrements binaires, chacun précédé de sa longueur (varint), lisible en flux
+#   texte   : une action par mot, ex. "e2e4 N1:g1f3 N2:f3e5 T:c1e3 S:q@d1 M:e7e5 R:e2 U"
+MAGIC = b"RY"
+VERSION = 1
+ACTION_CODES = {"move": 0, "double1": 1, "double2": 2, "teleport": 3, "rescue": 4, "mind": 5, "royal": 6, "undo": 7}
+ACTION_KINDS = {code: kind for kind, code in ACTION_CODES.items()}
+RESULTS = {None: 0, "1-0": 1, "0-1": 2, "1/2-1/2": 3}
+RESULT_CODES = {code: result for result, code in RESULTS.items()}
+TEXT_PREFIXES = {"double1": "N1", "double2": "N2", "teleport": "T", "rescue": "S", "mind": "M", "royal": "R"}
+TEXT_KINDS = {prefix: kind for kind, prefix in TEXT_PREFIXES.items()}
+
+
+class RecordError(ValueError):
+    """Enregistrement illisible ou tronqué."""
+
+
+class GameRecord(NamedTuple):
+    initial_fen: str
+    royal_pawns: frozenset
+    actions: tuple
+    result: Optional[str] = None
+
+
+# --- ACTIONS ---
+def encode_action(action: tuple) -> bytes:
+    kind = action[0]
+    first = action[1] if len(action) > 1 else 0
+    second = action[2] if len(action) > 2 else 0
+    return ((ACTION_CODES[kind] << 12) | (first << 6) | second).to_bytes(2, "big")
+
+
+def decode_action(data: bytes) -> tuple:
+    value = int.from_bytes(data, "big")
+    kind = ACTION_KINDS.get(value >> 12)
+    if kind is None:
+        raise RecordError(f"type d'action inconnu : {value >> 12}")
+    first, second = (value >> 6) & 63, value & 63
+    if kind == "undo":
+        return (kind,)
+    if kind == "royal":
+        return (kind, first)
+    return (kind, first, second)
+
+
+def action_to_text(action: tuple) -> str:
+    kind = action[0]
+    if kind == "undo":
+        return "U"
+    if kind == "royal":
+        return f"R:{chess.square_name(action[1])}"
+    if kind == "rescue":
+        return f"S:{chess.piece_symbol(action[1])}@{chess.square_name(action[2])}"
+    squares = chess.square_name(action[1]) + chess.square_name(action[2])
+    return squares if kind == "move" else f"{TEXT_PREFIXES[kind]}:{squares}"
+
+
+def action_from_text(token: str) -> tuple:
+    try:
+        if token == "U":
+            return ("undo",)
+        prefix, _, body = token.rpartition(":")
+        kind = TEXT_KINDS[prefix] if prefix else "move"
+        if kind == "royal":
+            return (kind, chess.parse_square(body))
+        if kind == "rescue":
+            symbol, _, square = body.partition("@")
+            return (kind, chess.PIECE_SYMBOLS.index(symbol.lower()), chess.parse_square(square))
+        return (kind, chess.parse_square(body[:2]), chess.parse_square(body[2:]))
+    except (KeyError, ValueError) as e:
+        raise RecordError(f"action illisible : {token!r}") from e
+
+
+def to_text(actions: Iterable[tuple]) -> str:
+    return " ".join(map(action_to_text, actions))
+
+
+def from_text(text: str) -> list[tuple]:
+    return [action_from_text(token) for token in text.split()]
+
+
+# --- ENREGISTREMENTS ---
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _read_varint(data, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise RecordError("varint tronqué")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode(record: GameRecord) -> bytes:
+    fen = b"" if record.initial_fen == chess.STARTING_FEN else record.initial_fen.encode("ascii")
+    royal_mask = 0
+    for square in record.royal_pawns:
+        royal_mask |= chess.BB_SQUARES[square]
+    return b"".join([
+        MAGIC, bytes([VERSION]), _varint(len(fen)), fen, _varint(royal_mask), bytes([RESULTS[record.result]]),
+        _varint(len(record.actions)), *map(encode_action, record.actions),
+    ])
+
+
+def decode(data: bytes) -> GameRecord:
+    """Lit un enregistrement ; toute donnée tronquée ou inconnue lève RecordError."""
+    if data[:2] != MAGIC:
+        raise RecordError("ce n'est pas un enregistrement Royal")
+    if len(data) < 3:
+        raise RecordError("enregistrement tronqué")
+    if data[2] != VERSION:
+        raise RecordError(f"version {data[2]} non prise en charge")
+    length, pos = _read_varint(data, 3)
+    if len(data) < pos + length:
+        raise RecordError("position de départ tronquée")
+    try:
+        fen = data[pos:pos + length].decode("ascii") or chess.STARTING_FEN
+    except UnicodeDecodeError as e:
+        raise RecordError("position de départ illisible") from e
+    royal_mask, pos = _read_varint(data, pos + length)
+    if pos >= len(data):
+        raise RecordError("résultat manquant")
+    if data[pos] not in RESULT_CODES:
+        raise RecordError(f"résultat inconnu : {data[pos]}")
+    result = RESULT_CODES[data[pos]]
+    count, pos = _read_varint(data, pos + 1)
+    if len(data) < pos + 2 * count:
+        raise RecordError("journal d'actions tronqué")
+    actions = tuple(decode_action(data[pos + 2 * i:pos + 2 * i + 2]) for i in range(count))
+    return GameRecord(fen, frozenset(chess.SquareSet(royal_mask)), actions, result)
+
+
+def replay(record: GameRecord) -> tuple[chess.Board, set]:
+    """Rejoue la partie : même échiquier et mêmes pions royaux que la partie en direct."""
+    board, royal_pawns = chess.Board(record.initial_fen), set(record.royal_pawns)
+    for action in record.actions:
+        apply_action(board, royal_pawns, action)
+    return board, royal_pawns
+
+
+def iter_positions(record: GameRecord) -> Iterator[tuple[chess.Board, set, Optional[tuple]]]:
+    """
+    Position de départ, puis la position après chaque action avec l'action qui y mène.
+    Un seul échiquier, modifié sur place d'une étape à l'autre : rien ne s'accumule en mémoire.
+    """
+    board, royal_pawns = chess.Board(record.initial_fen), set(record.royal_pawns)
+    yield board, royal_pawns, None
+    for action in record.actions:
+        apply_action(board, royal_pawns, action)
+        yield board, royal_pawns, action
+
+
+# --- ARCHIVES ---
+def write_archive(fp: BinaryIO, records: Iterable[GameRecord]) -> int:
+    """Ajoute des parties à une archive ouverte en écriture binaire ; renvoie le nombre de parties écrites."""
+    count = 0
+    for record in records:
+        data = encode(record)
+        fp.write(_varint(len(data)))
+        fp.write(data)
+        count += 1
+    return count
+
+
+def read_archive(fp: BinaryIO) -> Iterator[GameRecord]:
+    """Lit une archive partie par partie, sans la charger entièrement en mémoire."""
+    while True:
+        length = shift = 0
+        while True:
+            byte = fp.read(1)
+            if not byte:
+                if shift:
+                    raise RecordError("archive tronquée")
+                return
+            length |= (byte[0] & 0x7F) << shift
+            if not byte[0] & 0x80:
+                break
+            shift += 7
+        data = fp.read(length)
+        if len(data) < length:
+            raise RecordError("archive tronquée")
+        yield decode(data)
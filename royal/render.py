@@ -0,0 +1,278 @@
+# royal/render.py
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from royal import metrics
+from royal.cache import RenderCache, frame_key
+
+# --- CONFIGURATION (variables d'environnement, comme le token dans bot.py) ---
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or os.cpu_count() or 1
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "64"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "10"))
+# Démarrer les processus de rendu juste après la connexion (1) ou seulement au premier rendu (0).
+RENDER_PREWARM = os.getenv("RENDER_PREWARM", "1") == "1"
+# "svg" : chess.svg + cairosvg à chaque image ; "sprite" : composition de morceaux pré-rastérisés.
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "svg")
+RENDER_BACKENDS = ("svg", "sprite")
+# Encodage des images envoyées : "png" (couleurs complètes), "png8" (palette) ou "webp" (sans perte).
+RENDER_FORMAT = os.getenv("RENDER_FORMAT", "png")
+RENDER_FORMATS = ("png", "png8", "webp")
+IMAGE_EXTENSIONS = {"png": "png", "png8": "png", "webp": "webp"}
+# Côté de l'image en pixels (390 = taille par défaut de chess.svg, voir royal/sprites.py).
+RENDER_SIZE = int(os.getenv("RENDER_SIZE", "390"))
+# Quand la file de rendu déborde, on passe à cette taille le temps qu'elle se vide.
+RENDER_DEGRADED_SIZE = int(os.getenv("RENDER_DEGRADED_SIZE", "260"))
+# Nombre de rendus en attente à partir duquel on réduit la taille (0 = dès que tous les processus sont occupés).
+RENDER_DOWNGRADE_AT = int(os.getenv("RENDER_DOWNGRADE_AT", "0"))
+# Replays animés (/replay) : formats, durée d'une position et de la dernière, temps maximal de fabrication.
+REPLAY_FORMATS = ("gif", "webp")
+REPLAY_FRAME_MS = int(os.getenv("REPLAY_FRAME_MS", "700"))
+REPLAY_LAST_FRAME_MS = int(os.getenv("REPLAY_LAST_FRAME_MS", "3000"))
+REPLAY_TIMEOUT = float(os.getenv("REPLAY_TIMEOUT", "60"))
+# Replays fabriqués en même temps : chacun occupe un processus de rendu jusqu'à REPLAY_TIMEOUT, au détriment des parties.
+REPLAY_CONCURRENCY = int(os.getenv("REPLAY_CONCURRENCY", "1"))
+# Pré-rendu (voir royal/prerender.py) seulement tant que moins de rendus que ça sont en cours (0 = la moitié des processus).
+PRERENDER_MAX_PENDING = int(os.getenv("PRERENDER_MAX_PENDING", "0"))
+
+
+class RenderError(Exception):
+    """Le rendu d'un échiquier a échoué."""
+
+
+class RenderQueueFull(RenderError):
+    """Trop de rendus sont déjà en attente."""
+
+
+class RenderTimeout(RenderError):
+    """Le rendu n'a pas abouti dans le temps imparti."""
+
+
+# --- CÔTÉ PROCESSUS DE RENDU ---
+# cairosvg, Pillow et les sprites (royal/render_worker.py) ne sont importés que dans les processus de rendu :
+# le bot démarre sans charger cairo, et les fonctions ci-dessous ne font que passer le relais.
+def _warm_up():
+    from royal import render_worker
+    render_worker.warm_up()
+
+
+def _render(*args) -> tuple[bytes, dict[str, float]]:
+    from royal import render_worker
+    return render_worker.render_image(*args)
+
+
+def _replay(*args) -> tuple[bytes, dict[str, float]]:
+    from royal import render_worker
+    return render_worker.render_replay(*args)
+
+
+def _ready() -> bool:
+    return True
+
+
+# --- CÔTÉ BOUCLE D'ÉVÉNEMENTS ---
+class BoardRenderer:
+    """
+    Exécute les rendus dans un pool de processus pour ne jamais bloquer la boucle asyncio.
+    La file est bornée : au-delà de `queue_size` rendus en attente, on refuse plutôt que d'accumuler.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, queue_size: int = RENDER_QUEUE_SIZE, timeout: float = RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self.cache = RenderCache()
+        self.downgrade_at = RENDER_DOWNGRADE_AT or workers
+        self.output: dict[str, list[int]] = {} # format -> [images, octets], pour suivre le poids moyen d'une image
+        self.prerender_max_pending = PRERENDER_MAX_PENDING or max(1, workers // 2)
+        self._prerendered: OrderedDict[str, None] = OrderedDict() # images pré-rendues pas encore servies
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._waits: deque = deque(maxlen=256) # Attentes récentes dans la file (voir royal/shedding.py)
+        self._replay_slots = asyncio.Semaphore(REPLAY_CONCURRENCY)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" : on ne duplique pas les threads et sockets du bot dans les processus de rendu.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up,
+            )
+        return self._executor
+
+    def drain_waits(self) -> list[float]:
+        """Attentes dans la file mesurées depuis l'appel précédent."""
+        waits = list(self._waits)
+        self._waits.clear()
+        return waits
+
+    def occupancy(self) -> float:
+        """Part de la file de rendu occupée (1 = les prochains rendus sont refusés)."""
+        return self.pending / (self.workers + self.queue_size)
+
+    def _release(self):
+        self.pending -= 1
+
+    async def prewarm(self):
+        """Démarre les processus de rendu (et charge cairo) en arrière-plan, avant la première partie."""
+        started = time.perf_counter()
+        executor = self._get_executor()
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(_ready)) for _ in range(self.workers)))
+        logging.info(f"🎨 {self.workers} processus de rendu prêts en {time.perf_counter() - started:.2f} s.")
+
+    async def render(self, board_fen: str, fill: dict[int, str], options: dict, backend: str = RENDER_BACKEND,
+                     image_format: str = RENDER_FORMAT, size: int = RENDER_SIZE) -> bytes:
+        if backend not in RENDER_BACKENDS:
+            raise ValueError(f"moteur de rendu inconnu : {backend}")
+        if image_format not in RENDER_FORMATS:
+            raise ValueError(f"format d'image inconnu : {image_format}")
+        key = frame_key(board_fen, fill, {**options, "backend": backend, "format": image_format, "size": size})
+        # File engorgée : des images plus petites se rendent et s'envoient plus vite, le temps qu'elle se vide.
+        # Seulement s'il faut vraiment rendre : une image en cache (pré-rendue, par exemple) ou déjà en cours est servie telle quelle.
+        if (self.pending >= self.downgrade_at and size > RENDER_DEGRADED_SIZE
+                and key not in self.cache and key not in self._inflight):
+            size = RENDER_DEGRADED_SIZE
+            metrics.RENDER_DOWNGRADES.inc()
+            key = frame_key(board_fen, fill, {**options, "backend": backend, "format": image_format, "size": size})
+        data = self.cache.get(key)
+        if data is not None:
+            metrics.RENDERS.inc(backend=backend, result="hit")
+            if key in self._prerendered:
+                del self._prerendered[key]
+                metrics.PRERENDERS.inc(result="served")
+            return self._count(image_format, data)
+
+        # Même image déjà en cours de rendu (double clic, deux parties identiques) : on attend celle-là.
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            metrics.RENDERS.inc(backend=backend, result="inflight")
+            return self._count(image_format, await asyncio.shield(inflight))
+
+        metrics.RENDERS.inc(backend=backend, result="miss")
+        return self._count(image_format, await asyncio.shield(self._start(key, backend, board_fen, fill, options, image_format, size)))
+
+    async def prerender(self, board_fen: str, fill: dict[int, str], options: dict, backend: str = RENDER_BACKEND,
+                        image_format: str = RENDER_FORMAT, size: int = RENDER_SIZE) -> bool:
+        """
+        Met une image probable en cache sans l'envoyer. Renvoie False si le pool est trop occupé :
+        les clics des joueurs passent avant, le pré-rendu s'arrête là.
+        """
+        key = frame_key(board_fen, fill, {**options, "backend": backend, "format": image_format, "size": size})
+        if key in self.cache or key in self._inflight:
+            return True
+        if self.pending >= self.prerender_max_pending:
+            metrics.PRERENDERS.inc(result="busy")
+            return False
+        metrics.PRERENDERS.inc(result="rendered")
+        self._prerendered[key] = None
+        if len(self._prerendered) > self.cache.max_entries:
+            self._prerendered.popitem(last=False)
+        try:
+            await asyncio.shield(self._start(key, backend, board_fen, fill, options, image_format, size))
+        except RenderError:
+            return False
+        return True
+
+    def _start(self, key: str, backend: str, board_fen: str, fill: dict[int, str], options: dict,
+               image_format: str, size: int) -> asyncio.Future:
+        task = asyncio.ensure_future(self._render_uncached(backend, board_fen, fill, options, image_format, size))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._store(key, t))
+        return task
+
+    def _count(self, image_format: str, data: bytes) -> bytes:
+        totals = self.output.setdefault(image_format, [0, 0])
+        totals[0] += 1
+        totals[1] += len(data)
+        metrics.IMAGE_BYTES.observe(len(data), format=image_format)
+        return data
+
+    def output_stats(self) -> dict:
+        """Nombre d'images envoyées et poids moyen, par format."""
+        return {fmt: {"images": images, "bytes_per_image": size // images} for fmt, (images, size) in self.output.items() if images}
+
+    def _store(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.cache.put(key, task.result())
+
+    async def replay(self, record: bytes, image_format: str = "gif", size: int = RENDER_SIZE) -> bytes:
+        """Replay animé d'une partie (enregistrement royal/record.py), fabriqué image par image dans un processus de rendu."""
+        if image_format not in REPLAY_FORMATS:
+            raise ValueError(f"format de replay inconnu : {image_format}")
+        # Tous les créneaux pris : refus immédiat plutôt qu'une attente qui garderait l'interaction en suspens.
+        if self._replay_slots.locked():
+            raise RenderQueueFull(f"{REPLAY_CONCURRENCY} replay(s) déjà en cours")
+        async with self._replay_slots:
+            return await self._run(_replay, record, image_format, size, REPLAY_FRAME_MS, REPLAY_LAST_FRAME_MS, timeout=REPLAY_TIMEOUT)
+
+    async def _render_uncached(self, backend: str, board_fen: str, fill: dict[int, str], options: dict,
+                               image_format: str, size: int) -> bytes:
+        return await self._run(_render, backend, board_fen, fill, options, image_format, size, timeout=self.timeout)
+
+    async def _run(self, function, *args, timeout: float) -> bytes:
+        if self.pending >= self.workers + self.queue_size:
+            metrics.RENDER_ERRORS.inc(error="queue_full")
+            # Pour le délestage (royal/shedding.py), un refus compte comme une attente maximale, pas comme une file vide.
+            self._waits.append(timeout)
+            raise RenderQueueFull(f"{self.pending} rendus déjà en attente")
+
+        try:
+            future = self._get_executor().submit(function, *args)
+        except BrokenProcessPool:
+            # Un processus de rendu a planté : on repart sur un pool neuf.
+            logging.warning("Pool de rendu cassé, redémarrage.")
+            self._executor = None
+            future = self._get_executor().submit(function, *args)
+
+        # On libère la place quand le processus a réellement fini, même après un timeout.
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        submitted = time.perf_counter()
+        try:
+            data, timings = await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            metrics.RENDER_ERRORS.inc(error="timeout")
+            self._waits.append(time.perf_counter() - submitted)
+            raise RenderTimeout(f"rendu abandonné après {timeout:.1f} s") from None
+        for name, seconds in timings.items():
+            metrics.record_phase(name, seconds)
+        # Ce que le processus n'a pas passé à travailler, la demande l'a passé à attendre (file + transfert).
+        wait = max(0.0, time.perf_counter() - submitted - sum(timings.values()))
+        metrics.RENDER_QUEUE_WAIT_SECONDS.observe(wait)
+        self._waits.append(wait)
+        return data
+
+    def shutdown(self):
+        logging.info(f"Cache de rendu : {self.cache.stats()} ; images envoyées : {self.output_stats()}")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_renderer: Optional[BoardRenderer] = None
+
+
+def get_renderer() -> BoardRenderer:
+    global _renderer
+    if _renderer is None:
+        _renderer = BoardRenderer()
+    return _renderer
+
+
+def shutdown_renderer():
+    global _renderer
+    if _renderer is not None:
+        _renderer.shutdown()
+        _renderer = None
@@ -0,0 +1,197 @@
+# royal/render_worker.py
+# Tout ce qui s'exécute dans les processus de rendu (voir royal/render.py).
+
+import time
+from io import BytesIO
+from typing import Iterator, Optional
+
+import chess
+import chess.svg
+import cairosvg
+from PIL import GifImagePlugin, Image, ImageChops
+
+from royal.record import decode, iter_positions
+from royal.sprites import BOARD_SIZE, HIGHLIGHT_COLORS, SQUARE_SIZE, SpriteBoardRenderer
+
+PALETTE_COLORS = 64 # Cases, surbrillances et anticrénelage des pièces tiennent largement dedans
+# Surbrillances du replay : le dernier coup joué et les pions royaux (mêmes couleurs qu'en partie).
+REPLAY_LAST_MOVE = "#ffcc00aa"
+REPLAY_ROYAL = "#ffd700aa"
+
+_sprites: Optional[SpriteBoardRenderer] = None
+_replay_palette: Optional[Image.Image] = None
+
+
+def warm_up():
+    # On fait un premier rendu à vide pour charger cairo, puis on prépare les sprites une bonne fois pour toutes.
+    global _sprites
+    cairosvg.svg2png(bytestring=chess.svg.board().encode("utf-8"))
+    _sprites = SpriteBoardRenderer()
+
+
+def encode_image(image: Image.Image, image_format: str) -> bytes:
+    output = BytesIO()
+    if image_format == "png8":
+        image.convert("RGB").quantize(PALETTE_COLORS, method=Image.Quantize.FASTOCTREE).save(output, format="PNG", optimize=True)
+    elif image_format == "webp":
+        image.save(output, format="WEBP", lossless=True, method=4)
+    else:
+        image.save(output, format="PNG", compress_level=6)
+    return output.getvalue()
+
+
+def render_image(backend: str, board_fen: str, fill: dict[int, str], options: dict,
+                 image_format: str = "png", size: int = BOARD_SIZE) -> tuple[bytes, dict[str, float]]:
+    """Dessine la position (placement des pièces uniquement) ; renvoie l'image encodée et la durée de chaque étape."""
+    global _sprites
+    started = time.perf_counter()
+    # Le compositeur ne connaît que l'orientation et la taille par défaut ; sinon on passe par le SVG.
+    if backend == "sprite" and not options:
+        if _sprites is None:
+            _sprites = SpriteBoardRenderer()
+        image = _sprites.compose(board_fen, fill)
+        if size != BOARD_SIZE:
+            image = image.resize((size, size), Image.Resampling.BILINEAR)
+        composed = time.perf_counter()
+        data = encode_image(image, image_format)
+        return data, {"composite": composed - started, "encode": time.perf_counter() - composed}
+
+    board = chess.BaseBoard(board_fen)
+    svg_board = chess.svg.board(board=board, fill=fill, **options)
+    built = time.perf_counter()
+    png = cairosvg.svg2png(bytestring=svg_board.encode("utf-8"), output_width=size, output_height=size)
+    rasterized = time.perf_counter()
+    timings = {"svg": built - started, "rasterize": rasterized - built}
+    if image_format == "png":
+        return png, timings
+    data = encode_image(Image.open(BytesIO(png)), image_format)
+    timings["encode"] = time.perf_counter() - rasterized
+    return data, timings
+
+
+# --- REPLAYS ANIMÉS ---
+def _get_sprites() -> SpriteBoardRenderer:
+    global _sprites
+    if _sprites is None:
+        _sprites = SpriteBoardRenderer()
+    return _sprites
+
+
+def _get_replay_palette() -> Image.Image:
+    """
+    Palette GIF commune à toutes les frames, calculée une fois par processus : un échantillon de chaque pièce
+    sur chaque case (claire, sombre, surlignée) et le fond de l'échiquier. Une seule table de couleurs globale,
+    et des pixels qui ne changent pas d'une frame à l'autre gardent le même index.
+    """
+    global _replay_palette
+    if _replay_palette is None:
+        sprites = _get_sprites()
+        tiles = [sprites.tiles[(color.lower(), is_light)] for color in HIGHLIGHT_COLORS for is_light in (True, False)]
+        sample = Image.new("RGB", (BOARD_SIZE + SQUARE_SIZE * 13, max(BOARD_SIZE, SQUARE_SIZE * len(tiles))))
+        sample.paste(sprites.background, (0, 0))
+        for row, tile in enumerate(tiles):
+            for column, sprite in enumerate((None, *sprites.pieces.values())):
+                origin = (BOARD_SIZE + column * SQUARE_SIZE, row * SQUARE_SIZE)
+                sample.paste(tile, origin)
+                if sprite is not None:
+                    sample.paste(sprite, origin, sprite)
+        _replay_palette = sample.quantize(256, method=Image.Quantize.MEDIANCUT)
+    return _replay_palette
+
+
+def _highlights(action: Optional[tuple]) -> tuple[int, ...]:
+    if action is None or action[0] == "undo":
+        return ()
+    if action[0] == "royal":
+        return (action[1],)
+    if action[0] == "rescue":
+        return (action[2],)
+    return action[1:3]
+
+
+def replay_frames(record: bytes, size: int = BOARD_SIZE) -> Iterator[Image.Image]:
+    """Une image RGB par position de la partie ; le tampon est réutilisé d'une frame à la suivante."""
+    sprites = _get_sprites()
+    for board, royal_pawns, action in iter_positions(decode(record)):
+        fill = dict.fromkeys(royal_pawns, REPLAY_ROYAL)
+        fill.update(dict.fromkeys(_highlights(action), REPLAY_LAST_MOVE))
+        image = sprites.compose(board.board_fen(), fill)
+        yield image if size == BOARD_SIZE else image.resize((size, size), Image.Resampling.BILINEAR)
+
+
+def _write_gif(output: BytesIO, frames: Iterator[Image.Image], frame_ms: int, last_frame_ms: int):
+    # On écrit le GIF au fil de l'eau : en-tête avec la palette globale, puis pour chaque frame uniquement le
+    # rectangle qui a changé depuis la précédente (disposal 1 : le reste de l'image est conservé).
+    # Les positions identiques (ex. Annulation puis même coup) allongent la frame en attente au lieu d'en créer une.
+    palette = _get_replay_palette()
+    previous: Optional[Image.Image] = None
+    pending = None  # [image palettisée, position, durée]
+    for image in frames:
+        bbox = (0, 0, *image.size) if previous is None else ImageChops.difference(previous, image).getbbox()
+        if bbox is None:
+            pending[2] += frame_ms
+            continue
+        if pending is None:
+            header, _ = GifImagePlugin.getheader(image.quantize(palette=palette, dither=Image.Dither.NONE), info={"loop": 0})
+            output.write(b"".join(header))
+        else:
+            _write_gif_frame(output, *pending)
+        pending = [image.crop(bbox).quantize(palette=palette, dither=Image.Dither.NONE), bbox[:2], frame_ms]
+        previous = image.copy()
+    pending[2] = last_frame_ms
+    _write_gif_frame(output, *pending)
+    output.write(b";")
+
+
+def _write_gif_frame(output: BytesIO, image: Image.Image, offset: tuple[int, int], duration: int):
+    for chunk in GifImagePlugin.getdata(image, offset, duration=duration, disposal=1):
+        output.write(chunk)
+
+
+class _LazyFrames(Image.Image):
+    """
+    Image multi-frames dont chaque frame n'est composée qu'au seek() suivant : le codeur WebP animé
+    de Pillow lit les frames une à une, dans l'ordre, et n'en garde aucune (append_images, lui, les met toutes en liste).
+    Remplit les attributs internes d'Image (im, _mode, _size) : Pillow est épinglé dans requirements.txt,
+    à revérifier (python -m bench.replay_bench --formats webp) avant de le mettre à jour.
+    """
+
+    def __init__(self, frames: Iterator[Image.Image], count: int):
+        super().__init__()
+        self._frames = frames
+        self._index = -1
+        self.n_frames = count
+        self.is_animated = count > 1
+        self._next()
+
+    def _next(self):
+        frame = next(self._frames)
+        self.im, self._mode, self._size = frame.im, frame.mode, frame.size
+        self._index += 1
+
+    def seek(self, frame: int):
+        # Le codeur finit par revenir sur la frame de départ : sans importance ici, l'image est jetée ensuite.
+        while self._index < frame:
+            self._next()
+
+    def tell(self) -> int:
+        return self._index
+
+
+def render_replay(record: bytes, image_format: str, size: int, frame_ms: int,
+                  last_frame_ms: int) -> tuple[bytes, dict[str, float]]:
+    """Replay animé d'une partie (enregistrement royal/record.py) en GIF ou WebP, sans garder les frames en mémoire."""
+    started = time.perf_counter()
+    frames = replay_frames(record, size)
+    output = BytesIO()
+    if image_format == "gif":
+        _write_gif(output, frames, frame_ms, last_frame_ms)
+    else:
+        # Le codeur WebP animé découpe lui-même les rectangles modifiés et fusionne les frames identiques.
+        # Pas d'image clé intermédiaire (kmin/kmax au-delà de la dernière frame) : chacune coûte un encodage
+        # complet de plus, pour un fichier qu'on lit du début à la fin.
+        count = len(decode(record).actions) + 1
+        durations = [frame_ms] * (count - 1) + [last_frame_ms]
+        _LazyFrames(frames, count).save(output, format="WEBP", save_all=True, lossless=True, method=4,
+                                        duration=durations, loop=0, kmin=count, kmax=count + 1)
+    return output.getvalue(), {"replay": time.perf_counter() - started}
@@ -0,0 +1,89 @@
+# royal/rules.py
+
+import random
+from typing import Optional
+
+import chess
+import chess.polyglot
+
+# Une "action" est un petit tuple sérialisable qui décrit tout ce qu'un joueur peut faire pendant son tour.
+# Le cog et la relecture d'une partie sauvegardée passent par apply_action : les deux aboutissent
+# exactement au même échiquier.
+#
+#   ("move", from, to)          coup normal (règles Royal comprises)
+#   ("double1", from, to)       Double Assaut, premier saut : le tour n'est pas encore passé
+#   ("double2", from, to)       Double Assaut, second saut
+#   ("teleport", from, to)      Téléportation du fou
+#   ("rescue", piece_type, to)  Équipe de secours : une pièce capturée revient
+#   ("mind", from, to)          Contrôle mental : coup forcé d'une pièce adverse
+#   ("royal", square)           Promotion Royale d'un pion
+#   ("undo",)                   Annulation d'une capacité en cours (Double Assaut)
+ACTION_KINDS = ("move", "double1", "double2", "teleport", "rescue", "mind", "royal", "undo")
+
+# Clés Zobrist des pions royaux, ajoutées au hash polyglot : deux positions peuvent ne différer que par eux.
+# Tirées d'une graine fixe (la case) : elles ne changent pas d'une version à l'autre, l'index de l'explorateur en dépend.
+ROYAL_KEYS = [random.Random(sq).getrandbits(64) for sq in chess.SQUARES]
+
+
+def update_royal_pawns(board: chess.Board, royal_pawns: set, move: chess.Move):
+    """
+    Met à jour le set des pions royaux après un coup.
+    Cette méthode gère correctement les déplacements simples et les captures.
+    """
+    # Étape 1 : On vérifie si une pièce CAPTURÉE était un pion royal.
+    # Cette vérification doit se faire AVANT de mettre à jour le pion qui se déplace.
+    is_capture = board.is_capture(move)
+    if is_capture and move.to_square in royal_pawns:
+        royal_pawns.remove(move.to_square)
+
+    # Étape 2 : On vérifie si la pièce qui SE DÉPLACE est un pion royal et on met à jour sa position.
+    if move.from_square in royal_pawns:
+        royal_pawns.remove(move.from_square)
+        royal_pawns.add(move.to_square)
+
+
+def position_key(board: chess.Board, royal_pawns) -> int:
+    """Hash 64 bits d'une position Royal : échiquier (Zobrist polyglot) et pions royaux."""
+    key = chess.polyglot.zobrist_hash(board)
+    for square in royal_pawns:
+        key ^= ROYAL_KEYS[square]
+    return key
+
+
+def apply_action(board: chess.Board, royal_pawns: set, action: tuple):
+    """Joue une action sur l'échiquier et le set des pions royaux (modifiés sur place)."""
+    kind = action[0]
+    if kind in ("move", "double1", "double2"):
+        move = chess.Move(action[1], action[2])
+        update_royal_pawns(board, royal_pawns, move)
+        board.push(move)
+        if kind == "double1":
+            # Le cavalier rejoue : on rend la main au même camp.
+            board.turn = not board.turn
+    elif kind == "teleport":
+        bishop_piece = board.remove_piece_at(action[1])
+        board.set_piece_at(action[2], bishop_piece)
+        board.push(chess.Move.null())
+    elif kind == "rescue":
+        board.set_piece_at(action[2], chess.Piece(action[1], board.turn))
+        board.push(chess.Move.null())
+    elif kind == "mind":
+        forced_move = chess.Move(action[1], action[2])
+        update_royal_pawns(board, royal_pawns, forced_move)
+        board.turn = not board.turn; board.push(forced_move); board.turn = not board.turn
+    elif kind == "royal":
+        royal_pawns.add(action[1])
+        board.push(chess.Move.null())
+    elif kind == "undo":
+        board.pop()
+    else:
+        raise ValueError(f"action inconnue : {action!r}")
+
+
+def king_capture_winner(board: chess.Board) -> Optional[chess.Color]:
+    """Variante Royal : la partie se gagne en capturant le roi adverse."""
+    if board.king(chess.WHITE) is None:
+        return chess.BLACK
+    if board.king(chess.BLACK) is None:
+        return chess.WHITE
+    return None
@@ -0,0 +1,163 @@
+# royal/shedding.py
+
+import asyncio
+import math
+import os
+import time
+from typing import Callable, Optional
+
+import chess
+
+from royal import metrics
+
+# Objectifs de service : attente moyenne d'un rendu dans la file du pool, et retard de la boucle asyncio.
+SHED_RENDER_WAIT_SLO = float(os.getenv("SHED_RENDER_WAIT_SLO", "1.0"))
+SHED_LOOP_LAG_SLO = float(os.getenv("SHED_LOOP_LAG_SLO", "0.25"))
+# Occupation de la file de rendu (rendus en cours ou en attente / capacité) à ne pas dépasser.
+SHED_PENDING_SLO = float(os.getenv("SHED_PENDING_SLO", "0.5"))
+# "global" : toutes les parties changent de mode ensemble ; "game" : seules les parties qui demandent
+# le plus d'images (SHED_GAME_FRACTION des parties actives à chaque étape) sont allégées.
+SHED_SCOPE = os.getenv("SHED_SCOPE", "global")
+SHED_GAME_FRACTION = float(os.getenv("SHED_GAME_FRACTION", "0.25"))
+# Mode le plus léger autorisé : "lowres" (images réduites) ou "text" (échiquier en caractères, sans image).
+SHED_MAX_MODE = os.getenv("SHED_MAX_MODE", "text")
+# Retour au rendu complet, un niveau à la fois : charge sous SHED_RECOVER_RATIO × l'objectif pendant SHED_RECOVER_AFTER s.
+SHED_RECOVER_RATIO = float(os.getenv("SHED_RECOVER_RATIO", "0.5"))
+SHED_RECOVER_AFTER = float(os.getenv("SHED_RECOVER_AFTER", "15"))
+# Délai minimal entre deux aggravations, le temps que les mesures reflètent le changement.
+SHED_HOLD = float(os.getenv("SHED_HOLD", "5"))
+SHED_TICK = float(os.getenv("SHED_TICK", "1"))
+
+SHED_MODES = ("full", "lowres", "text")
+EWMA_ALPHA = 0.3
+ACTIVITY_DECAY = 0.9 # Par tick : un rendu compte encore pour ~moitié au bout de 7 s
+
+
+class TextBoard:
+    """Échiquier envoyé dans le texte du message à la place d'une image (mode allégé « text »)."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def text_board(board_fen: str, royal_pawns=(), fill: Optional[dict[int, str]] = None) -> str:
+    """Échiquier en caractères Unicode (Blancs en bas) ; les cases vides surlignées sont marquées d'un point plein."""
+    board = chess.BaseBoard(board_fen)
+    marked = set(fill or ())
+    lines = []
+    for rank in range(7, -1, -1):
+        cells = []
+        for file in range(8):
+            square = chess.square(file, rank)
+            piece = board.piece_at(square)
+            cells.append(piece.unicode_symbol() if piece else "•" if square in marked else "·")
+        lines.append(f"{rank + 1} {' '.join(cells)}")
+    lines.append("  a b c d e f g h")
+    text = "```\n" + "\n".join(lines) + "\n```"
+    if royal_pawns:
+        text += "\nPions royaux : " + ", ".join(chess.square_name(square) for square in sorted(royal_pawns))
+    return text
+
+
+class LoadShedder:
+    """
+    Suit l'attente des rendus et le retard de la boucle, et allège l'affichage quand l'objectif est dépassé :
+    « full » (rendu normal) → « lowres » (image réduite) → « text » (échiquier en caractères, aucun rendu).
+    Un niveau de plus par dépassement (au plus un tous les SHED_HOLD s), un de moins après SHED_RECOVER_AFTER s
+    de calme. En portée « game », ce sont les parties les plus gourmandes qui sont allégées d'abord.
+    """
+
+    def __init__(self, wait_samples: Callable[[], list[float]], occupancy: Optional[Callable[[], float]] = None,
+                 scope: str = SHED_SCOPE, max_mode: str = SHED_MAX_MODE):
+        self._wait_samples = wait_samples # Attentes mesurées par le pool de rendu depuis le dernier appel
+        self._occupancy = occupancy # Part de la file de rendu occupée, à l'instant
+        self.scope = scope
+        self.max_level = SHED_MODES.index(max_mode)
+        self.level = 0
+        self.game_levels: dict[str, int] = {}
+        self.activity: dict[str, float] = {}
+        self.render_wait = 0.0
+        self.loop_lag = 0.0
+        self.render_occupancy = 0.0
+        self._calm_since: Optional[float] = None
+        self._last_escalation = -math.inf
+
+    # --- MESURES ---
+    def observe_loop_lag(self, seconds: float):
+        self.loop_lag += EWMA_ALPHA * (seconds - self.loop_lag)
+
+    def note_render(self, game_id: str):
+        self.activity[game_id] = self.activity.get(game_id, 0.0) + 1
+
+    def pressure(self) -> float:
+        """Charge rapportée à l'objectif : au-dessus de 1, il est dépassé."""
+        return max(self.render_wait / SHED_RENDER_WAIT_SLO, self.loop_lag / SHED_LOOP_LAG_SLO,
+                   self.render_occupancy / SHED_PENDING_SLO)
+
+    # --- DÉCISION ---
+    def mode(self, game_id: Optional[str] = None) -> str:
+        return SHED_MODES[max(self.level, self.game_levels.get(game_id, 0))]
+
+    def degraded_games(self) -> int:
+        return sum(1 for level in self.game_levels.values() if level)
+
+    def forget(self, game_id: str):
+        self.game_levels.pop(game_id, None)
+        self.activity.pop(game_id, None)
+
+    def tick(self, now: Optional[float] = None):
+        now = now if now is not None else time.monotonic()
+        # Aucun rendu depuis le dernier tick : la file est vide, l'attente retombe.
+        for wait in self._wait_samples() or [0.0]:
+            self.render_wait += EWMA_ALPHA * (wait - self.render_wait)
+        # Rendus bloqués dans le pool (aucun ne finit, donc aucune attente mesurée) : la file pleine compte aussi.
+        if self._occupancy is not None:
+            self.render_occupancy += EWMA_ALPHA * (self._occupancy() - self.render_occupancy)
+        for game_id in list(self.activity):
+            self.activity[game_id] *= ACTIVITY_DECAY
+            if self.activity[game_id] < 0.01 and not self.game_levels.get(game_id):
+                del self.activity[game_id]
+
+        pressure = self.pressure()
+        if pressure > 1:
+            self._calm_since = None
+            if now - self._last_escalation >= SHED_HOLD and self._escalate():
+                self._last_escalation = now
+        elif pressure < SHED_RECOVER_RATIO:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= SHED_RECOVER_AFTER:
+                self._relax()
+                self._calm_since = now
+        else:
+            self._calm_since = None
+
+    def _escalate(self) -> bool:
+        if self.scope != "game":
+            if self.level >= self.max_level:
+                return False
+            self.level += 1
+            metrics.SHED_SWITCHES.inc(scope="global", mode=SHED_MODES[self.level])
+            return True
+        candidates = sorted((game_id for game_id in self.activity if self.game_levels.get(game_id, 0) < self.max_level),
+                            key=self.activity.get, reverse=True)
+        for game_id in candidates[:max(1, math.ceil(len(self.activity) * SHED_GAME_FRACTION))]:
+            self.game_levels[game_id] = self.game_levels.get(game_id, 0) + 1
+            metrics.SHED_SWITCHES.inc(scope="game", mode=SHED_MODES[self.game_levels[game_id]])
+        return bool(candidates)
+
+    def _relax(self):
+        if self.level:
+            self.level -= 1
+            metrics.SHED_SWITCHES.inc(scope="global", mode=SHED_MODES[self.level])
+        for game_id, level in list(self.game_levels.items()):
+            if level:
+                self.game_levels[game_id] = level - 1
+                metrics.SHED_SWITCHES.inc(scope="game", mode=SHED_MODES[level - 1])
+            if not self.game_levels[game_id]:
+                del self.game_levels[game_id]
+
+    async def run(self, interval: float = SHED_TICK):
+        while True:
+            await asyncio.sleep(interval)
+            self.tick()
@@ -0,0 +1,107 @@
+# royal/spectate.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from royal import metrics
+
+# Délai minimal (en secondes) entre deux vagues de modifications des messages spectateurs d'un même salon.
+SPECTATE_CHANNEL_INTERVAL = float(os.getenv("SPECTATE_CHANNEL_INTERVAL", "1.5"))
+# Nombre maximal de messages spectateurs par partie.
+SPECTATE_MAX_PER_GAME = int(os.getenv("SPECTATE_MAX_PER_GAME", "25"))
+
+
+class Frame(NamedTuple):
+    """Ce qu'affichent les spectateurs d'une partie après un coup : texte et image déjà encodée (None en mode texte)."""
+    seq: int
+    content: str
+    image: Optional[bytes]
+    filename: str
+
+
+class SpectatorHub:
+    """
+    Diffuse les positions d'une partie vers ses messages spectateurs (en lecture seule).
+    Chaque position n'est rendue qu'une fois : les mêmes octets partent vers tous les messages.
+    Les modifications sont regroupées par salon et espacées d'au moins `interval` secondes ; un message
+    qui n'a pas encore été mis à jour ne garde que la dernière position (les coups intermédiaires sont sautés).
+
+    `edit(channel_id, message_id, frame)` modifie un message et renvoie False s'il n'existe plus.
+    """
+
+    def __init__(self, edit: Callable[[int, int, Frame], Awaitable[bool]], interval: float = SPECTATE_CHANNEL_INTERVAL):
+        self._edit = edit
+        self.interval = interval
+        self.games: dict[str, dict[int, int]] = {}        # ID de partie -> {ID du message spectateur: ID du salon}
+        self._pending: dict[int, dict[int, Frame]] = {}   # ID du salon -> {ID du message: dernière frame à afficher}
+        self._owners: dict[int, str] = {}                 # ID du message spectateur -> ID de partie
+        self._workers: dict[int, asyncio.Task] = {}
+
+    def add(self, game_id: str, channel_id: int, message_id: int) -> bool:
+        spectators = self.games.setdefault(game_id, {})
+        if len(spectators) >= SPECTATE_MAX_PER_GAME and message_id not in spectators:
+            return False
+        spectators[message_id] = channel_id
+        self._owners[message_id] = game_id
+        return True
+
+    def remove(self, message_id: int):
+        game_id = self._owners.pop(message_id, None)
+        spectators = self.games.get(game_id, {})
+        channel_id = spectators.pop(message_id, None)
+        if not spectators:
+            self.games.pop(game_id, None)
+        self._pending.get(channel_id, {}).pop(message_id, None)
+
+    def close_game(self, game_id: str) -> list[int]:
+        """Oublie les spectateurs d'une partie finie (la dernière frame publiée part quand même) ; renvoie leurs messages."""
+        spectators = self.games.pop(game_id, {})
+        for message_id in spectators:
+            self._owners.pop(message_id, None)
+        return list(spectators)
+
+    def watching(self, game_id: str) -> int:
+        return len(self.games.get(game_id, ()))
+
+    def count(self) -> int:
+        return len(self._owners)
+
+    def publish(self, game_id: str, frame: Frame):
+        """Met la frame en attente pour chaque spectateur de la partie ; les salons la reçoivent à leur rythme."""
+        for message_id, channel_id in self.games.get(game_id, {}).items():
+            pending = self._pending.setdefault(channel_id, {})
+            if message_id in pending:
+                metrics.SPECTATOR_EDITS.inc(result="coalesced")
+            pending[message_id] = frame
+            if channel_id not in self._workers:
+                self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+
+    async def _drain(self, channel_id: int):
+        try:
+            while self._pending.get(channel_id):
+                batch = self._pending.pop(channel_id)
+                started = time.monotonic()
+                await asyncio.gather(*(self._send(channel_id, message_id, frame) for message_id, frame in batch.items()))
+                await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            del self._workers[channel_id]
+
+    async def _send(self, channel_id: int, message_id: int, frame: Frame):
+        try:
+            exists = await self._edit(channel_id, message_id, frame)
+        except Exception as e:
+            metrics.SPECTATOR_EDITS.inc(result="error")
+            logging.warning(f"Message spectateur {message_id} non mis à jour : {e!r}")
+            return
+        if exists:
+            metrics.SPECTATOR_EDITS.inc(result="sent")
+        else:
+            metrics.SPECTATOR_EDITS.inc(result="gone")
+            self.remove(message_id)
+
+    def shutdown(self):
+        for task in self._workers.values():
+            task.cancel()
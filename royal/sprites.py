@@ -0,0 +1,79 @@
+# royal/sprites.py
+
+from io import BytesIO
+
+import chess
+import chess.svg
+import cairosvg
+from PIL import Image
+
+# Géométrie par défaut de chess.svg.board : marge de 15 px pour les coordonnées, cases de 45 px.
+MARGIN = 15
+SQUARE_SIZE = chess.svg.SQUARE_SIZE
+BOARD_SIZE = 2 * MARGIN + 8 * SQUARE_SIZE
+
+# Les surbrillances utilisées par le cog, pré-rastérisées au démarrage.
+HIGHLIGHT_COLORS = ("#ffcc00aa", "#228B22aa", "#ff4500aa", "#ffd700aa")
+
+
+def _rasterize(svg: str) -> Image.Image:
+    return Image.open(BytesIO(cairosvg.svg2png(bytestring=svg.encode("utf-8")))).convert("RGBA")
+
+
+def square_origin(square: int) -> tuple[int, int]:
+    """Coin haut-gauche d'une case dans l'image (Blancs en bas)."""
+    return MARGIN + chess.square_file(square) * SQUARE_SIZE, MARGIN + (7 - chess.square_rank(square)) * SQUARE_SIZE
+
+
+class SpriteBoardRenderer:
+    """
+    Compose l'échiquier à partir de morceaux rastérisés une seule fois par cairosvg :
+    le fond (cases + coordonnées), les 12 pièces et les cases surlignées.
+    Chaque image n'est ensuite qu'une suite de collages dans un tampon réutilisé.
+    """
+
+    def __init__(self, compress_level: int = 6):
+        self.compress_level = compress_level
+        self.background = _rasterize(chess.svg.board()).convert("RGB")
+        self.pieces = {
+            symbol: _rasterize(chess.svg.piece(chess.Piece.from_symbol(symbol)))
+            for symbol in "PNBRQKpnbrqk"
+        }
+        self.tiles: dict[tuple[str, bool], Image.Image] = {}
+        for color in HIGHLIGHT_COLORS:
+            self._load_tiles(color)
+        self._buffer = self.background.copy()
+
+    def _load_tiles(self, color: str):
+        # On laisse cairosvg surligner tout un échiquier vide puis on découpe une case claire et une sombre :
+        # les couleurs composées sont ainsi exactement celles du rendu SVG.
+        filled = _rasterize(chess.svg.board(fill=dict.fromkeys(chess.SQUARES, color))).convert("RGB")
+        for square in (chess.A1, chess.B1):
+            x, y = square_origin(square)
+            is_light = bool(chess.BB_LIGHT_SQUARES & chess.BB_SQUARES[square])
+            self.tiles[(color.lower(), is_light)] = filled.crop((x, y, x + SQUARE_SIZE, y + SQUARE_SIZE))
+
+    def _tile(self, color: str, square: int) -> Image.Image:
+        is_light = bool(chess.BB_LIGHT_SQUARES & chess.BB_SQUARES[square])
+        key = (color.lower(), is_light)
+        if key not in self.tiles:
+            self._load_tiles(color)
+        return self.tiles[key]
+
+    def compose(self, board_fen: str, fill: dict[int, str]) -> Image.Image:
+        """Image RGB de la position ; le tampon est réutilisé par l'appel suivant."""
+        buffer = self._buffer
+        buffer.paste(self.background, (0, 0))
+
+        for square, color in fill.items():
+            buffer.paste(self._tile(color, square), square_origin(square))
+
+        for square, piece in chess.BaseBoard(board_fen).piece_map().items():
+            sprite = self.pieces[piece.symbol()]
+            buffer.paste(sprite, square_origin(square), sprite)
+        return buffer
+
+    def render(self, board_fen: str, fill: dict[int, str]) -> bytes:
+        output = BytesIO()
+        self.compose(board_fen, fill).save(output, format="PNG", compress_level=self.compress_level)
+        return output.getvalue()
@@ -0,0 +1,65 @@
+# royal/startup.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Réglage de la base de jeu qui garde l'empreinte des commandes lors de la dernière synchronisation réussie
+# (le disque de l'hébergeur est effacé à chaque redémarrage, pas la base de jeu).
+COMMAND_TREE_HASH_SETTING = "command_tree_sha256"
+
+
+class StartupTimer:
+    """Chronomètre les étapes du démarrage ; le rapport part dans les logs au premier on_ready."""
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.steps: dict[str, float] = {}
+        self.reported = False
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = time.perf_counter() - started
+
+    def mark(self, name: str):
+        """Temps écoulé depuis le lancement du processus jusqu'à maintenant."""
+        self.steps[name] = time.perf_counter() - self.origin
+
+    def report(self) -> str:
+        self.reported = True
+        return ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.steps.items())
+
+
+def command_tree_hash(tree, application_id) -> str:
+    """Empreinte de la définition des commandes telle qu'elle serait envoyée à Discord."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: (c.get("type", 1), c["name"]))
+    canonical = json.dumps({"application_id": application_id, "commands": payload}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def sync_if_changed(tree, application_id, store=None) -> bool:
+    """
+    Synchronise les commandes seulement si leur définition a changé depuis la dernière fois.
+    La synchro globale est limitée par Discord : inutile de la refaire à chaque démarrage ou reconnexion.
+    Sans `store` (GameStore), la synchro se fait à chaque démarrage.
+    """
+    digest = command_tree_hash(tree, application_id)
+    if store is not None:
+        try:
+            if await asyncio.to_thread(store.load_setting, COMMAND_TREE_HASH_SETTING) == digest:
+                return False
+        except Exception as e:
+            logging.warning(f"Impossible de lire l'empreinte des commandes : {e}")
+    synced = await tree.sync()
+    logging.info(f"Synchronisé {len(synced)} commande(s).")
+    if store is not None:
+        store.save_setting(COMMAND_TREE_HASH_SETTING, digest)
+    return True
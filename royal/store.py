@@ -0,0 +1,496 @@
+# royal/store.py
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional
+
+from royal.record import GameRecord, decode_action, encode_action, write_archive
+
+GAME_DB_PATH = os.getenv("GAME_DB_PATH", "royal_games.sqlite3")
+# Nombre d'actions entre deux instantanés complets d'une partie.
+GAME_SNAPSHOT_EVERY = int(os.getenv("GAME_SNAPSHOT_EVERY", "20"))
+# Délai maximal (en secondes) avant qu'une écriture en attente parte sur le disque.
+GAME_FLUSH_INTERVAL = float(os.getenv("GAME_FLUSH_INTERVAL", "0.5"))
+# Base verrouillée par un autre processus (mode cluster) : nouvelles tentatives d'un lot d'écritures avant d'avertir.
+# Le lot est gardé tant que la base reste verrouillée ; il n'est abandonné qu'à l'arrêt du bot.
+GAME_WRITE_RETRIES = int(os.getenv("GAME_WRITE_RETRIES", "8"))
+GAME_WRITE_RETRY_DELAY = 0.05 # Doublé à chaque tentative, jusqu'à 2 s
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    guild_id INTEGER,
+    channel_id INTEGER,
+    message_id INTEGER,
+    white_id INTEGER NOT NULL,
+    black_id INTEGER NOT NULL,
+    initial_fen TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'active',
+    result TEXT,
+    reason TEXT,
+    ui TEXT,
+    engine_level TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_status ON games(status);
+CREATE INDEX IF NOT EXISTS games_status_updated ON games(status, updated_at);
+CREATE TABLE IF NOT EXISTS actions (
+    game_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    PRIMARY KEY (game_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    game_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    fen TEXT NOT NULL,
+    royal_pawns TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spectators (
+    message_id INTEGER PRIMARY KEY,
+    game_id TEXT NOT NULL,
+    channel_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    player_id INTEGER PRIMARY KEY,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tournaments (
+    id TEXT PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    format TEXT NOT NULL,
+    organizer_id INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    round_started_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tournaments_status ON tournaments(status);
+CREATE TABLE IF NOT EXISTS tournament_players (
+    tournament_id TEXT NOT NULL,
+    player_id INTEGER NOT NULL,
+    seed REAL NOT NULL,
+    score REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (tournament_id, player_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tournament_games (
+    tournament_id TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    white_id INTEGER NOT NULL,
+    black_id INTEGER,
+    game_id TEXT,
+    result TEXT,
+    PRIMARY KEY (tournament_id, round, white_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id INTEGER PRIMARY KEY,
+    image_format TEXT,
+    image_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # En WAL, NORMAL reste cohérent après un crash et évite un fsync par transaction.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _is_busy(error: sqlite3.Error) -> bool:
+    """Base (ou table) verrouillée par une autre connexion : l'écriture passera plus tard."""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+
+def _pack(value) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _unpack_action(stored) -> tuple:
+    # 2 octets (royal/record.py) ; les parties enregistrées avant ce format ont leurs actions en JSON.
+    if isinstance(stored, bytes):
+        return decode_action(stored)
+    return tuple(json.loads(stored))
+
+
+class GameStore:
+    """
+    Sauvegarde des parties dans SQLite (mode WAL).
+    Chaque action est ajoutée au journal de la partie, avec un instantané complet de temps en temps.
+    Les écritures sont mises en file et regroupées par un thread dédié : la boucle asyncio ne touche
+    jamais au disque pendant un coup.
+    """
+
+    def __init__(self, path: str = GAME_DB_PATH, flush_interval: float = GAME_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        conn = _connect(path)
+        conn.executescript(SCHEMA)
+        # Colonnes ajoutées depuis : les bases existantes sont complétées au démarrage.
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(games)")}
+        if "engine_level" not in columns:
+            conn.execute("ALTER TABLE games ADD COLUMN engine_level TEXT")
+        conn.close()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="royal-store-writer", daemon=True)
+        self._writer.start()
+
+    # --- ÉCRITURES (non bloquantes, appelées depuis la boucle) ---
+    def _submit(self, sql: str, params: tuple):
+        if not self._closed:
+            self._queue.put((sql, params))
+
+    def create_game(self, game_id: str, guild_id: Optional[int], channel_id: Optional[int], message_id: Optional[int],
+                    white_id: int, black_id: int, initial_fen: str, engine_level: Optional[str] = None):
+        now = time.time()
+        self._submit(
+            "INSERT OR REPLACE INTO games (id, guild_id, channel_id, message_id, white_id, black_id, initial_fen, engine_level, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (game_id, guild_id, channel_id, message_id, white_id, black_id, initial_fen, engine_level, now, now),
+        )
+
+    def append_action(self, game_id: str, seq: int, action: tuple):
+        self._submit("INSERT OR REPLACE INTO actions (game_id, seq, action) VALUES (?, ?, ?)", (game_id, seq, encode_action(action)))
+
+    def save_snapshot(self, game_id: str, seq: int, fen: str, royal_pawns):
+        self._submit(
+            "INSERT OR REPLACE INTO snapshots (game_id, seq, fen, royal_pawns) VALUES (?, ?, ?, ?)",
+            (game_id, seq, fen, _pack(sorted(royal_pawns))),
+        )
+
+    def save_ui(self, game_id: str, ui: dict):
+        self._submit("UPDATE games SET ui = ?, updated_at = ? WHERE id = ?", (_pack(ui), time.time(), game_id))
+
+    def finish_game(self, game_id: str, result: str, reason: str):
+        self._submit(
+            "UPDATE games SET status = 'finished', result = ?, reason = ?, updated_at = ? WHERE id = ?",
+            (result, reason, time.time(), game_id),
+        )
+
+    def add_spectator(self, game_id: str, channel_id: int, message_id: int):
+        self._submit("INSERT OR REPLACE INTO spectators (message_id, game_id, channel_id) VALUES (?, ?, ?)",
+                     (message_id, game_id, channel_id))
+
+    def remove_spectator(self, message_id: int):
+        self._submit("DELETE FROM spectators WHERE message_id = ?", (message_id,))
+
+    def remove_spectators(self, game_id: str):
+        self._submit("DELETE FROM spectators WHERE game_id = ?", (game_id,))
+
+    def save_rating(self, player_id: int, rating: float, games: int):
+        self._submit("INSERT OR REPLACE INTO ratings (player_id, rating, games, updated_at) VALUES (?, ?, ?, ?)",
+                     (player_id, rating, games, time.time()))
+
+    def save_tournament(self, tournament_id: str, guild_id: int, channel_id: int, name: str, format: str, organizer_id: int,
+                        rounds: int, round: int, status: str, round_started_at: Optional[float]):
+        now = time.time()
+        self._submit(
+            "INSERT INTO tournaments (id, guild_id, channel_id, name, format, organizer_id, rounds, round, status, round_started_at,"
+            " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET rounds = excluded.rounds,"
+            " round = excluded.round, status = excluded.status, round_started_at = excluded.round_started_at, updated_at = excluded.updated_at",
+            (tournament_id, guild_id, channel_id, name, format, organizer_id, rounds, round, status, round_started_at, now, now),
+        )
+
+    def save_tournament_player(self, tournament_id: str, player_id: int, seed: float):
+        self._submit("INSERT OR REPLACE INTO tournament_players (tournament_id, player_id, seed) VALUES (?, ?, ?)",
+                     (tournament_id, player_id, seed))
+
+    def remove_tournament_player(self, tournament_id: str, player_id: int):
+        self._submit("DELETE FROM tournament_players WHERE tournament_id = ? AND player_id = ?", (tournament_id, player_id))
+
+    def save_tournament_score(self, tournament_id: str, player_id: int, score: float):
+        self._submit("UPDATE tournament_players SET score = ? WHERE tournament_id = ? AND player_id = ?",
+                     (score, tournament_id, player_id))
+
+    def save_tournament_game(self, tournament_id: str, round: int, white_id: int, black_id: Optional[int],
+                             game_id: Optional[str], result: Optional[str]):
+        self._submit(
+            "INSERT OR REPLACE INTO tournament_games (tournament_id, round, white_id, black_id, game_id, result) VALUES (?, ?, ?, ?, ?, ?)",
+            (tournament_id, round, white_id, black_id, game_id, result),
+        )
+
+    def save_guild_settings(self, guild_id: int, image_format: Optional[str], image_size: Optional[int]):
+        self._submit(
+            "INSERT OR REPLACE INTO guild_settings (guild_id, image_format, image_size) VALUES (?, ?, ?)",
+            (guild_id, image_format, image_size),
+        )
+
+    def save_setting(self, name: str, value: str):
+        """Valeur propre au bot (pas à un serveur), gardée d'un démarrage à l'autre."""
+        self._submit("INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", (name, value))
+
+    # --- LECTURES (bloquantes : à lancer via asyncio.to_thread) ---
+    def load_setting(self, name: str) -> Optional[str]:
+        conn = _connect(self.path)
+        try:
+            row = conn.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def load_guild_settings(self) -> dict[int, dict]:
+        conn = _connect(self.path)
+        try:
+            rows = conn.execute("SELECT guild_id, image_format, image_size FROM guild_settings").fetchall()
+            return {guild_id: {"image_format": image_format, "image_size": image_size} for guild_id, image_format, image_size in rows}
+        finally:
+            conn.close()
+
+    def load_rating(self, player_id: int) -> Optional[tuple[float, int]]:
+        """(classement, parties jouées) d'un joueur, ou None s'il n'a encore jamais joué de partie classée."""
+        conn = _connect(self.path)
+        try:
+            return conn.execute("SELECT rating, games FROM ratings WHERE player_id = ?", (player_id,)).fetchone()
+        finally:
+            conn.close()
+
+    def load_tournaments(self) -> list[dict]:
+        """
+        Tournois en inscription ou en cours, avec leurs joueurs (ID, tête de série) et leurs tables.
+        Le message et le résultat d'une table viennent aussi de la partie elle-même, si elle s'est terminée
+        juste avant un arrêt sans que le tournoi l'ait encore enregistré.
+        """
+        conn = _connect(self.path)
+        try:
+            records = []
+            for row in conn.execute(
+                "SELECT id, guild_id, channel_id, name, format, organizer_id, rounds, round, status, round_started_at FROM tournaments"
+                " WHERE status IN ('registration', 'running') ORDER BY created_at"
+            ).fetchall():
+                tournament_id = row[0]
+                records.append({
+                    **dict(zip(("id", "guild_id", "channel_id", "name", "format", "organizer_id", "rounds", "round", "status",
+                                "round_started_at"), row)),
+                    "players": conn.execute("SELECT player_id, seed FROM tournament_players WHERE tournament_id = ?",
+                                            (tournament_id,)).fetchall(),
+                    "games": conn.execute(
+                        "SELECT t.round, t.white_id, t.black_id, t.game_id, g.message_id, COALESCE(t.result, g.result)"
+                        " FROM tournament_games t LEFT JOIN games g ON g.id = t.game_id WHERE t.tournament_id = ? ORDER BY t.round",
+                        (tournament_id,)).fetchall(),
+                })
+            return records
+        finally:
+            conn.close()
+
+    def load_spectators(self) -> list[tuple[str, int, int]]:
+        """(ID de partie, ID du salon, ID du message) de chaque message spectateur des parties en cours."""
+        conn = _connect(self.path)
+        try:
+            return conn.execute(
+                "SELECT s.game_id, s.channel_id, s.message_id FROM spectators s JOIN games g ON g.id = s.game_id"
+                " WHERE g.status = 'active'"
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def load_game(self, game_id: str) -> Optional[dict]:
+        conn = _connect(self.path)
+        try:
+            row = conn.execute(
+                "SELECT g.id, g.guild_id, g.channel_id, g.message_id, g.white_id, g.black_id, g.initial_fen, g.ui, g.status, g.engine_level,"
+                " s.seq, s.fen, s.royal_pawns FROM games g LEFT JOIN snapshots s ON s.game_id = g.id WHERE g.id = ?",
+                (game_id,),
+            ).fetchone()
+            return self._load_record(conn, row) if row else None
+        finally:
+            conn.close()
+
+    def load_active_games(self) -> list[dict]:
+        """Toutes les parties en cours : dernier instantané + actions jouées depuis."""
+        conn = _connect(self.path)
+        try:
+            rows = conn.execute(
+                "SELECT g.id, g.guild_id, g.channel_id, g.message_id, g.white_id, g.black_id, g.initial_fen, g.ui, g.status, g.engine_level,"
+                " s.seq, s.fen, s.royal_pawns FROM games g LEFT JOIN snapshots s ON s.game_id = g.id WHERE g.status = 'active'"
+            ).fetchall()
+            return [self._load_record(conn, row) for row in rows]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _load_actions(conn: sqlite3.Connection, game_id: str, after: int = 0) -> tuple[list[tuple[int, tuple]], bool]:
+        """
+        Actions jouées après `after`, dans l'ordre, et si le journal est complet. Au premier numéro manquant
+        (écriture perdue), on s'arrête : rejouer la suite donnerait une autre position, voire des actions illégales.
+        """
+        actions = []
+        for action_seq, action in conn.execute(
+                "SELECT seq, action FROM actions WHERE game_id = ? AND seq > ? ORDER BY seq", (game_id, after)):
+            if action_seq != after + len(actions) + 1:
+                logging.error(f"Journal de la partie {game_id} incomplet : action {after + len(actions) + 1} manquante,"
+                              f" les suivantes sont ignorées.")
+                return actions, False
+            actions.append((action_seq, _unpack_action(action)))
+        return actions, True
+
+    def _load_record(self, conn: sqlite3.Connection, row) -> dict:
+        game_id, guild_id, channel_id, message_id, white_id, black_id, initial_fen, ui, status, engine_level, seq, fen, royal = row
+        snapshot_seq = seq if seq is not None else 0
+        actions, complete = self._load_actions(conn, game_id, snapshot_seq)
+        if not complete:
+            # La partie repart de la dernière position sûre : les actions au-delà du trou sont effacées
+            # (les suivantes reprendront leurs numéros) et l'interface repart de la sélection.
+            self._submit("DELETE FROM actions WHERE game_id = ? AND seq > ?", (game_id, snapshot_seq + len(actions)))
+            ui = None
+        return {
+            "id": game_id,
+            "guild_id": guild_id,
+            "channel_id": channel_id,
+            "message_id": message_id,
+            "white_id": white_id,
+            "black_id": black_id,
+            "status": status,
+            "fen": fen if fen is not None else initial_fen,
+            "royal_pawns": set(json.loads(royal)) if royal is not None else set(),
+            "seq": snapshot_seq,
+            "actions": actions,
+            "ui": json.loads(ui) if ui else None,
+            "engine_level": engine_level,
+        }
+
+    def iter_game_records(self, status: str = "finished") -> Iterator[tuple[str, GameRecord]]:
+        """Parties complètes depuis leur position de départ, une à une (pour les archives, sans tout charger)."""
+        conn = _connect(self.path)
+        try:
+            games = conn.execute("SELECT id, initial_fen, result FROM games WHERE status = ? ORDER BY created_at", (status,))
+            for game_id, initial_fen, result in games:
+                actions = tuple(action for _, action in self._load_actions(conn, game_id)[0])
+                yield game_id, GameRecord(initial_fen, frozenset(), actions, result)
+        finally:
+            conn.close()
+
+    def iter_finished_since(self, updated_after: float) -> Iterator[tuple[float, str, GameRecord]]:
+        """Parties terminées (ou modifiées) depuis `updated_after`, dans l'ordre, avec leur date et leur identifiant : pour l'explorateur."""
+        conn = _connect(self.path)
+        try:
+            games = conn.execute("SELECT id, initial_fen, result, updated_at FROM games"
+                                 " WHERE status = 'finished' AND updated_at >= ? ORDER BY updated_at", (updated_after,))
+            for game_id, initial_fen, result, updated_at in games:
+                actions = tuple(action for _, action in self._load_actions(conn, game_id)[0])
+                yield updated_at, game_id, GameRecord(initial_fen, frozenset(), actions, result)
+        finally:
+            conn.close()
+
+    def find_game_record(self, message_id: Optional[int] = None, player_id: Optional[int] = None) -> Optional[dict]:
+        """
+        Une partie complète pour /replay : celle du message `message_id`, ou la dernière partie terminée de `player_id`.
+        Renvoie les joueurs, le résultat et l'enregistrement (royal/record.py), ou None.
+        """
+        conn = _connect(self.path)
+        try:
+            if message_id is not None:
+                row = conn.execute("SELECT id, white_id, black_id, initial_fen, result FROM games WHERE message_id = ?",
+                                   (message_id,)).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT id, white_id, black_id, initial_fen, result FROM games"
+                    " WHERE status = 'finished' AND (white_id = ? OR black_id = ?) ORDER BY updated_at DESC LIMIT 1",
+                    (player_id, player_id),
+                ).fetchone()
+            if row is None:
+                return None
+            game_id, white_id, black_id, initial_fen, result = row
+            actions = tuple(action for _, action in self._load_actions(conn, game_id)[0])
+            return {"id": game_id, "white_id": white_id, "black_id": black_id, "result": result,
+                    "record": GameRecord(initial_fen, frozenset(), actions, result)}
+        finally:
+            conn.close()
+
+    def export_archive(self, path: str, status: str = "finished") -> int:
+        """Écrit les parties dans une archive royal/record.py ; renvoie leur nombre."""
+        with open(path, "ab") as fp:
+            return write_archive(fp, (record for _, record in self.iter_game_records(status)))
+
+    # --- THREAD D'ÉCRITURE ---
+    def _run(self):
+        conn = _connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            # On laisse les écritures s'accumuler un court instant pour n'avoir qu'une transaction.
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is None
+            statements = [item for item in batch if item is not None]
+            if statements:
+                self._write(conn, statements)
+            if stop:
+                break
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, statements: list[tuple[str, tuple]]):
+        """
+        Un lot en une seule transaction, réessayé tant que la base est verrouillée.
+        S'il échoue pour une autre raison, on rejoue ses instructions
+        une à une : seule la fautive est perdue, pas les écritures des autres parties du lot.
+        """
+        error = self._execute_held(conn, statements)
+        if error is None:
+            return
+        if _is_busy(error) or len(statements) == 1:
+            logging.error(f"Erreur d'écriture de la sauvegarde des parties ({len(statements)} écriture(s) perdue(s)) : {error}")
+            return
+        logging.warning(f"Lot d'écritures refusé ({error}) : nouvel essai instruction par instruction.")
+        for sql, params in statements:
+            error = self._execute_held(conn, [(sql, params)])
+            if error is not None:
+                logging.error(f"Écriture perdue ({sql.split('(')[0].strip()}) : {error}")
+
+    def _execute_held(self, conn: sqlite3.Connection, statements: list[tuple[str, tuple]]) -> Optional[sqlite3.Error]:
+        """Comme _execute, mais tant que la base reste verrouillée, les instructions sont gardées (jusqu'à l'arrêt du bot)."""
+        error = self._execute(conn, statements)
+        while error is not None and _is_busy(error) and not self._closed:
+            # Perdre une action fausserait la reprise de la partie ; les écritures suivantes attendent derrière, dans l'ordre.
+            logging.warning(f"Base de jeu toujours verrouillée après {GAME_WRITE_RETRIES} essais : {len(statements)} écriture(s) en attente.")
+            error = self._execute(conn, statements)
+        return error
+
+    @staticmethod
+    def _execute(conn: sqlite3.Connection, statements: list[tuple[str, tuple]]) -> Optional[sqlite3.Error]:
+        """Exécute les instructions en une transaction, en réessayant tant que la base est verrouillée ; renvoie l'erreur finale."""
+        for attempt in range(GAME_WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+                return None
+            except sqlite3.Error as e:
+                if not _is_busy(e) or attempt == GAME_WRITE_RETRIES:
+                    return e
+                time.sleep(min(2.0, GAME_WRITE_RETRY_DELAY * 2 ** attempt))
+
+    def close(self):
+        """Vide la file d'écriture puis arrête le thread (bloquant)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
@@ -0,0 +1,405 @@
+# royal/tournament.py
+
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+# Tournois (/tournoi) : système suisse ou toutes rondes, entre les joueurs inscrits d'un serveur.
+TOURNAMENT_MAX_PLAYERS = int(os.getenv("TOURNAMENT_MAX_PLAYERS", "128"))
+TOURNAMENT_ROUND_ROBIN_MAX_PLAYERS = int(os.getenv("TOURNAMENT_ROUND_ROBIN_MAX_PLAYERS", "16"))
+# Lancement d'une ronde : messages de partie envoyés par vagues de TOURNAMENT_START_BATCH, espacées de
+# TOURNAMENT_START_INTERVAL secondes (Discord limite un salon à 5 messages toutes les 5 s).
+TOURNAMENT_START_BATCH = int(os.getenv("TOURNAMENT_START_BATCH", "5"))
+TOURNAMENT_START_INTERVAL = float(os.getenv("TOURNAMENT_START_INTERVAL", "5"))
+# Durée maximale d'une ronde (en secondes) : les parties encore en cours sont arrêtées et comptées nulles.
+TOURNAMENT_ROUND_TIME = float(os.getenv("TOURNAMENT_ROUND_TIME", "3600"))
+TOURNAMENT_TICK = float(os.getenv("TOURNAMENT_TICK", "30"))
+# Étapes de la recherche d'un appariement suisse sans revanche, avant de se contenter de l'ordre du classement.
+SWISS_SEARCH_BUDGET = 20000
+
+TOURNAMENT_FORMATS = ("suisse", "toutes_rondes")
+# Points (Blancs, Noirs) de chaque résultat ; une exemption rapporte un point.
+SCORES = {"1-0": (1.0, 0.0), "0-1": (0.0, 1.0), "1/2-1/2": (0.5, 0.5), "bye": (1.0, 0.0)}
+
+
+class TournamentGame:
+    """Une table d'une ronde. `black_id` vaut None pour une exemption ; `message_id` est connu une fois la partie lancée."""
+    __slots__ = ("round", "white_id", "black_id", "game_id", "message_id", "result")
+
+    def __init__(self, round: int, white_id: int, black_id: Optional[int], game_id: Optional[str] = None,
+                 message_id: Optional[int] = None, result: Optional[str] = None):
+        self.round = round
+        self.white_id = white_id
+        self.black_id = black_id
+        self.game_id = game_id
+        self.message_id = message_id
+        self.result = result
+
+
+class Standing(NamedTuple):
+    player_id: int
+    score: float
+    buchholz: float # Somme des scores des adversaires rencontrés (premier départage)
+    wins: int
+    played: int
+
+
+# --- APPARIEMENTS ---
+def swiss_pairings(ranking: list[int], opponents: dict[int, set], colors: dict[int, int], byes: set,
+                   round_number: int) -> list[tuple[int, Optional[int]]]:
+    """
+    Appariement suisse d'une ronde. `ranking` va du premier au dernier (score, départages, tête de série) :
+    chacun affronte le mieux classé des suivants qu'il n'a pas encore rencontré, avec retour en arrière en cas
+    d'impasse. Nombre impair : le dernier classé qui n'a pas encore été exempté l'est (un point).
+    `colors` : parties jouées avec les Blancs moins parties avec les Noirs ; le plus en retard prend les Blancs.
+    """
+    players = list(ranking)
+    pairs: list[tuple[int, Optional[int]]] = []
+    if len(players) % 2:
+        bye = next((player for player in reversed(players) if player not in byes), players[-1])
+        players.remove(bye)
+        pairs.append((bye, None))
+    # Revanches inévitables (ou recherche trop longue) : on apparie simplement dans l'ordre du classement.
+    tables = _pair_without_rematch(players, opponents) or [(players[i], players[i + 1]) for i in range(0, len(players), 2)]
+    for first, second in tables:
+        balance = colors.get(first, 0) - colors.get(second, 0)
+        if balance > 0 or (balance == 0 and round_number % 2 == 0):
+            first, second = second, first
+        pairs.append((first, second))
+    return pairs
+
+
+def _pair_without_rematch(players: list[int], opponents: dict[int, set]) -> Optional[list[tuple[int, int]]]:
+    budget = [SWISS_SEARCH_BUDGET]
+
+    def search(remaining: list[int]) -> Optional[list[tuple[int, int]]]:
+        if not remaining:
+            return []
+        first, rest = remaining[0], remaining[1:]
+        for index, other in enumerate(rest):
+            if other in opponents.get(first, ()):
+                continue
+            budget[0] -= 1
+            if budget[0] < 0:
+                return None
+            tail = search(rest[:index] + rest[index + 1:])
+            if tail is not None:
+                return [(first, other)] + tail
+        return None
+
+    return search(players)
+
+
+def round_robin_pairings(players: list[int], round_number: int) -> list[tuple[int, Optional[int]]]:
+    """Tables de Berger (méthode du cercle) : le premier joueur reste en place, les autres tournent d'un cran par ronde."""
+    seats: list[Optional[int]] = list(players) + ([None] if len(players) % 2 else [])
+    shift = (round_number - 1) % (len(seats) - 1)
+    others = seats[1:]
+    seats = [seats[0]] + others[len(others) - shift:] + others[:len(others) - shift]
+    pairs = []
+    for table in range(len(seats) // 2):
+        first, second = seats[table], seats[-1 - table]
+        if first is None or second is None:
+            pairs.append((first if second is None else second, None))
+            continue
+        # Couleurs alternées d'une ronde à l'autre, et d'une table à l'autre.
+        pairs.append((first, second) if (table + round_number) % 2 else (second, first))
+    return pairs
+
+
+def round_robin_rounds(player_count: int) -> int:
+    return player_count - 1 if player_count % 2 == 0 else player_count
+
+
+# --- TOURNOI ---
+class Tournament:
+    """Un tournoi : joueurs inscrits (avec leur Elo à l'inscription, qui sert de tête de série) et tables de chaque ronde."""
+
+    def __init__(self, tournament_id: str, guild_id: int, channel_id: int, name: str, format: str, organizer_id: int,
+                 rounds: int = 0, round: int = 0, status: str = "registration", round_started_at: Optional[float] = None):
+        self.id = tournament_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.name = name
+        self.format = format
+        self.organizer_id = organizer_id
+        self.rounds = rounds # 0 : nombre choisi au lancement selon le nombre d'inscrits
+        self.round = round
+        self.status = status # "registration", "running", "finished" ou "cancelled"
+        self.round_started_at = round_started_at # time.time() : la durée d'une ronde survit aux redémarrages
+        self.players: dict[int, float] = {}
+        self.games: list[TournamentGame] = []
+
+    def current_games(self) -> list[TournamentGame]:
+        return [game for game in self.games if game.round == self.round]
+
+    def round_complete(self) -> bool:
+        return all(game.result is not None for game in self.current_games())
+
+    def scores(self) -> dict[int, float]:
+        scores = dict.fromkeys(self.players, 0.0)
+        for game in self.games:
+            if game.result is not None:
+                white, black = SCORES[game.result]
+                scores[game.white_id] += white
+                if game.black_id is not None:
+                    scores[game.black_id] += black
+        return scores
+
+    def opponents(self) -> dict[int, set]:
+        opponents = {player_id: set() for player_id in self.players}
+        for game in self.games:
+            if game.black_id is not None:
+                opponents[game.white_id].add(game.black_id)
+                opponents[game.black_id].add(game.white_id)
+        return opponents
+
+    def standings(self) -> list[Standing]:
+        scores, opponents = self.scores(), self.opponents()
+        wins, played = Counter(), Counter()
+        for game in self.games:
+            # Une exemption compte dans le score, pas comme une partie jouée.
+            if game.result is None or game.black_id is None:
+                continue
+            played[game.white_id] += 1
+            played[game.black_id] += 1
+            if game.result == "1-0":
+                wins[game.white_id] += 1
+            elif game.result == "0-1":
+                wins[game.black_id] += 1
+        standings = [Standing(player_id, scores[player_id], sum(scores[other] for other in opponents[player_id]),
+                              wins[player_id], played[player_id]) for player_id in self.players]
+        return sorted(standings, key=lambda row: (-row.score, -row.buchholz, -row.wins, -self.players[row.player_id], row.player_id))
+
+    def max_players(self) -> int:
+        return TOURNAMENT_ROUND_ROBIN_MAX_PLAYERS if self.format == "toutes_rondes" else TOURNAMENT_MAX_PLAYERS
+
+    def default_rounds(self) -> int:
+        if self.format == "toutes_rondes":
+            return round_robin_rounds(len(self.players))
+        return max(1, math.ceil(math.log2(len(self.players))))
+
+    def pair_next_round(self) -> list[TournamentGame]:
+        """Passe à la ronde suivante et l'apparie ; l'exemption éventuelle est déjà marquée."""
+        self.round += 1
+        if self.format == "toutes_rondes":
+            seeded = sorted(self.players, key=lambda player_id: (-self.players[player_id], player_id))
+            pairs = round_robin_pairings(seeded, self.round)
+        else:
+            colors, byes = Counter(), set()
+            for game in self.games:
+                if game.black_id is None:
+                    byes.add(game.white_id)
+                else:
+                    colors[game.white_id] += 1
+                    colors[game.black_id] -= 1
+            ranking = [row.player_id for row in self.standings()]
+            pairs = swiss_pairings(ranking, self.opponents(), colors, byes, self.round)
+        games = [TournamentGame(self.round, white_id, black_id, game_id=None if black_id is None else uuid.uuid4().hex,
+                                result="bye" if black_id is None else None) for white_id, black_id in pairs]
+        self.games.extend(games)
+        return games
+
+
+class TournamentHub:
+    """
+    Les tournois ouverts, un au plus par serveur, et leurs parties. Une ronde ne part pas d'un bloc :
+    les messages de partie sont envoyés par vagues (`batch` parties toutes les `interval` secondes), ce qui
+    étale aussi les rendus ; les appariements sont annoncés avant, en un seul message.
+    Le classement est enregistré dans le GameStore à chaque fin de partie, et la ronde suivante part dès la dernière.
+
+    Fonctions fournies par le cog :
+    `launch(tournament, game)` lance une partie et renvoie l'ID de son message (None si l'envoi a échoué) ;
+    `announce(tournament, lines, ping)` publie des lignes dans le salon du tournoi ;
+    `adjourn(message_id)` arrête une partie à la fin du temps de ronde, et renvoie False si elle est introuvable.
+    """
+
+    def __init__(self, store, launch: Callable[[Tournament, TournamentGame], Awaitable[Optional[int]]],
+                 announce: Callable[[Tournament, list[str], bool], Awaitable[None]], adjourn: Callable[[int], Awaitable[bool]],
+                 batch: int = TOURNAMENT_START_BATCH, interval: float = TOURNAMENT_START_INTERVAL):
+        self.store = store
+        self._launch = launch
+        self._announce = announce
+        self._adjourn = adjourn
+        self.batch = batch
+        self.interval = interval
+        self.tournaments: dict[int, Tournament] = {} # ID du serveur -> tournoi (le dernier, même fini)
+        self._games: dict[str, tuple[Tournament, TournamentGame]] = {} # ID de partie -> table
+        self._launching: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def get(self, guild_id: int) -> Optional[Tournament]:
+        return self.tournaments.get(guild_id)
+
+    def create(self, guild_id: int, channel_id: int, name: str, format: str, organizer_id: int, rounds: int = 0) -> Tournament:
+        tournament = Tournament(uuid.uuid4().hex, guild_id, channel_id, name, format, organizer_id, rounds)
+        self.tournaments[guild_id] = tournament
+        self._save(tournament)
+        return tournament
+
+    def register(self, tournament: Tournament, player_id: int, rating: float) -> bool:
+        if len(tournament.players) >= tournament.max_players():
+            return False
+        tournament.players[player_id] = rating
+        self.store.save_tournament_player(tournament.id, player_id, rating)
+        return True
+
+    def unregister(self, tournament: Tournament, player_id: int) -> bool:
+        if tournament.players.pop(player_id, None) is None:
+            return False
+        self.store.remove_tournament_player(tournament.id, player_id)
+        return True
+
+    def cancel(self, tournament: Tournament):
+        """Arrête le tournoi ; les parties en cours continuent, sans compter."""
+        tournament.status = "cancelled"
+        for game in tournament.current_games():
+            self._games.pop(game.game_id, None)
+        self._save(tournament)
+
+    def close_registration(self, tournament: Tournament):
+        """Clôt les inscriptions et fixe le nombre de rondes, sans attendre : un second /tournoi lancer voit le tournoi parti."""
+        if tournament.format == "toutes_rondes":
+            tournament.rounds = round_robin_rounds(len(tournament.players))
+        else:
+            tournament.rounds = min(tournament.rounds or tournament.default_rounds(), len(tournament.players) - 1)
+        tournament.status = "running"
+        self._save(tournament)
+
+    async def start(self, tournament: Tournament):
+        if tournament.status == "registration":
+            self.close_registration(tournament)
+        # Première ronde déjà appariée (lancement en double) : rien à refaire.
+        if tournament.round:
+            return
+        await self._next_round(tournament)
+
+    # --- RONDES ---
+    async def _next_round(self, tournament: Tournament):
+        games = tournament.pair_next_round()
+        tournament.round_started_at = time.time()
+        self._save(tournament)
+        for game in games:
+            self._save_game(tournament, game)
+            if game.game_id is not None:
+                self._games[game.game_id] = (tournament, game)
+        for game in games:
+            if game.result == "bye":
+                self.store.save_tournament_score(tournament.id, game.white_id, tournament.scores()[game.white_id])
+        lines = [f"🏆 **{tournament.name}** : ronde {tournament.round}/{tournament.rounds}"]
+        lines += [f"<@{game.white_id}> (Blancs) contre <@{game.black_id}> (Noirs)" if game.black_id is not None
+                  else f"<@{game.white_id}> est exempté (1 point)" for game in games]
+        await self._announce(tournament, lines, True)
+        await self._launch_pending(tournament)
+
+    async def _launch_pending(self, tournament: Tournament):
+        """Lance les parties de la ronde qui n'ont pas encore de message, par vagues."""
+        if tournament.id in self._launching:
+            return
+        self._launching.add(tournament.id)
+        try:
+            pending = [game for game in tournament.current_games() if game.result is None and game.message_id is None]
+            for start in range(0, len(pending), self.batch):
+                if start:
+                    await asyncio.sleep(self.interval)
+                if tournament.status != "running":
+                    return
+                await asyncio.gather(*(self._launch_game(tournament, game) for game in pending[start:start + self.batch]))
+        finally:
+            self._launching.discard(tournament.id)
+
+    async def _launch_game(self, tournament: Tournament, game: TournamentGame):
+        try:
+            message_id = await self._launch(tournament, game)
+        except Exception as e:
+            logging.error(f"❌ Partie de tournoi non lancée ({tournament.name}, ronde {game.round}) : {e!r}")
+            return
+        # Sans message, on réessaiera au prochain passage de tick().
+        if message_id is not None:
+            game.message_id = message_id
+
+    def game_finished(self, game_id: str, result: str):
+        """Appelé à la fin de chaque partie : met à jour le classement et enchaîne la ronde suivante si c'était la dernière."""
+        entry = self._games.pop(game_id, None)
+        if entry is None:
+            return
+        tournament, game = entry
+        game.result = result
+        self._save_game(tournament, game)
+        scores = tournament.scores()
+        for player_id in (game.white_id, game.black_id):
+            self.store.save_tournament_score(tournament.id, player_id, scores[player_id])
+        if tournament.round_complete():
+            task = asyncio.get_running_loop().create_task(self._advance(tournament))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _advance(self, tournament: Tournament):
+        if tournament.status != "running" or not tournament.round_complete():
+            return
+        if tournament.round < tournament.rounds:
+            await self._next_round(tournament)
+            return
+        tournament.status = "finished"
+        self._save(tournament)
+        await self._announce(tournament, [f"🏆 **{tournament.name}** est terminé ! Classement final :"] + self.standings_lines(tournament), False)
+
+    def standings_lines(self, tournament: Tournament, limit: Optional[int] = None) -> list[str]:
+        return [f"{rank}. <@{row.player_id}> : {row.score:g} pt{'s' if row.score > 1 else ''} (départage {row.buchholz:g}, "
+                f"{row.wins} victoire{'s' if row.wins > 1 else ''} en {row.played} partie{'s' if row.played > 1 else ''})"
+                for rank, row in enumerate(tournament.standings()[:limit], start=1)]
+
+    async def tick(self, now: Optional[float] = None):
+        """Relance les parties dont l'envoi a échoué, et clôt les rondes qui ont dépassé TOURNAMENT_ROUND_TIME."""
+        now = now if now is not None else time.time()
+        for tournament in list(self.tournaments.values()):
+            if tournament.status != "running":
+                continue
+            if tournament.round_complete():
+                # Dernier résultat arrivé juste avant un redémarrage : la ronde suivante n'était pas partie.
+                await self._advance(tournament)
+                continue
+            if now - (tournament.round_started_at or now) < TOURNAMENT_ROUND_TIME:
+                await self._launch_pending(tournament)
+                continue
+            for game in tournament.current_games():
+                if game.result is not None:
+                    continue
+                # La fin de la partie passe par game_finished ; sinon (partie jamais lancée ou introuvable), on la compte nulle ici.
+                if game.message_id is None or not await self._adjourn(game.message_id):
+                    self.game_finished(game.game_id, "1/2-1/2")
+
+    async def run(self, interval: float = TOURNAMENT_TICK):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                logging.error(f"❌ Erreur dans le suivi des tournois : {e!r}")
+
+    def restore(self, records: list[dict]):
+        """Recharge les tournois ouverts (voir GameStore.load_tournaments)."""
+        for record in records:
+            tournament = Tournament(record["id"], record["guild_id"], record["channel_id"], record["name"], record["format"],
+                                    record["organizer_id"], record["rounds"], record["round"], record["status"],
+                                    record["round_started_at"])
+            tournament.players = dict(record["players"])
+            tournament.games = [TournamentGame(*row) for row in record["games"]]
+            self.tournaments[tournament.guild_id] = tournament
+            for game in tournament.current_games():
+                if game.result is None:
+                    self._games[game.game_id] = (tournament, game)
+
+    # --- SAUVEGARDE ---
+    def _save(self, tournament: Tournament):
+        self.store.save_tournament(tournament.id, tournament.guild_id, tournament.channel_id, tournament.name, tournament.format,
+                                   tournament.organizer_id, tournament.rounds, tournament.round, tournament.status,
+                                   tournament.round_started_at)
+
+    def _save_game(self, tournament: Tournament, game: TournamentGame):
+        self.store.save_tournament_game(tournament.id, game.round, game.white_id, game.black_id, game.game_id, game.result)
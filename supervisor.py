@@ -0,0 +1,24 @@
+# supervisor.py
+
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from royal.cluster import Supervisor
+
+# --- MODE CLUSTER ---
+# Lance plusieurs processus bot.py, chacun responsable d'une plage de shards, et les relance s'ils plantent.
+# CLUSTER_COUNT : nombre de processus (par défaut, un par cœur)
+# CLUSTER_SHARDS : nombre total de shards, ou "auto" pour le nombre recommandé par Discord
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - [superviseur] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+if __name__ == "__main__":
+    Supervisor(os.getenv('DISCORD_TOKEN')).run()